@@ -0,0 +1,131 @@
+"""Замер упаковки решений в контекст LLM.
+
+Запуск: python -m benchmarks.context_packing [количество решений]
+Сравнивает прежний отбор (число решений по first-fit, затем MMR
+выбирает столько же разнообразных) с упаковкой по бюджету токенов:
+сколько решений попадает в один запрос, сколько из них целиком
+и какая доля бюджета используется.
+Решения синтетические и разного размера, крупные идут первыми.
+БД не нужна.
+"""
+import asyncio
+import json
+import random
+import sys
+
+import numpy as np
+
+from datastorage.database.models import SolutionPreprocessing
+from llm.models.lab import LLMProvider
+from llm.services.context_packer import (
+    PackingCandidate, pack_solutions, solution_cost
+)
+from llm.services.preprocessing_service import PreprocessingService
+from llm.services.token_calculator_service import get_token_calculator
+
+DEFAULT_SOLUTIONS = 60
+CONTEXT_SIZES = [8_000, 16_000, 32_000]
+TOPICS = [
+    'образование школа учитель ученики программа занятия',
+    'транспорт дороги автобус маршрут остановка движение',
+    'экология мусор переработка парк деревья воздух',
+    'финансы бюджет налоги расходы отчётность прозрачность',
+    'здравоохранение поликлиника врачи запись очередь лечение',
+    'культура музей театр выставка фестиваль библиотека',
+    'безопасность освещение камеры патруль двор соседи',
+    'цифровизация сервис приложение портал данные заявки',
+]
+
+
+def make_solution_text(rng: random.Random, index: int) -> str:
+    topic = TOPICS[index % len(TOPICS)].split()
+    # Каждое пятое решение - крупное, первые решения - самые крупные
+    sentences = 120 if index % 5 == 0 else rng.randint(4, 20)
+    if index < 3:
+        sentences = 250
+    return ' '.join(
+        f"Предлагаем {rng.choice(topic)} и {rng.choice(topic)} "
+        f"через {rng.choice(topic)} в районе {rng.randint(1, 30)}."
+        for _ in range(sentences)
+    )
+
+
+async def bench_context_packing(count: int) -> None:
+    rng = random.Random(42)
+    calculator = get_token_calculator()
+    preprocessing = PreprocessingService(data_adapter=None)
+
+    solution_ids = [f'solution-{index}' for index in range(count)]
+    texts = [make_solution_text(rng, index) for index in range(count)]
+    tokens = [calculator.count_tokens(text) for text in texts]
+    preprocessings = {
+        sid: SolutionPreprocessing(
+            solution_id=sid,
+            embedding=json.dumps(
+                preprocessing._generate_improved_embedding(text)
+            ),
+            key_points=preprocessing._extract_key_points(text),
+        )
+        for sid, text in zip(solution_ids, texts)
+    }
+    priority = await preprocessing.rank_by_diversity(
+        solution_ids, preprocessings
+    )
+    candidates = [
+        PackingCandidate(
+            id=sid,
+            user_id='bench',
+            content=text,
+            tokens=size,
+            summary=preprocessings[sid].key_points,
+            summary_tokens=calculator.count_tokens(
+                preprocessings[sid].key_points
+            ),
+        )
+        for sid, text, size in zip(solution_ids, texts, tokens)
+    ]
+    cost = dict(zip(solution_ids, map(solution_cost, tokens)))
+    print(f'Решений: {count}, токенов всего: {sum(tokens)}')
+
+    for context in CONTEXT_SIZES:
+        provider = LLMProvider(
+            name='bench', api_url='', model='bench',
+            max_context_tokens=context,
+        )
+        fit_info = calculator.calculate_max_solutions_fit(
+            provider=provider,
+            system_prompt='',
+            base_prompt='',
+            solution_texts=texts,
+            solution_tokens=tokens,
+        )
+        budget = fit_info['available_for_solutions']
+
+        # Прежний отбор: столько же разнообразных решений, сколько
+        # влезло по first-fit, без проверки их реального размера
+        first_fit = fit_info['max_solutions_count']
+        selected = await preprocessing._maximal_marginal_relevance(
+            {
+                sid: np.array(json.loads(preprocessings[sid].embedding))
+                for sid in solution_ids
+            },
+            first_fit,
+        ) if first_fit else []
+        first_fit_used = sum(cost[sid] for sid in selected)
+
+        packing = pack_solutions(candidates, budget, priority=priority)
+        print(
+            f'контекст {context}, бюджет {budget}: '
+            f'first-fit {first_fit} решений '
+            f'({first_fit_used / budget:.0%} бюджета'
+            f'{", переполнение" if first_fit_used > budget else ""}); '
+            f'упаковка {len(packing.solutions)} решений '
+            f'({packing.full_count} целиком, '
+            f'{packing.summary_count} тезисами, '
+            f'{packing.utilization:.0%} бюджета)'
+        )
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SOLUTIONS
+    asyncio.run(bench_context_packing(count))
@@ -0,0 +1,61 @@
+"""Замер создания правила в сообществах разного размера.
+
+Запуск: python -m benchmarks.create_rule [количество участников ...]
+Все данные создаются внутри транзакции, которая откатывается в конце.
+"""
+import asyncio
+import sys
+import time
+from typing import List
+
+from sqlalchemy import select, func
+
+from benchmarks.fixtures import create_community_with_members
+from datastorage.database.base import async_session_maker
+from entities.rule.ao.datastorage import RuleDS
+from entities.user_voting_result.model import UserVotingResult
+
+DEFAULT_SIZES = [1_000, 10_000, 50_000]
+
+
+async def bench_create_rule(members: int) -> None:
+    async with async_session_maker() as session:
+        async with session.begin():
+            data = await create_community_with_members(session, members)
+            start_time = time.perf_counter()
+            await RuleDS(session=session).create_rule(
+                data=dict(
+                    title='Benchmark rule',
+                    question='Benchmark question',
+                    content='Benchmark content',
+                    is_extra_options=True,
+                    is_multi_select=False,
+                    community_id=data.community_id,
+                    category_id=data.categories_objs[0].id,
+                    extra_options=['Option 1', 'Option 2', 'Option 3'],
+                ),
+                creator=data.user,
+            )
+            await session.flush()
+            elapsed = time.perf_counter() - start_time
+            created = await session.scalar(
+                select(func.count()).where(
+                    UserVotingResult.community_id == data.community_id
+                )
+            )
+            await session.rollback()
+
+    print(
+        f'Участников: {members:>6} | '
+        f'результатов голосования: {created:>6} | '
+        f'время: {elapsed * 1000:.0f} мс'
+    )
+
+
+async def main(sizes: List[int]) -> None:
+    for members in sizes:
+        await bench_create_rule(members)
+
+
+if __name__ == '__main__':
+    asyncio.run(main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES))
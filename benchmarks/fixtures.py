@@ -0,0 +1,220 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from datastorage.consts import Code
+from datastorage.database.models import User
+from datastorage.utils import build_uuid
+from entities.user_community_settings.ao.dataclasses import CreatingCommunity
+from entities.user_community_settings.ao.datastorage import (
+    UserCommunitySettingsDS
+)
+from entities.user_voting_result.ao.interfaces import ResourceType
+
+
+async def create_community_with_members(
+        session: AsyncSession, members: int,
+) -> CreatingCommunity:
+    """Создаст сообщество с заданным количеством участников.
+
+    Автор сообщества создаётся через бизнес-логику, остальные участники
+    и их настройки вставляются одним запросом каждые.
+    """
+    creator = User(
+        firstname='Bench',
+        surname='Creator',
+        fullname='Bench Creator',
+        email=f'{build_uuid()}@bench.local',
+    )
+    session.add(creator)
+    await session.flush([creator])
+    data = CreatingCommunity(
+        names=['Benchmark'],
+        descriptions=['Benchmark community'],
+        category_names=['Benchmark category'],
+        settings=dict(
+            quorum=50, vote=50, significant_minority=10,
+            decision_delay=3, dispute_time_limit=5,
+            is_workgroup=False, workgroup=0,
+            is_secret_ballot=False, is_can_offer=False,
+            is_minority_not_participate=False, is_not_delegate=False,
+            is_default_add_member=False,
+        ),
+        user=creator,
+    )
+    await UserCommunitySettingsDS(session=session).create_community(data)
+
+    members_query = text("""
+        WITH new_users AS (
+            INSERT INTO public.auth_user (
+                id, firstname, surname, fullname, email, is_active, created
+            )
+            SELECT
+                gen_random_uuid()::varchar, 'Bench', 'Member',
+                'Bench Member ' || n,
+                gen_random_uuid()::varchar || '@bench.local',
+                TRUE, NOW()
+            FROM generate_series(1, :count) AS n
+            RETURNING id
+        )
+        INSERT INTO public.user_community_settings (
+            id, user_id, community_id, quorum, vote, significant_minority,
+            decision_delay, dispute_time_limit, is_workgroup, workgroup,
+            is_secret_ballot, is_can_offer, is_minority_not_participate,
+            is_not_delegate, is_default_add_member, is_blocked
+        )
+        SELECT
+            gen_random_uuid()::varchar, id, :community_id, 50, 50, 10,
+            3, 5, FALSE, 0, FALSE, FALSE, FALSE, FALSE, FALSE, FALSE
+        FROM new_users;
+    """)
+    await session.execute(
+        members_query,
+        {'count': members - 1, 'community_id': data.community_id},
+    )
+
+    return data
+
+
+async def create_decisions(
+        session: AsyncSession, data: CreatingCommunity, count: int,
+) -> None:
+    """Создаст в сообществе правила с завершёнными голосованиями,
+    одним выбранным вариантом ответа и голосами всех участников.
+    """
+    decisions_query = text("""
+        WITH decisions AS (
+            SELECT
+                gen_random_uuid()::varchar AS voting_result_id,
+                gen_random_uuid()::varchar AS rule_id,
+                gen_random_uuid()::varchar AS option_id,
+                n
+            FROM generate_series(1, :count) AS n
+        ),
+        new_options AS (
+            INSERT INTO public.voting_option (
+                id, content, is_multi_select, creator_id, rule_id
+            )
+            SELECT option_id, 'Option ' || n, FALSE, :creator_id, rule_id
+            FROM decisions
+            RETURNING id
+        ),
+        new_results AS (
+            INSERT INTO public.voting_result (
+                id, vote, is_significant_minority, is_noncompliance_minority,
+                options, minority_options, noncompliance,
+                minority_noncompliance
+            )
+            SELECT
+                voting_result_id, n % 2 = 0, FALSE, FALSE,
+                json_build_object(option_id, json_build_object(
+                    'content', 'Option ' || n, 'percent', 100
+                )),
+                '{}'::json, '{}'::json, '{}'::json
+            FROM decisions
+            RETURNING id
+        ),
+        new_rules AS (
+            INSERT INTO public.rule (
+                id, title, question, content, is_extra_options,
+                is_multi_select, community_id, creator_id, created,
+                status_id, category_id, voting_result_id, tracker
+            )
+            SELECT
+                d.rule_id, 'Rule ' || d.n, 'Question', 'Content', TRUE,
+                FALSE, :community_id, :creator_id, NOW(),
+                (SELECT id FROM public.status WHERE code = :status_code),
+                :category_id, d.voting_result_id, 'B-' || d.n
+            FROM decisions d
+            JOIN new_results r ON r.id = d.voting_result_id
+            RETURNING id
+        )
+        INSERT INTO public.user_voting_result (
+            id, vote, member_id, community_id, voting_result_id, rule_id,
+            is_blocked, is_voted_myself, is_voted_by_default
+        )
+        SELECT
+            gen_random_uuid()::varchar, d.n % 2 = 0, ucs.user_id,
+            ucs.community_id, d.voting_result_id, d.rule_id,
+            FALSE, TRUE, FALSE
+        FROM decisions d
+        CROSS JOIN public.user_community_settings ucs
+        WHERE ucs.community_id = :community_id;
+    """)
+    await session.execute(
+        decisions_query,
+        {
+            'count': count,
+            'creator_id': data.user.id,
+            'community_id': data.community_id,
+            'category_id': data.categories_objs[0].id,
+            'status_code': Code.ON_CONSIDERATION,
+        },
+    )
+
+
+async def create_weighted_votes(
+        session: AsyncSession, data: CreatingCommunity,
+        resource_id: str, noncompliance_count: int,
+        resource_type: ResourceType = 'rule',
+) -> None:
+    """Создаст несоответствия и проставит участникам
+    от одного до трёх выбранных вариантов ответа и несоответствий.
+
+    Выбор смещён к первым вариантам, чтобы в подсчёте были
+    и победители, и значимое меньшинство. Для инициатив
+    проставляются только варианты ответа.
+    """
+    resource_column = f'{resource_type}_id'
+    noncompliance_query = text("""
+        INSERT INTO public.noncompliance (id, name, community_id, creator_id)
+        SELECT
+            gen_random_uuid()::varchar, 'Noncompliance ' || n,
+            :community_id, :creator_id
+        FROM generate_series(1, :count) AS n;
+    """)
+    await session.execute(
+        noncompliance_query,
+        {
+            'community_id': data.community_id,
+            'creator_id': data.user.id,
+            'count': noncompliance_count,
+        },
+    )
+    sources = [(
+        'relation_user_voting_result_voting_options',
+        f'SELECT id FROM public.voting_option '
+        f'WHERE {resource_column} = :resource_id',
+    )]
+    if resource_type == 'rule':
+        sources.append((
+            'relation_user_voting_result_noncompliance',
+            'SELECT id FROM public.noncompliance '
+            'WHERE community_id = :community_id',
+        ))
+    for relation_table, items_query in sources:
+        votes_query = text(f"""
+            WITH items AS (
+                SELECT id, ROW_NUMBER() OVER (ORDER BY id) - 1 AS idx
+                FROM ({items_query}) AS source
+            ),
+            picks AS (
+                SELECT DISTINCT
+                    uvr.id AS from_id,
+                    FLOOR(POWER(RANDOM(), 2) * (
+                        SELECT COUNT(*) FROM items
+                    ))::int AS idx
+                FROM public.user_voting_result uvr
+                CROSS JOIN generate_series(1, 3) AS pick
+                WHERE uvr.{resource_column} = :resource_id
+                  AND (pick = 1 OR RANDOM() < 0.5)
+            )
+            INSERT INTO public.{relation_table} (id, from_id, to_id)
+            SELECT gen_random_uuid()::varchar, p.from_id, i.id
+            FROM picks p
+            JOIN items i ON i.idx = p.idx
+            ON CONFLICT DO NOTHING;
+        """)
+        await session.execute(
+            votes_query,
+            {'resource_id': resource_id, 'community_id': data.community_id},
+        )
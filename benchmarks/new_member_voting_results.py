@@ -0,0 +1,82 @@
+"""Замер создания результатов голосований для нового участника.
+
+Запуск: python -m benchmarks.new_member_voting_results [количество решений ...]
+Все данные создаются внутри транзакции, которая откатывается в конце.
+"""
+import asyncio
+import sys
+import time
+from typing import List
+
+from sqlalchemy import select, func
+
+from benchmarks.fixtures import (
+    create_community_with_members, create_decisions
+)
+from datastorage.database.base import async_session_maker
+from datastorage.database.models import (
+    User, RequestMember, UserVotingResult, RelationUserVrVo
+)
+from datastorage.utils import build_uuid
+from entities.request_member.ao.datastorage import RequestMemberDS
+
+DEFAULT_SIZES = [5_000]
+MEMBERS = 10
+
+
+async def bench_new_member(decisions: int) -> None:
+    async with async_session_maker() as session:
+        async with session.begin():
+            data = await create_community_with_members(session, MEMBERS)
+            await create_decisions(session, data, decisions)
+            new_member = User(
+                firstname='Bench',
+                surname='Newcomer',
+                fullname='Bench Newcomer',
+                email=f'{build_uuid()}@bench.local',
+            )
+            session.add(new_member)
+            await session.flush([new_member])
+            request_member = RequestMember(
+                community_id=data.community_id,
+                member_id=new_member.id,
+            )
+
+            start_time = time.perf_counter()
+            await RequestMemberDS(
+                session=session
+            )._create_new_voting_results(request_member)
+            await session.flush()
+            elapsed = time.perf_counter() - start_time
+
+            created = await session.scalar(
+                select(func.count()).where(
+                    UserVotingResult.member_id == new_member.id
+                )
+            )
+            linked = await session.scalar(
+                select(func.count())
+                .select_from(RelationUserVrVo)
+                .join(
+                    UserVotingResult,
+                    UserVotingResult.id == RelationUserVrVo.from_id,
+                )
+                .where(UserVotingResult.member_id == new_member.id)
+            )
+            await session.rollback()
+
+    print(
+        f'Решений: {decisions:>6} | '
+        f'результатов голосования: {created:>6} | '
+        f'вариантов ответа: {linked:>6} | '
+        f'время: {elapsed * 1000:.0f} мс'
+    )
+
+
+async def main(sizes: List[int]) -> None:
+    for decisions in sizes:
+        await bench_new_member(decisions)
+
+
+if __name__ == '__main__':
+    asyncio.run(main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES))
@@ -0,0 +1,65 @@
+"""Замер предварительного подсчёта итогов с другими параметрами.
+
+Запуск: python -m benchmarks.recount_preview [количество решений]
+Первый вызов загружает снимок матрицы голосов, повторные вызовы
+с другими параметрами считают итоги по снимку.
+Все данные создаются внутри транзакции, которая откатывается в конце.
+"""
+import asyncio
+import sys
+import time
+
+from sqlalchemy import text
+
+from benchmarks.fixtures import create_community_with_members, create_decisions
+from datastorage.ao.datastorage import vote_matrix_snapshots
+from datastorage.database.base import async_session_maker
+from entities.community.ao.datastorage import CommunityDS
+
+DEFAULT_DECISIONS = 1_000
+MEMBERS = 100
+PARAMS = [(50, 50, 10), (60, 50, 10), (70, 60, 10), (51, 90, 20), (80, 40, 5)]
+
+
+async def bench_recount_preview(decisions: int) -> None:
+    async with async_session_maker() as session:
+        async with session.begin():
+            data = await create_community_with_members(session, MEMBERS)
+            await create_decisions(session, data, decisions)
+            # Доля голосов "за" у решений разная: от провала до принятия
+            await session.execute(
+                text("""
+                    UPDATE public.user_voting_result
+                    SET vote = RANDOM() < (
+                        ABS(HASHTEXT(voting_result_id)) % 100
+                    ) / 100.0
+                    WHERE community_id = :community_id
+                """),
+                {'community_id': data.community_id},
+            )
+            await session.execute(text('ANALYZE public.user_voting_result'))
+            vote_matrix_snapshots.clear()
+            ds = CommunityDS(session=session)
+
+            for vote, quorum, significant_minority in PARAMS:
+                start_time = time.perf_counter()
+                preview = await ds.get_recount_preview(
+                    community_id=data.community_id,
+                    vote=vote,
+                    quorum=quorum,
+                    significant_minority=significant_minority,
+                )
+                elapsed = time.perf_counter() - start_time
+                print(
+                    f'vote={vote} quorum={quorum} '
+                    f'significant_minority={significant_minority}: '
+                    f'изменится {len(preview["changed"])} '
+                    f'из {preview["total"]}, '
+                    f'время: {elapsed * 1000:.0f} мс'
+                )
+            await session.rollback()
+
+
+if __name__ == '__main__':
+    decisions = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DECISIONS
+    asyncio.run(bench_recount_preview(decisions))
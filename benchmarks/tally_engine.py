@@ -0,0 +1,233 @@
+"""Сверка и замер подсчёта итогов по матрице голосов сообщества.
+
+Запуск: python -m benchmarks.tally_engine [количество участников]
+В сообществе создаются правила и инициативы со случайными голосами,
+выбором вариантов ответа и несоответствий. Итоги VoteTally сверяются
+с построчным подсчётом user_vote_count: голос, флаги меньшинства,
+варианты ответа, несоответствия и новый статус.
+Все данные создаются внутри транзакции, которая откатывается в конце.
+"""
+import asyncio
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import select, text
+
+from benchmarks.fixtures import (
+    create_community_with_members, create_weighted_votes
+)
+from core.dataclasses import BaseVotingParams
+from datastorage.ao.tally import VoteTally
+from datastorage.database.base import async_session_maker
+from entities.initiative.ao.datastorage import InitiativeDS
+from entities.initiative.model import Initiative
+from entities.rule.ao.datastorage import RuleDS
+from entities.rule.model import Rule
+from entities.user_voting_result.ao.interfaces import Resource, ResourceType
+
+DEFAULT_MEMBERS = 2_000
+RULES = 30
+INITIATIVES = 20
+OPTIONS = 6
+# Начальные статусы: часть голосований уже принята или отозвана
+INITIAL_STATUSES = {
+    'rule': ['rule_approved', 'rule_revoked', 'compromise'],
+    'initiative': ['initiative_approved', 'initiative_revoked'],
+}
+
+
+async def seed_resources(session, data) -> None:
+    for idx in range(RULES + INITIATIVES):
+        is_rule = idx < RULES
+        resource_data = dict(
+            title=f'Benchmark {idx}',
+            question='Benchmark question',
+            content='Benchmark content',
+            is_extra_options=idx % 3 != 0,
+            is_multi_select=idx % 2 == 0,
+            community_id=data.community_id,
+            category_id=data.categories_objs[0].id,
+            extra_options=[
+                f'Option {number}' for number in range(1, OPTIONS + 1)
+            ],
+        )
+        if is_rule:
+            await RuleDS(session=session).create_rule(
+                data=resource_data, creator=data.user
+            )
+        else:
+            await InitiativeDS(session=session).create_initiative(
+                data=resource_data, creator=data.user
+            )
+
+    await session.flush()
+    for model, resource_type in ((Rule, 'rule'), (Initiative, 'initiative')):
+        resource_ids = (await session.scalars(
+            select(model.id).where(model.community_id == data.community_id)
+        )).all()
+        for resource_id in resource_ids:
+            await create_weighted_votes(
+                session=session,
+                data=data,
+                resource_id=resource_id,
+                noncompliance_count=2 if resource_type == 'rule' else 0,
+                resource_type=resource_type,
+            )
+        for idx, code in enumerate(INITIAL_STATUSES[resource_type]):
+            await session.execute(
+                text(f"""
+                    UPDATE public.{resource_type}
+                    SET status_id = (
+                        SELECT id FROM public.status WHERE code = :code
+                    )
+                    WHERE id = ANY(CAST(:ids AS varchar[]))
+                """),
+                {'code': code, 'ids': list(resource_ids[idx::5])},
+            )
+
+    # Доля голосов "за" у голосований разная: от провала до принятия
+    await session.execute(
+        text("""
+            UPDATE public.user_voting_result
+            SET
+                vote = CASE
+                    WHEN RANDOM() < 0.1 THEN NULL
+                    ELSE RANDOM() < (ABS(HASHTEXT(voting_result_id)) % 100)
+                        / 100.0
+                END,
+                is_blocked = RANDOM() < 0.05
+            WHERE community_id = :community_id
+        """),
+        {'community_id': data.community_id},
+    )
+    # Объекты сессии устарели после изменений в обход ORM
+    session.expire_all()
+
+
+def snapshot(resource: Resource) -> Tuple[Any, ...]:
+    voting_result = resource.voting_result
+
+    return (
+        voting_result.vote,
+        bool(voting_result.is_significant_minority),
+        bool(voting_result.is_noncompliance_minority),
+        voting_result.options,
+        voting_result.minority_options,
+        voting_result.noncompliance,
+        voting_result.minority_noncompliance,
+        resource.status.code,
+    )
+
+
+def as_json(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: dict(value) if isinstance(value, dict) else vars(value)
+        for key, value in (data or {}).items()
+    }
+
+
+async def bench_tally_engine(members: int) -> None:
+    async with async_session_maker() as session:
+        async with session.begin():
+            data = await create_community_with_members(session, members)
+            await seed_resources(session, data)
+            await session.execute(text(
+                'ANALYZE public.user_voting_result, '
+                'public.relation_user_voting_result_voting_options, '
+                'public.relation_user_voting_result_noncompliance'
+            ))
+            voting_params = BaseVotingParams(
+                vote=50, quorum=50, significant_minority=10
+            )
+            rule_ds = RuleDS(session=session)
+
+            start_time = time.perf_counter()
+            resources: List[Tuple[Resource, ResourceType]] = [
+                *((rule, 'rule') for rule in
+                  await rule_ds._get_community_rules(data.community_id)),
+                *((initiative, 'initiative') for initiative in
+                  await rule_ds._get_community_initiatives(
+                      data.community_id
+                  )),
+            ]
+            matrix = await rule_ds.get_vote_matrix(
+                community_id=data.community_id,
+                resources=[
+                    rule_ds._build_tally_resource(resource, resource_type)
+                    for resource, resource_type in resources
+                ],
+            )
+            load_elapsed = time.perf_counter() - start_time
+            start_time = time.perf_counter()
+            outcomes = VoteTally(matrix).compute(voting_params)
+            compute_elapsed = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            for resource, resource_type in resources:
+                await rule_ds.user_vote_count(
+                    voting_result=resource.voting_result,
+                    resource=resource,
+                    resource_type=resource_type,
+                    voting_params=voting_params,
+                )
+            sql_elapsed = time.perf_counter() - start_time
+            await session.flush()
+
+            mismatches = 0
+            transitions: Dict[Tuple[str, str], int] = {}
+            for (resource, resource_type), tally_resource, outcome in zip(
+                    resources, matrix.resources, outcomes
+            ):
+                voting_result = resource.voting_result
+                expected = snapshot(resource)
+                actual = (
+                    outcome.vote,
+                    outcome.is_significant_minority,
+                    outcome.is_noncompliance_minority,
+                    outcome.options,
+                    outcome.minority_options,
+                    outcome.noncompliance,
+                    outcome.minority_noncompliance,
+                    outcome.status_code,
+                )
+                is_equal = (
+                    expected[:3] == actual[:3]
+                    and expected[7] == actual[7]
+                    and all(
+                        actual_data is None
+                        or as_json(expected_data) == as_json(actual_data)
+                        for expected_data, actual_data in zip(
+                            expected[3:7], actual[3:7]
+                        )
+                    )
+                )
+                transition = (tally_resource.status_code, outcome.status_code)
+                transitions[transition] = transitions.get(transition, 0) + 1
+                if not is_equal:
+                    mismatches += 1
+                    print(
+                        f'Расхождение {resource_type} {resource.id} '
+                        f'({voting_result.id}):\n'
+                        f'  SQL:     {expected}\n  матрица: {actual}'
+                    )
+
+            print(
+                f'Участников: {members}, голосований: {len(resources)}, '
+                f'голосов: {len(matrix.vote_value)}, '
+                f'выборов: {len(matrix.choice_vote)}'
+            )
+            print(
+                f'матрица: загрузка {load_elapsed * 1000:.0f} мс, '
+                f'подсчёт {compute_elapsed * 1000:.0f} мс; '
+                f'user_vote_count: {sql_elapsed * 1000:.0f} мс'
+            )
+            for (last_code, code), count in sorted(transitions.items()):
+                print(f'  {last_code} -> {code}: {count}')
+            print(f'Расхождений: {mismatches}')
+            await session.rollback()
+
+
+if __name__ == '__main__':
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MEMBERS
+    asyncio.run(bench_tally_engine(members))
@@ -0,0 +1,98 @@
+"""Замер взвешенного подсчёта вариантов ответа и несоответствий.
+
+Запуск: python -m benchmarks.weighted_tally [количество участников]
+Все данные создаются внутри транзакции, которая откатывается в конце.
+Помимо времени выводится план запроса подсчёта (EXPLAIN ANALYZE).
+"""
+import asyncio
+import sys
+import time
+
+from sqlalchemy import select, text
+
+from benchmarks.fixtures import (
+    create_community_with_members, create_weighted_votes
+)
+from core.dataclasses import BaseVotingParams
+from datastorage.database.base import async_session_maker
+from entities.rule.ao.datastorage import RuleDS
+from entities.rule.model import Rule
+
+DEFAULT_MEMBERS = 10_000
+OPTIONS = 20
+RUNS = 5
+
+
+async def bench_weighted_tally(members: int) -> None:
+    async with async_session_maker() as session:
+        async with session.begin():
+            data = await create_community_with_members(session, members)
+            rule_ds = RuleDS(session=session)
+            await rule_ds.create_rule(
+                data=dict(
+                    title='Benchmark rule',
+                    question='Benchmark question',
+                    content='Benchmark content',
+                    is_extra_options=True,
+                    is_multi_select=True,
+                    community_id=data.community_id,
+                    category_id=data.categories_objs[0].id,
+                    extra_options=[
+                        f'Option {idx}' for idx in range(1, OPTIONS + 1)
+                    ],
+                ),
+                creator=data.user,
+            )
+            rule = await session.scalar(
+                select(Rule).where(Rule.community_id == data.community_id)
+            )
+            await create_weighted_votes(
+                session=session,
+                data=data,
+                resource_id=rule.id,
+                noncompliance_count=OPTIONS,
+            )
+            await session.execute(text(
+                'ANALYZE public.user_voting_result, '
+                'public.relation_user_voting_result_voting_options, '
+                'public.relation_user_voting_result_noncompliance'
+            ))
+            voting_params = BaseVotingParams(
+                vote=10, quorum=50, significant_minority=5
+            )
+
+            for name, method in (
+                ('варианты ответа', rule_ds._get_new_selected_options),
+                ('несоответствия', rule_ds._get_new_noncompliance),
+            ):
+                start_time = time.perf_counter()
+                for _ in range(RUNS):
+                    winners, minority = await method(
+                        resource=rule,
+                        resource_type='rule',
+                        voting_params=voting_params,
+                    )
+                elapsed = (time.perf_counter() - start_time) / RUNS
+                print(
+                    f'{name}: победителей {len(winners)}, '
+                    f'меньшинство {len(minority)}, '
+                    f'время: {elapsed * 1000:.0f} мс'
+                )
+
+            query = rule_ds.build_weighted_tally_query(
+                source='options',
+                resource_type='rule',
+                winner_rule='multi',
+            )
+            plan = await session.execute(
+                text(f'EXPLAIN (ANALYZE, BUFFERS) {query.text}'),
+                {'resource_id': rule.id, 'vote': voting_params.vote},
+            )
+            print('\n'.join(row[0] for row in plan.all()))
+            await session.rollback()
+
+
+if __name__ == '__main__':
+    asyncio.run(bench_weighted_tally(
+        int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MEMBERS
+    ))
@@ -0,0 +1,61 @@
+import argparse
+import asyncio
+from datetime import date
+
+from datastorage.database.base import async_session_maker
+from llm.adapters.data_adapter import DataAdapter
+from llm.services.preprocessing_service import PreprocessingService
+
+
+async def preprocess_solutions(
+        challenge_id: str = None,
+        community_id: str = None,
+        force: bool = False
+):
+    print(
+        f"[{date.today()}] Запуск команды пакетной предобработки "
+        f"решений..."
+    )
+
+    async with async_session_maker() as session:
+        try:
+            preprocessing = PreprocessingService(DataAdapter(session))
+            stats = await preprocessing.preprocess_batch(
+                challenge_id=challenge_id,
+                community_id=community_id,
+                force=force
+            )
+
+            if not stats['processed']:
+                print('Новых и изменённых решений не найдено')
+                return
+
+            print(
+                f"Обработано решений: {stats['processed']} "
+                f"за {stats['total_seconds']} с "
+                f"(вычисления {stats['compute_seconds']} с), "
+                f"{stats['solutions_per_second']} решений/с"
+            )
+
+        except Exception as e:
+            print(
+                f'Ошибка при выполнении команды предобработки: '
+                f'{e.__str__()}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Предобработка новых и изменённых решений'
+    )
+    parser.add_argument('--challenge', dest='challenge_id')
+    parser.add_argument('--community', dest='community_id')
+    parser.add_argument(
+        '--force', action='store_true',
+        help='обработать заново все решения'
+    )
+    args = parser.parse_args()
+    asyncio.run(preprocess_solutions(
+        challenge_id=args.challenge_id,
+        community_id=args.community_id,
+        force=args.force
+    ))
@@ -0,0 +1,29 @@
+import asyncio
+from datetime import date
+
+from llm.services.response_cache import get_llm_response_cache
+
+
+async def purge_llm_response_cache():
+    print(
+        f"[{date.today()}] Запуск команды очистки просроченных ответов "
+        f"LLM..."
+    )
+
+    response_cache = get_llm_response_cache()
+    if not response_cache.persistent:
+        print('Кеш ответов LLM хранится только в памяти')
+        return
+
+    try:
+        purged = await response_cache.purge_expired()
+        print(f'Удалено просроченных ответов LLM: {purged}')
+
+    except Exception as e:
+        print(
+            f'Ошибка при выполнении команды очистки кеша ответов LLM: '
+            f'{e.__str__()}')
+
+
+if __name__ == '__main__':
+    asyncio.run(purge_llm_response_cache())
@@ -0,0 +1,34 @@
+import asyncio
+from datetime import date
+
+from entities.community.ao.datastorage import CommunityDS
+
+
+async def reconcile_community_counters():
+    print(
+        f"[{date.today()}] Запуск команды сверки счётчиков участников "
+        f"сообществ..."
+    )
+
+    community_ds = CommunityDS()
+
+    async with community_ds.session_scope():
+        try:
+            repaired_ids = await community_ds.reconcile_member_counters()
+
+            if not repaired_ids:
+                print('Расхождений счётчиков участников не найдено')
+                return
+
+            print(
+                f'Исправлены счётчики участников '
+                f'{len(repaired_ids)} сообществ')
+
+        except Exception as e:
+            print(
+                f'Ошибка при выполнении команды сверки счётчиков: '
+                f'{e.__str__()}')
+
+
+if __name__ == '__main__':
+    asyncio.run(reconcile_community_counters())
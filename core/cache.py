@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+from core.metrics import metrics
+
+V = TypeVar('V')
+
+
+class TTLCache(Generic[V]):
+    """In-memory кэш значений с ограничением по времени жизни и размеру.
+
+    При превышении размера вытесняются давно не использованные записи.
+    Попадания и промахи учитываются в счётчиках {name}.hits и {name}.misses.
+    """
+
+    def __init__(
+            self, name: str,
+            ttl_seconds: float,
+            max_size: int = 128,
+    ) -> None:
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._items: OrderedDict[Hashable, Tuple[float, V]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Вернёт значение по ключу, если оно есть и не устарело."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] <= time.monotonic():
+                del self._items[key]
+                item = None
+            if item is None:
+                metrics.increment(f'{self.name}.misses')
+                return None
+
+            self._items.move_to_end(key)
+            metrics.increment(f'{self.name}.hits')
+
+            return item[1]
+
+    def set(self, key: Hashable, value: V) -> None:
+        """Сохранит значение по ключу."""
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Удалит значение по ключу."""
+        with self._lock:
+            self._items.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[V], bool]) -> int:
+        """Удалит значения, для которых выполняется условие.
+
+        Вернёт количество удалённых значений.
+        """
+        with self._lock:
+            keys = [
+                key for key, (_, value) in self._items.items()
+                if predicate(value)
+            ]
+            for key in keys:
+                del self._items[key]
+
+            return len(keys)
+
+    def clear(self) -> None:
+        """Очистит кэш."""
+        with self._lock:
+            self._items.clear()
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Set
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingScheduler:
+    """Планировщик фоновых пересчётов со слиянием повторных запусков.
+
+    Для каждого ключа одновременно выполняется не более одного пересчёта.
+    Вызовы, пришедшие во время ожидания или выполнения пересчёта,
+    схлопываются в один завершающий запуск после окна debounce.
+    """
+
+    def __init__(self, name: str, debounce_seconds: float = 0) -> None:
+        self.name = name
+        self.debounce_seconds = debounce_seconds
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._dirty: Set[Hashable] = set()
+
+    def trigger(
+            self, key: Hashable,
+            func: Callable[[], Awaitable[None]],
+    ) -> None:
+        """Запланирует пересчёт для ключа."""
+        metrics.increment(f'{self.name}.triggers')
+        if key in self._tasks:
+            self._dirty.add(key)
+            metrics.increment(f'{self.name}.coalesced')
+            return
+
+        self._tasks[key] = asyncio.create_task(self._run(key, func))
+
+    def is_pending(self, key: Hashable) -> bool:
+        """Проверит, запланирован ли или выполняется пересчёт для ключа."""
+        return key in self._tasks
+
+    async def drain(self) -> None:
+        """Дождётся завершения всех запланированных пересчётов."""
+        while self._tasks:
+            await asyncio.gather(
+                *list(self._tasks.values()), return_exceptions=True
+            )
+
+    async def _run(
+            self, key: Hashable,
+            func: Callable[[], Awaitable[None]],
+    ) -> None:
+        try:
+            while True:
+                if self.debounce_seconds:
+                    await asyncio.sleep(self.debounce_seconds)
+                self._dirty.discard(key)
+                try:
+                    metrics.increment(f'{self.name}.runs')
+                    await func()
+                except Exception as e:
+                    metrics.increment(f'{self.name}.errors')
+                    logger.error(
+                        f'Ошибка фонового пересчёта {self.name} '
+                        f'для ключа {key}: {e.__str__()}'
+                    )
+                if key not in self._dirty:
+                    break
+        finally:
+            self._tasks.pop(key, None)
+            self._dirty.discard(key)
@@ -19,6 +19,61 @@ PRODUCTION_MODE = (os.environ.get('PRODUCTION_MODE', '')).lower() == 'true' or F
 
 USE_MOCK_LLM = (os.environ.get('USE_MOCK_LLM', '')).lower() == 'true'
 LLM_RATE_LIMIT_SECONDS = int(os.environ.get('LLM_RATE_LIMIT', '1800'))
+LLM_HTTP_POOL_LIMIT = int(os.environ.get('LLM_HTTP_POOL_LIMIT', '100'))
+LLM_HTTP_POOL_LIMIT_PER_HOST = int(
+    os.environ.get('LLM_HTTP_POOL_LIMIT_PER_HOST', '20')
+)
+LLM_HTTP_KEEPALIVE_SECONDS = float(
+    os.environ.get('LLM_HTTP_KEEPALIVE', '60')
+)
+LLM_HTTP_DNS_CACHE_SECONDS = int(os.environ.get('LLM_HTTP_DNS_CACHE', '300'))
+LLM_HTTP_CONNECT_TIMEOUT_SECONDS = float(
+    os.environ.get('LLM_HTTP_CONNECT_TIMEOUT', '10')
+)
+LLM_RESPONSE_CACHE_TTL_SECONDS = float(
+    os.environ.get('LLM_RESPONSE_CACHE_TTL', '86400')
+)
+LLM_RESPONSE_CACHE_SIZE = int(os.environ.get('LLM_RESPONSE_CACHE_SIZE', '256'))
+LLM_RESPONSE_CACHE_PERSISTENT = (
+    os.environ.get('LLM_RESPONSE_CACHE_PERSISTENT', '').lower() == 'true'
+)
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(
+    os.environ.get('LLM_CIRCUIT_FAILURE_THRESHOLD', '3')
+)
+LLM_CIRCUIT_ERROR_RATE = float(os.environ.get('LLM_CIRCUIT_ERROR_RATE', '0.5'))
+LLM_CIRCUIT_COOLDOWN_SECONDS = float(
+    os.environ.get('LLM_CIRCUIT_COOLDOWN', '60')
+)
+LLM_CIRCUIT_RATE_LIMIT_COOLDOWN_SECONDS = float(
+    os.environ.get('LLM_CIRCUIT_RATE_LIMIT_COOLDOWN', '120')
+)
+LAB_JOB_WORKERS = int(os.environ.get('LAB_JOB_WORKERS', '4'))
+LAB_JOB_POLL_SECONDS = float(os.environ.get('LAB_JOB_POLL', '2'))
+LAB_JOB_STALE_SECONDS = float(os.environ.get('LAB_JOB_STALE', '600'))
+LAB_JOB_HEARTBEAT_SECONDS = float(os.environ.get('LAB_JOB_HEARTBEAT', '60'))
+LAB_JOB_MAX_ATTEMPTS = int(os.environ.get('LAB_JOB_MAX_ATTEMPTS', '3'))
+LLM_MAP_REDUCE_CONCURRENCY = int(
+    os.environ.get('LLM_MAP_REDUCE_CONCURRENCY', '4')
+)
+PREPROCESSING_WORKERS = int(
+    os.environ.get('PREPROCESSING_WORKERS', str(os.cpu_count() or 1))
+)
+SOLUTION_TEXT_CACHE_SIZE = int(
+    os.environ.get('SOLUTION_TEXT_CACHE_SIZE', '4096')
+)
+SOLUTION_TEXT_CACHE_TTL_SECONDS = float(
+    os.environ.get('SOLUTION_TEXT_CACHE_TTL', '86400')
+)
+
+COMMUNITY_SETTINGS_DEBOUNCE_SECONDS = float(
+    os.environ.get('COMMUNITY_SETTINGS_DEBOUNCE', '2')
+)
+VOTE_RECOUNT_DEBOUNCE_SECONDS = float(
+    os.environ.get('VOTE_RECOUNT_DEBOUNCE', '0.5')
+)
+VOTE_MATRIX_SNAPSHOT_TTL_SECONDS = float(
+    os.environ.get('VOTE_MATRIX_SNAPSHOT_TTL', '30')
+)
 
 JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
 PASSWORD_SECRET_KEY = os.environ.get('PASSWORD_SECRET_KEY')
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from typing import TypedDict
+from decimal import Decimal
+from typing import List, Literal, Optional, TypedDict
 
 
 @dataclass(kw_only=True)
@@ -22,6 +23,31 @@ class BaseTimeParams:
     dispute_time_limit: int
 
 
+# Правило выбора победителей при взвешенном подсчёте голосов:
+# multi - все варианты, преодолевшие порог;
+# single - только лидер, преодолевший порог;
+# unique_leader - лидер, преодолевший порог, если он единственный с таким весом
+TallyWinnerRule = Literal['multi', 'single', 'unique_leader']
+
+
+@dataclass(kw_only=True)
+class TallyItem:
+    id: str
+    value: str
+    weight: Decimal
+    position: int
+    is_winner: bool
+    minority_weight: Optional[Decimal]
+    minority_position: Optional[int]
+
+
+@dataclass(kw_only=True)
+class WeightedTally:
+    total_users: int
+    total_weight: Decimal
+    items: List[TallyItem]
+
+
 class PercentByName(TypedDict):
     percent: int
     name: str
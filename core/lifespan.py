@@ -22,6 +22,11 @@ except ImportError:
     spec.loader.exec_module(scheduler_module)
     scheduler_service = scheduler_module.scheduler_service
 
+from entities.community.ao.datastorage import community_settings_scheduler
+from entities.user_voting_result.ao.datastorage import vote_recount_scheduler
+from llm.services.http_client import llm_http_client
+from llm.services.lab_jobs import lab_job_queue
+
 logger = logging.getLogger(__name__)
 
 
@@ -41,10 +46,33 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Ошибка запуска планировщика: {e}")
 
+    llm_http_client.start()
+    lab_job_queue.start()
+
     yield
 
     # Остановка планировщика при завершении приложения
     logger.info("Завершение работы приложения...")
+    try:
+        await community_settings_scheduler.drain()
+    except Exception as e:
+        logger.error(f"Ошибка завершения пересчёта настроек: {e}")
+
+    try:
+        await vote_recount_scheduler.drain()
+    except Exception as e:
+        logger.error(f"Ошибка завершения пересчёта голосов: {e}")
+
+    try:
+        await lab_job_queue.close()
+    except Exception as e:
+        logger.error(f"Ошибка остановки воркеров задач лаборатории: {e}")
+
+    try:
+        await llm_http_client.close()
+    except Exception as e:
+        logger.error(f"Ошибка закрытия HTTP пула LLM: {e}")
+
     try:
         scheduler_service.shutdown()
         logger.info("Планировщик успешно остановлен")
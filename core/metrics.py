@@ -0,0 +1,35 @@
+from collections import defaultdict
+from threading import Lock
+from typing import Dict
+
+
+class MetricsRegistry:
+    """In-memory счётчики для мониторинга в рамках процесса."""
+
+    def __init__(self) -> None:
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._lock = Lock()
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """Увеличит значение счётчика."""
+        with self._lock:
+            self._counters[name] += value
+
+    def get(self, name: str) -> int:
+        """Вернёт текущее значение счётчика."""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Вернёт значения всех счётчиков."""
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self) -> None:
+        """Сбросит все счётчики."""
+        with self._lock:
+            self._counters.clear()
+
+
+# Глобальный экземпляр счётчиков
+metrics = MetricsRegistry()
@@ -0,0 +1,18 @@
+from typing import Dict
+
+from fastapi import APIRouter, Depends
+
+from auth.auth import auth_service
+from core.metrics import metrics
+
+router = APIRouter()
+
+
+@router.get(
+    '',
+    dependencies=[Depends(auth_service.get_current_user)],
+    response_model=Dict[str, int],
+)
+async def get_metrics() -> Dict[str, int]:
+    """Вернёт значения счётчиков текущего процесса."""
+    return metrics.get_stats()
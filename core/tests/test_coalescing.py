@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from core.coalescing import CoalescingScheduler
+from core.metrics import metrics
+
+
+@pytest.mark.asyncio
+async def test_triggers_coalesced_into_trailing_run():
+    metrics.reset()
+    scheduler = CoalescingScheduler(name='test', debounce_seconds=0.01)
+    calls = []
+    running = 0
+    max_running = 0
+
+    async def recount():
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    for _ in range(10):
+        scheduler.trigger('community', recount)
+    await asyncio.sleep(0.015)
+    for _ in range(5):
+        scheduler.trigger('community', recount)
+    await scheduler.drain()
+
+    assert len(calls) == 2
+    assert max_running == 1
+    assert not scheduler.is_pending('community')
+    assert metrics.get('test.triggers') == 15
+    assert metrics.get('test.coalesced') == 14
@@ -0,0 +1,74 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+
+from entities.noncompliance.crud.dataclasses import NoncomplianceData
+from entities.voting_option.dataclasses import VotingOptionData
+
+if TYPE_CHECKING:
+    from entities.user_voting_result.ao.interfaces import ResourceType
+
+
+@dataclass(kw_only=True)
+class TallyResource:
+    id: str
+    resource_type: 'ResourceType'
+    title: str
+    voting_result_id: str
+    is_extra_options: bool
+    is_multi_select: bool
+    status_code: str
+    vote: Optional[bool]
+    is_significant_minority: bool
+    is_noncompliance_minority: bool
+
+
+@dataclass(kw_only=True)
+class VoteMatrix:
+    """Компактная матрица голосов сообщества.
+
+    Голоса хранятся по строке на пользовательский результат голосования,
+    выбор вариантов ответа и несоответствий - по строке на связь.
+    Ссылки на ресурсы, участников, голоса и варианты заданы индексами.
+    """
+    resources: List[TallyResource]
+    # Голоса: индекс ресурса (-1 - не найден), участника,
+    # значение (1 - за, 0 - против, -1 - воздержался), блокировка
+    vote_resource: np.ndarray
+    vote_member: np.ndarray
+    vote_value: np.ndarray
+    vote_blocked: np.ndarray
+    # Ресурс голоса по rule_id / initiative_id (-1 - не найден)
+    vote_choice_resource: np.ndarray
+    # Выбор: индекс строки голоса, варианта и признак несоответствия
+    choice_vote: np.ndarray
+    choice_item: np.ndarray
+    choice_is_noncompliance: np.ndarray
+    # Варианты: id и значение (None - вариант удалён)
+    item_ids: List[str]
+    item_values: List[Optional[str]]
+
+
+@dataclass(kw_only=True)
+class TallyOutcome:
+    """Итог голосования по ресурсу.
+
+    Значение None у вариантов ответа и несоответствий означает,
+    что при подсчёте они не меняются.
+    """
+    resource_id: str
+    resource_type: 'ResourceType'
+    yes: int
+    no: int
+    abstain: int
+    is_quorum: bool
+    is_decision: bool
+    vote: Optional[bool]
+    is_significant_minority: bool
+    is_noncompliance_minority: bool
+    options: Optional[Dict[str, VotingOptionData]]
+    minority_options: Optional[Dict[str, VotingOptionData]]
+    noncompliance: Optional[Dict[str, NoncomplianceData]]
+    minority_noncompliance: Optional[Dict[str, NoncomplianceData]]
+    status_code: str
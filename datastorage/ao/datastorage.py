@@ -1,23 +1,36 @@
 import logging
-from typing import Optional, Tuple, Dict, List, cast
+from decimal import Decimal
+from typing import (
+    Any, Optional, Tuple, Dict, List, Literal, Set, Union, cast
+)
+
+import numpy as np
 
-from sqlalchemy import text, select, func, case, distinct
+from sqlalchemy import text, select, func, case, event
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql.elements import TextClause
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from core.cache import TTLCache
+from core.config import VOTE_MATRIX_SNAPSHOT_TTL_SECONDS
 from core.dataclasses import (
-    BaseVotingParams, SimpleVoteResult, BaseTimeParams
+    BaseVotingParams, SimpleVoteResult, BaseTimeParams, TallyItem,
+    TallyWinnerRule, WeightedTally
 )
+from core.metrics import metrics
 from datastorage.database.models import (
     Initiative, Rule, RequestMember, UserCommunitySettings, UserVotingResult,
-    VotingOption, VotingResult, Status, RelationUserVrNoncompliance,
-    Noncompliance
+    VotingResult, Status, Community, CommunitySettings
+)
+from datastorage.ao.dataclasses import (
+    TallyOutcome, TallyResource, VoteMatrix
 )
 from datastorage.ao.interfaces import AO
+from datastorage.ao.tally import VoteTally
 from datastorage.base import DataStorage
 from datastorage.consts import Code
-from datastorage.database.models import RelationUserVrVo
+from datastorage.database.classes import TableName
 from datastorage.interfaces import T
 from entities.noncompliance.crud.dataclasses import NoncomplianceData
 from entities.user_voting_result.ao.interfaces import Resource, ResourceType
@@ -25,6 +38,28 @@ from entities.voting_option.dataclasses import VotingOptionData
 
 logger = logging.getLogger(__name__)
 
+TallySource = Literal['options', 'noncompliance']
+
+# Таблица связей с голосами, таблица вариантов и колонка с их значением
+TALLY_SOURCES: Dict[TallySource, Tuple[str, str, str]] = {
+    'options': (
+        TableName.RELATION_USER_VR_VO,
+        TableName.VOTING_OPTION,
+        'content',
+    ),
+    'noncompliance': (
+        TableName.RELATION_USER_VR_NONCOMPLIANCE,
+        TableName.NONCOMPLIANCE,
+        'name',
+    ),
+}
+
+# Снимки матриц голосов сообществ для предварительных подсчётов
+vote_matrix_snapshots: TTLCache[VoteMatrix] = TTLCache(
+    name='vote_matrix_snapshot',
+    ttl_seconds=VOTE_MATRIX_SNAPSHOT_TTL_SECONDS,
+)
+
 
 class AODataStorage(DataStorage[T], AO):
     """Дополнительная бизнес-логика для модели."""
@@ -124,6 +159,7 @@ class AODataStorage(DataStorage[T], AO):
         data = await self._session.execute(
             query, {'community_id': community_id})
         quorum_median, vote_median, minority_median = data.fetchone()
+        metrics.increment('voting_params.median_computed')
 
         return BaseVotingParams(
             vote=int(vote_median),
@@ -131,6 +167,92 @@ class AODataStorage(DataStorage[T], AO):
             significant_minority=int(minority_median),
         )
 
+    async def get_voting_params(
+            self, community_id: str
+    ) -> BaseVotingParams:
+        """Вернёт текущие параметры голосований сообщества.
+
+        Параметры читаются из основных настроек сообщества, которые
+        пересчитываются только при изменении пользовательских настроек,
+        поэтому подсчёт голосов обходится без агрегирующего запроса.
+        """
+        voting_params = await self._get_settings_voting_params(community_id)
+        if voting_params is None:
+            return await self.calc_voting_params(community_id)
+
+        metrics.increment('voting_params.median_avoided')
+
+        return voting_params
+
+    async def _get_settings_voting_params(
+            self, community_id: str
+    ) -> Optional[BaseVotingParams]:
+        """Вернёт параметры голосований из основных настроек сообщества."""
+        query = (
+            select(
+                CommunitySettings.vote,
+                CommunitySettings.quorum,
+                CommunitySettings.significant_minority,
+            )
+            .join(Community, Community.main_settings_id == CommunitySettings.id)
+            .where(Community.id == community_id)
+        )
+        row = (await self._session.execute(query)).first()
+        if row is None:
+            return None
+
+        vote, quorum, significant_minority = row
+
+        return BaseVotingParams(
+            vote=vote,
+            quorum=quorum,
+            significant_minority=significant_minority,
+        )
+
+    async def refresh_voting_params(
+            self, community_id: str,
+            recount_votes: bool = False,
+    ) -> BaseVotingParams:
+        """Пересчитает медианные параметры голосований и сроков
+        и сохранит их в основных настройках сообщества.
+
+        С recount_votes при изменении параметров сразу пересчитываются
+        все голоса. Без него last_voting_params не меняется, и пересчёт
+        голосов выполнит пересчёт настроек сообщества.
+        """
+        voting_params = await self.calc_voting_params(community_id)
+        time_params = await self.calc_time_params(community_id)
+        query = (
+            select(CommunitySettings)
+            .join(Community, Community.main_settings_id == CommunitySettings.id)
+            .where(Community.id == community_id)
+        )
+        community_settings: Optional[CommunitySettings] = (
+            await self._session.scalar(query)
+        )
+        if community_settings:
+            community_settings.vote = voting_params.vote
+            community_settings.quorum = voting_params.quorum
+            community_settings.significant_minority = (
+                voting_params.significant_minority
+            )
+            community_settings.decision_delay = time_params.decision_delay
+            community_settings.dispute_time_limit = (
+                time_params.dispute_time_limit
+            )
+            is_changed_voting_params = (
+                    voting_params.__dict__ !=
+                    (community_settings.last_voting_params or {})
+            )
+            if recount_votes and is_changed_voting_params:
+                await self.recount_of_all_votes(
+                    community_id=community_id,
+                    voting_params=voting_params,
+                )
+                community_settings.last_voting_params = voting_params.__dict__
+
+        return voting_params
+
     async def calc_time_params(self, community_id: str) -> BaseTimeParams:
         """Вычисляет медианные значения для сроков сообщества."""
         query = text("""
@@ -192,6 +314,70 @@ class AODataStorage(DataStorage[T], AO):
                 f'Параметры: community_id={community_id}'
             )
 
+    async def create_user_voting_results(
+            self, community_id: str,
+            voting_result_id: str,
+            creator_id: str,
+            extra_option_ids: List[str],
+            rule_id: Optional[str] = None,
+            initiative_id: Optional[str] = None,
+    ) -> None:
+        """Создаст результаты голосования для всех участников сообщества
+        и привяжет к результату автора предложенные им варианты ответов.
+        """
+        user_results_query = text("""
+            INSERT INTO public.user_voting_result (
+                id, member_id, community_id, voting_result_id,
+                rule_id, initiative_id, is_blocked,
+                is_voted_myself, is_voted_by_default
+            )
+            SELECT
+                gen_random_uuid()::varchar,
+                ucs.user_id,
+                ucs.community_id,
+                :voting_result_id,
+                :rule_id,
+                :initiative_id,
+                ucs.is_blocked,
+                FALSE,
+                FALSE
+            FROM public.user_community_settings ucs
+            WHERE ucs.community_id = :community_id;
+        """)
+        await self._session.execute(
+            user_results_query,
+            {
+                'community_id': community_id,
+                'voting_result_id': voting_result_id,
+                'rule_id': rule_id,
+                'initiative_id': initiative_id,
+            }
+        )
+        if not extra_option_ids:
+            return
+
+        extra_options_query = text("""
+            INSERT INTO public.relation_user_voting_result_voting_options (
+                id, from_id, to_id
+            )
+            SELECT
+                gen_random_uuid()::varchar,
+                uvr.id,
+                option_id
+            FROM public.user_voting_result uvr
+            CROSS JOIN UNNEST(CAST(:option_ids AS varchar[])) AS option_id
+            WHERE uvr.voting_result_id = :voting_result_id
+              AND uvr.member_id = :creator_id;
+        """)
+        await self._session.execute(
+            extra_options_query,
+            {
+                'voting_result_id': voting_result_id,
+                'creator_id': creator_id,
+                'option_ids': extra_option_ids,
+            }
+        )
+
     async def get_status_by_code(self, code: str) -> Optional[Status]:
         """Получить статус по коду."""
         status_query = select(Status).where(Status.code == code)
@@ -236,9 +422,9 @@ class AODataStorage(DataStorage[T], AO):
         через пересчёт голосов по дочерним запросам.
         """
         if voting_params is None:
-            voting_params = await self.calc_voting_params(
-            request_member.community_id
-        )
+            voting_params = await self.get_voting_params(
+                request_member.community_id
+            )
         last_vote = request_member.vote
         last_status: Status = request_member.status
         vote_in_percent = await self.get_vote_stats_by_requests_member(
@@ -285,7 +471,7 @@ class AODataStorage(DataStorage[T], AO):
     ) -> None:
         """Подсчет голосов."""
         if voting_params is None:
-            voting_params = await self.calc_voting_params(
+            voting_params = await self.get_voting_params(
                 cast(str, resource.community_id)
             )
 
@@ -463,172 +649,21 @@ class AODataStorage(DataStorage[T], AO):
             resource_type: ResourceType,
             voting_params: BaseVotingParams,
     ) -> Tuple[Dict[str, VotingOptionData], Dict[str, VotingOptionData]]:
-        filters = [UserVotingResult.is_blocked.isnot(True)]
-        match resource_type:
-            case 'rule':
-                filters.append(UserVotingResult.rule_id == resource.id)
-            case 'initiative':
-                filters.append(UserVotingResult.initiative_id == resource.id)
-
-        total_users_query = select(
-            func.count(distinct(UserVotingResult.member_id))
-        ).where(*filters)
-        total_users = await self._session.scalar(total_users_query)
-
-        if total_users == 0:
-            return {}, {}
-
-        min_count = (voting_params.vote / 100) * total_users
-        min_count_minority = (
-                (voting_params.significant_minority / 100) * total_users
-        )
-
-        # Шаг 1: Получаем веса всех вариантов
-        weight_subquery = (
-            select(
-                RelationUserVrVo.to_id.label('option_id'),
-                UserVotingResult.id.label('user_result_id'),
-                (1.0 / func.count(RelationUserVrVo.to_id).over(
-                    partition_by=UserVotingResult.id
-                )).label('weight')
-            )
-            .join(UserVotingResult,
-                  UserVotingResult.id == RelationUserVrVo.from_id)
-            .where(*filters)
-        ).subquery()
-
-        # Шаг 2: Агрегируем веса по вариантам
-        all_options_query = (
-            select(
-                weight_subquery.c.option_id,
-                func.sum(weight_subquery.c.weight).label('total_weight'),
-                VotingOption
-            )
-            .join(VotingOption,
-                  VotingOption.id == weight_subquery.c.option_id)
-            .group_by(weight_subquery.c.option_id, VotingOption.id)
+        tally = await self.get_weighted_tally(
+            source='options',
+            resource_type=resource_type,
+            resource_id=resource.id,
+            winner_rule='multi' if resource.is_multi_select else 'single',
+            vote=voting_params.vote,
         )
-
-        all_options_result = await self._session.execute(all_options_query)
-        all_options_data = all_options_result.all()
-
-        if not all_options_data:
+        if not tally.total_users or not tally.items:
             return {}, {}
 
-        # Шаг 3: Определяем победителей в зависимости от is_multi_select
-        winners = {}
-        winner_ids = set()
-
-        sorted_all_options = sorted(all_options_data,
-                                    key=lambda x: x.total_weight, reverse=True)
-
-        if resource.is_multi_select:
-            # Множественный результат: все варианты, преодолевшие порог
-            for idx, (option_id, weight, voting_option) in enumerate(
-                    sorted_all_options, 1):
-                if weight >= min_count:
-                    percent = int((weight / total_users) * 100)
-                    winners[option_id] = VotingOptionData(
-                        number=idx,
-                        value=voting_option.content,
-                        percent=percent,
-                    )
-                    winner_ids.add(option_id)
-        else:
-            # Единственный результат: только лидер, если он преодолел порог
-            if sorted_all_options:
-                option_id, weight, voting_option = sorted_all_options[0]
-                if weight >= min_count:
-                    percent = int((weight / total_users) * 100)
-                    winners[option_id] = VotingOptionData(
-                        number=1,
-                        value=voting_option.content,
-                        percent=percent,
-                    )
-                    winner_ids.add(option_id)
-
-        # Шаг 4: Находим голосующих, которые НЕ поддержали ни одного победителя
-        minority = {}
-
-        if winner_ids:
-            # Подзапрос: пользователи, которые голосовали за победителей
-            users_voted_for_winners = (
-                select(distinct(UserVotingResult.id))
-                .join(RelationUserVrVo,
-                      UserVotingResult.id == RelationUserVrVo.from_id)
-                .where(
-                    *filters,
-                    RelationUserVrVo.to_id.in_(winner_ids)
-                )
-            ).scalar_subquery()
-
-            # Фильтр для голосующих, которые НЕ поддержали победителей
-            minority_filters = filters + [
-                UserVotingResult.id.notin_(users_voted_for_winners)
-            ]
-
-            # Шаг 5: Пересчитываем веса для меньшинства
-            minority_weight_subquery = (
-                select(
-                    RelationUserVrVo.to_id.label('option_id'),
-                    (1.0 / func.count(RelationUserVrVo.to_id).over(
-                        partition_by=UserVotingResult.id
-                    )).label('weight')
-                )
-                .join(UserVotingResult,
-                      UserVotingResult.id == RelationUserVrVo.from_id)
-                .where(*minority_filters)
-            ).subquery()
-
-            # Шаг 6: Агрегируем веса меньшинства (исключая победителей)
-            minority_options_query = (
-                select(
-                    minority_weight_subquery.c.option_id,
-                    func.sum(minority_weight_subquery.c.weight).label(
-                        'total_weight'),
-                    VotingOption
-                )
-                .join(VotingOption,
-                      VotingOption.id == minority_weight_subquery.c.option_id)
-                .where(minority_weight_subquery.c.option_id.notin_(winner_ids))
-                .group_by(minority_weight_subquery.c.option_id,
-                          VotingOption.id)
-                .having(
-                    func.sum(
-                        minority_weight_subquery.c.weight) >= min_count_minority
-                )
-            )
-
-            minority_result = await self._session.execute(
-                minority_options_query)
-            minority_data = minority_result.all()
-
-            # Шаг 7: Формируем результат меньшинства
-            for idx, (option_id, weight, voting_option) in enumerate(
-                    sorted(minority_data, key=lambda x: x.total_weight,
-                           reverse=True), 1
-            ):
-                # Процент рассчитываем от общего числа пользователей
-                percent = int((weight / total_users) * 100)
-                minority[option_id] = VotingOptionData(
-                    number=idx,
-                    value=voting_option.content,
-                    percent=percent,
-                )
-        else:
-            # Если нет победителей, все варианты,
-            # преодолевшие порог меньшинства, попадают в minority
-            for idx, (option_id, weight, voting_option) in enumerate(
-                    sorted_all_options, 1):
-                if weight >= min_count_minority:
-                    percent = int((weight / total_users) * 100)
-                    minority[option_id] = VotingOptionData(
-                        number=idx,
-                        value=voting_option.content,
-                        percent=percent,
-                    )
-
-        return winners, minority
+        return self._split_tally(
+            tally=tally,
+            total=tally.total_users,
+            significant_minority=voting_params.significant_minority,
+        )
 
     async def _get_new_noncompliance(
             self,
@@ -639,154 +674,225 @@ class AODataStorage(DataStorage[T], AO):
         if resource_type == 'initiative':
             return {}, {}
 
-        filters = [
-            UserVotingResult.is_blocked.isnot(True),
-            UserVotingResult.rule_id == resource.id,
-        ]
+        tally = await self.get_weighted_tally(
+            source='noncompliance',
+            resource_type=resource_type,
+            resource_id=resource.id,
+            winner_rule='unique_leader',
+            vote=voting_params.vote,
+        )
+        if not tally.items or tally.total_weight <= 0:
+            return {}, {}
 
-        # Шаг 1: Получаем все веса для noncompliance
-        all_weight_subquery = (
-            select(
-                RelationUserVrNoncompliance.to_id.label('nc_id'),
-                UserVotingResult.id.label('user_result_id'),
-                (1.0 / func.count(RelationUserVrNoncompliance.to_id).over(
-                    partition_by=UserVotingResult.id
-                )).label('weight')
-            )
-            .join(UserVotingResult,
-                  UserVotingResult.id == RelationUserVrNoncompliance.from_id)
-            .where(*filters)
-        ).subquery()
+        return self._split_tally(
+            tally=tally,
+            total=tally.total_weight,
+            significant_minority=voting_params.significant_minority,
+        )
 
-        # Шаг 2: Агрегируем все веса
-        all_nc_query = (
-            select(
-                all_weight_subquery.c.nc_id,
-                func.sum(all_weight_subquery.c.weight).label('total_weight'),
-                Noncompliance
+    async def get_weighted_tally(
+            self,
+            source: TallySource,
+            resource_type: ResourceType,
+            resource_id: str,
+            winner_rule: TallyWinnerRule,
+            vote: int,
+    ) -> WeightedTally:
+        """Взвешенный подсчёт голосов за варианты ответов
+        или несоответствия одним запросом.
+
+        Голос участника делится поровну между выбранными им вариантами.
+        Для каждого варианта возвращается суммарный вес, признак победителя
+        и вес среди участников, не поддержавших ни одного победителя.
+        Порог победы для вариантов ответов считается от числа участников,
+        для несоответствий - от суммарного веса.
+        """
+        query = self.build_weighted_tally_query(
+            source=source,
+            resource_type=resource_type,
+            winner_rule=winner_rule,
+        )
+        rows = (await self._session.execute(
+            query, {'resource_id': resource_id, 'vote': vote}
+        )).all()
+        if not rows:
+            return WeightedTally(
+                total_users=0, total_weight=Decimal(0), items=[]
             )
-            .join(Noncompliance,
-                  Noncompliance.id == all_weight_subquery.c.nc_id)
-            .group_by(all_weight_subquery.c.nc_id, Noncompliance.id)
+
+        return WeightedTally(
+            total_users=rows[0].total_users,
+            total_weight=rows[0].total_weight,
+            items=[
+                TallyItem(
+                    id=row.item_id,
+                    value=row.value,
+                    weight=row.weight,
+                    position=row.position,
+                    is_winner=row.is_winner,
+                    minority_weight=row.minority_weight,
+                    minority_position=row.minority_position,
+                )
+                for row in rows
+            ],
         )
 
-        all_nc_result = await self._session.execute(all_nc_query)
-        all_nc_data = all_nc_result.all()
+    @staticmethod
+    def build_weighted_tally_query(
+            source: TallySource,
+            resource_type: ResourceType,
+            winner_rule: TallyWinnerRule,
+    ) -> TextClause:
+        """Построит запрос взвешенного подсчёта голосов
+        с параметрами resource_id и vote.
+        """
+        relation_table, item_table, value_column = TALLY_SOURCES[source]
+        resource_column = f'{resource_type}_id'
+        threshold_base = (
+            'r.total_weight' if source == 'noncompliance' else 't.total_users'
+        )
+        winner_condition = f'r.weight * 100 >= :vote * {threshold_base}'
+        if winner_rule != 'multi':
+            winner_condition += ' AND r.position = 1'
+        if winner_rule == 'unique_leader':
+            winner_condition += ' AND r.same_weight_count = 1'
+
+        query = text(f"""
+            WITH voters AS (
+                SELECT id, member_id
+                FROM public.user_voting_result
+                WHERE {resource_column} = :resource_id
+                  AND is_blocked IS NOT TRUE
+            ),
+            totals AS (
+                SELECT COUNT(*) AS total_users
+                FROM (SELECT member_id FROM voters GROUP BY member_id) m
+            ),
+            choices AS (
+                SELECT
+                    rel.from_id AS voter_id,
+                    rel.to_id AS item_id,
+                    COUNT(*) OVER (PARTITION BY rel.from_id) AS size
+                FROM public.{relation_table} rel
+                JOIN voters v ON v.id = rel.from_id
+            ),
+            item_weights AS (
+                SELECT
+                    g.item_id,
+                    it.{value_column} AS value,
+                    ROUND(SUM(g.votes::numeric / g.size), 10) AS weight
+                FROM (
+                    SELECT item_id, size, COUNT(*) AS votes
+                    FROM choices
+                    GROUP BY item_id, size
+                ) g
+                JOIN public.{item_table} it ON it.id = g.item_id
+                GROUP BY g.item_id, it.{value_column}
+            ),
+            ranked AS (
+                SELECT
+                    item_id,
+                    value,
+                    weight,
+                    ROW_NUMBER() OVER (
+                        ORDER BY weight DESC, item_id
+                    ) AS position,
+                    COUNT(*) OVER (PARTITION BY weight) AS same_weight_count,
+                    SUM(weight) OVER () AS total_weight
+                FROM item_weights
+            ),
+            winners AS (
+                SELECT r.item_id
+                FROM ranked r
+                CROSS JOIN totals t
+                WHERE {winner_condition}
+            ),
+            minority_weights AS (
+                SELECT
+                    g.item_id,
+                    ROUND(SUM(g.votes::numeric / g.size), 10)
+                        AS minority_weight
+                FROM (
+                    SELECT c.item_id, c.size, COUNT(*) AS votes
+                    FROM choices c
+                    WHERE EXISTS (SELECT 1 FROM winners)
+                      AND c.item_id NOT IN (SELECT item_id FROM winners)
+                      AND c.voter_id NOT IN (
+                          SELECT wc.voter_id
+                          FROM choices wc
+                          JOIN winners w ON w.item_id = wc.item_id
+                      )
+                    GROUP BY c.item_id, c.size
+                ) g
+                GROUP BY g.item_id
+            )
+            SELECT
+                r.item_id,
+                r.value,
+                r.weight,
+                r.position,
+                w.item_id IS NOT NULL AS is_winner,
+                mw.minority_weight,
+                CASE WHEN mw.minority_weight IS NOT NULL THEN
+                    ROW_NUMBER() OVER (
+                        ORDER BY mw.minority_weight DESC NULLS LAST, r.item_id
+                    )
+                END AS minority_position,
+                t.total_users,
+                r.total_weight
+            FROM ranked r
+            CROSS JOIN totals t
+            LEFT JOIN winners w ON w.item_id = r.item_id
+            LEFT JOIN minority_weights mw ON mw.item_id = r.item_id
+            ORDER BY r.position;
+        """)
 
-        if not all_nc_data:
-            return {}, {}
+        return query
 
-        total_weight = sum(row.total_weight for row in all_nc_data)
-        if total_weight <= 0:
-            return {}, {}
+    @staticmethod
+    def _split_tally(
+            tally: WeightedTally,
+            total: Union[int, Decimal],
+            significant_minority: int,
+    ) -> Tuple[Dict[str, VotingOptionData], Dict[str, VotingOptionData]]:
+        """Разделит результат подсчёта на победителей и значимое меньшинство.
 
-        min_weight = (voting_params.vote / 100) * total_weight
-        min_minority = (
-                                   voting_params.significant_minority / 100) * total_weight
-
-        # Шаг 3: Определяем победителей среди noncompliance
-        winners = {}
-        winner_ids = set()
-        leader_weight = None
-
-        sorted_all_nc = sorted(all_nc_data, key=lambda x: x.total_weight,
-                               reverse=True)
-
-        for idx, (nc_id, weight, noncompliance) in enumerate(sorted_all_nc, 1):
-            if weight >= min_weight:
-                if not winners:
-                    winners[nc_id] = NoncomplianceData(
-                        number=idx,
-                        value=noncompliance.name,
-                        percent=int((weight / total_weight) * 100),
-                    )
-                    winner_ids.add(nc_id)
-                    leader_weight = weight
-                elif weight == leader_weight:
-                    # Если есть равные лидеры, очищаем победителей (нет единого лидера)
-                    winners.clear()
-                    winner_ids.clear()
-                    break
-                else:
-                    break
-
-        # Шаг 4: Если есть победители, вычисляем меньшинство по новой логике
-        minority_nc = {}
-
-        if winner_ids:
-            # Находим пользователей, которые НЕ голосовали за победителей
-            users_voted_for_winners = (
-                select(distinct(UserVotingResult.id))
-                .join(RelationUserVrNoncompliance,
-                      UserVotingResult.id == RelationUserVrNoncompliance.from_id)
-                .where(
-                    *filters,
-                    RelationUserVrNoncompliance.to_id.in_(winner_ids)
-                )
-            ).scalar_subquery()
-
-            minority_filters = filters + [
-                UserVotingResult.id.notin_(users_voted_for_winners)
-            ]
-
-            # Пересчитываем веса для меньшинства
-            minority_weight_subquery = (
-                select(
-                    RelationUserVrNoncompliance.to_id.label('nc_id'),
-                    (1.0 / func.count(RelationUserVrNoncompliance.to_id).over(
-                        partition_by=UserVotingResult.id
-                    )).label('weight')
-                )
-                .join(UserVotingResult,
-                      UserVotingResult.id == RelationUserVrNoncompliance.from_id)
-                .where(*minority_filters)
-            ).subquery()
-
-            minority_nc_query = (
-                select(
-                    minority_weight_subquery.c.nc_id,
-                    func.sum(minority_weight_subquery.c.weight).label(
-                        'total_weight'),
-                    Noncompliance
+        Если победители есть, меньшинство считается только по голосам
+        участников, не поддержавших ни одного победителя.
+        """
+        winners: Dict[str, VotingOptionData] = {}
+        minority: Dict[str, VotingOptionData] = {}
+        for item in tally.items:
+            if item.is_winner:
+                winners[item.id] = VotingOptionData(
+                    number=item.position,
+                    value=item.value,
+                    percent=int((item.weight / total) * 100),
                 )
-                .join(Noncompliance,
-                      Noncompliance.id == minority_weight_subquery.c.nc_id)
-                .where(minority_weight_subquery.c.nc_id.notin_(winner_ids))
-                .group_by(minority_weight_subquery.c.nc_id, Noncompliance.id)
-            )
 
-            minority_nc_result = await self._session.execute(minority_nc_query)
-            minority_nc_data = minority_nc_result.all()
-
-            if minority_nc_data:
-                minority_min_weight = (
-                    (voting_params.significant_minority / 100) * total_weight
-                )  # От общего веса
-
-                for idx, (nc_id, weight, noncompliance) in enumerate(
-                        sorted(minority_nc_data, key=lambda x: x.total_weight,
-                               reverse=True), 1
-                ):
-                    if weight >= minority_min_weight:
-                        percent = int(
-                            (weight / total_weight) * 100)  # От общего веса
-                        minority_nc[nc_id] = NoncomplianceData(
-                            number=idx,
-                            value=noncompliance.name,
-                            percent=percent,
-                        )
+        if winners:
+            minority_items = sorted(
+                (item for item in tally.items
+                 if item.minority_weight is not None),
+                key=lambda item: item.minority_position,
+            )
+            for item in minority_items:
+                if item.minority_weight * 100 >= significant_minority * total:
+                    minority[item.id] = VotingOptionData(
+                        number=item.minority_position,
+                        value=item.value,
+                        percent=int((item.minority_weight / total) * 100),
+                    )
         else:
-            # Если нет победителей, применяем старую логику для меньшинства
-            for idx, (nc_id, weight, noncompliance) in enumerate(sorted_all_nc, 1):
-                if weight >= min_minority:
-                    percent = int((weight / total_weight) * 100)
-                    minority_nc[nc_id] = NoncomplianceData(
-                        number=idx,
-                        value=noncompliance.name,
-                        percent=percent,
+            for item in tally.items:
+                if item.weight * 100 >= significant_minority * total:
+                    minority[item.id] = VotingOptionData(
+                        number=item.position,
+                        value=item.value,
+                        percent=int((item.weight / total) * 100),
                     )
 
-        return winners, minority_nc
+        return winners, minority
 
     async def _block_user_settings(
             self, request_member: RequestMember
@@ -808,8 +914,15 @@ class AODataStorage(DataStorage[T], AO):
             member_id=request_member.member_id,
             value=True
         )
+        #  Состав участников изменился, обновляем параметры голосований.
+        voting_params = await self.refresh_voting_params(
+            request_member.community_id
+        )
         #  Пересчитываем голоса в голосованиях.
-        await self._recount_community_vote(request_member.community_id)
+        await self._recount_community_vote(
+            community_id=request_member.community_id,
+            voting_params=voting_params,
+        )
 
     async def _unblock_user_settings(
             self, request_member: RequestMember
@@ -831,8 +944,15 @@ class AODataStorage(DataStorage[T], AO):
             member_id=request_member.member_id,
             value=False
         )
+        #  Состав участников изменился, обновляем параметры голосований.
+        voting_params = await self.refresh_voting_params(
+            request_member.community_id
+        )
         #  Пересчитываем голоса в голосованиях.
-        await self._recount_community_vote(request_member.community_id)
+        await self._recount_community_vote(
+            community_id=request_member.community_id,
+            voting_params=voting_params,
+        )
 
     async def get_vote_stats_by_requests_member(
             self,
@@ -921,29 +1041,280 @@ class AODataStorage(DataStorage[T], AO):
             community_id: str,
             voting_params: Optional[BaseVotingParams] = None,
     ) -> None:
-        """Пересчёт голосов по всем голосованиям сообщества."""
+        """Пересчёт голосов по всем голосованиям сообщества.
+
+        Итоги всех правил и инициатив считаются разом по матрице голосов,
+        статусы загружаются одним запросом.
+        """
         if voting_params is None:
-            voting_params = await self.calc_voting_params(community_id)
-
-        rules: List[Rule] = await self._get_community_rules(community_id)
-        for rule in rules:
-            await self.user_vote_count(
-                voting_result=rule.voting_result,
-                resource=rule,
-                resource_type='rule',
-                voting_params=voting_params,
+            voting_params = await self.get_voting_params(community_id)
+
+        resources: List[Tuple[Resource, ResourceType]] = [
+            *((rule, 'rule') for rule in
+              await self._get_community_rules(community_id)),
+            *((initiative, 'initiative') for initiative in
+              await self._get_community_initiatives(community_id)),
+        ]
+        if not resources:
+            return
+
+        matrix = await self.get_vote_matrix(
+            community_id=community_id,
+            resources=[
+                self._build_tally_resource(resource, resource_type)
+                for resource, resource_type in resources
+            ],
+        )
+        outcomes = VoteTally(matrix).compute(voting_params)
+        statuses = await self._get_statuses_by_codes(
+            {outcome.status_code for outcome in outcomes}
+        )
+        for (resource, _), outcome in zip(resources, outcomes):
+            self._apply_tally_outcome(
+                resource=resource,
+                outcome=outcome,
+                status=statuses.get(outcome.status_code, resource.status),
             )
+        self._invalidate_vote_matrix_after_commit(community_id)
 
-        initiatives: List[Initiative] = (
-            await self._get_community_initiatives(community_id)
+    def _invalidate_vote_matrix_after_commit(self, community_id: str) -> None:
+        """Сбросит снимок матрицы голосов сообщества после фиксации
+        транзакции.
+
+        Снимок, собранный параллельным предварительным подсчётом между
+        сбросом и фиксацией, иначе жил бы со старыми голосами весь TTL.
+        """
+        event.listen(
+            self._session.sync_session,
+            'after_commit',
+            lambda _: vote_matrix_snapshots.invalidate(community_id),
+            once=True,
         )
-        for initiative in initiatives:
-            await self.user_vote_count(
-                voting_result=initiative.voting_result,
-                resource=initiative,
-                resource_type='initiative',
-                voting_params=voting_params,
+
+    async def get_vote_matrix_snapshot(self, community_id: str) -> VoteMatrix:
+        """Вернёт снимок матрицы голосов сообщества.
+
+        Снимок переиспользуется повторными предварительными подсчётами
+        в течение VOTE_MATRIX_SNAPSHOT_TTL_SECONDS и сбрасывается
+        после пересчёта голосов сообщества.
+        """
+        matrix = vote_matrix_snapshots.get(community_id)
+        if matrix is not None:
+            return matrix
+
+        rules = await self._get_community_rules(community_id)
+        initiatives = await self._get_community_initiatives(community_id)
+        matrix = await self.get_vote_matrix(
+            community_id=community_id,
+            resources=[
+                *(self._build_tally_resource(rule, 'rule')
+                  for rule in rules),
+                *(self._build_tally_resource(initiative, 'initiative')
+                  for initiative in initiatives),
+            ],
+        )
+        vote_matrix_snapshots.set(community_id, matrix)
+
+        return matrix
+
+    async def get_vote_matrix(
+            self,
+            community_id: str,
+            resources: List[TallyResource],
+    ) -> VoteMatrix:
+        """Загрузит матрицу голосов сообщества одним запросом.
+
+        Индексы ресурсов, участников, голосов и вариантов вычисляются
+        в базе и возвращаются плоскими массивами.
+        """
+        items_query = ' UNION ALL '.join(
+            f"""
+                SELECT
+                    g.item_id,
+                    {source == 'noncompliance'} AS is_noncompliance,
+                    it.{value_column} AS value,
+                    g.vote_idx
+                FROM (
+                    SELECT rel.to_id AS item_id, ARRAY_AGG(v.idx) AS vote_idx
+                    FROM public.{relation_table} rel
+                    JOIN votes v ON v.id = rel.from_id
+                    GROUP BY rel.to_id
+                ) g
+                LEFT JOIN public.{item_table} it ON it.id = g.item_id
+            """
+            for source, (relation_table, item_table, value_column)
+            in TALLY_SOURCES.items()
+        )
+        query = text(f"""
+            WITH resources AS (
+                SELECT voting_result_id, resource_id, resource_type,
+                       idx - 1 AS idx
+                FROM UNNEST(
+                    CAST(:voting_result_ids AS varchar[]),
+                    CAST(:resource_ids AS varchar[]),
+                    CAST(:resource_types AS varchar[])
+                ) WITH ORDINALITY
+                    AS r(voting_result_id, resource_id, resource_type, idx)
+            ),
+            votes AS MATERIALIZED (
+                SELECT
+                    uvr.id,
+                    ROW_NUMBER() OVER () - 1 AS idx,
+                    DENSE_RANK() OVER (
+                        ORDER BY uvr.member_id COLLATE "C"
+                    ) - 1 AS member_idx,
+                    COALESCE(vr.idx, -1) AS resource_idx,
+                    COALESCE(cr.idx, -1) AS choice_resource_idx,
+                    CASE WHEN uvr.vote IS NULL THEN -1
+                         WHEN uvr.vote THEN 1
+                         ELSE 0
+                    END AS value,
+                    uvr.is_blocked IS TRUE AS is_blocked
+                FROM public.{TableName.USER_VOTING_RESULT} uvr
+                LEFT JOIN resources vr
+                    ON vr.voting_result_id = uvr.voting_result_id
+                LEFT JOIN resources cr
+                    ON cr.resource_type = CASE
+                        WHEN uvr.rule_id IS NOT NULL THEN 'rule'
+                        ELSE 'initiative'
+                    END
+                    AND cr.resource_id = COALESCE(
+                        uvr.rule_id, uvr.initiative_id
+                    )
+                WHERE uvr.community_id = :community_id
+            ),
+            items AS MATERIALIZED (
+                SELECT i.*, ROW_NUMBER() OVER () - 1 AS idx
+                FROM ({items_query}) i
             )
+            SELECT va.*, ia.*, ca.*
+            FROM (
+                SELECT
+                    ARRAY_AGG(idx) AS vote_idx,
+                    ARRAY_AGG(resource_idx) AS vote_resource,
+                    ARRAY_AGG(choice_resource_idx) AS vote_choice_resource,
+                    ARRAY_AGG(member_idx) AS vote_member,
+                    ARRAY_AGG(value) AS vote_value,
+                    ARRAY_AGG(is_blocked) AS vote_blocked
+                FROM votes
+            ) va
+            CROSS JOIN (
+                SELECT
+                    ARRAY_AGG(item_id ORDER BY idx) AS item_ids,
+                    ARRAY_AGG(value ORDER BY idx) AS item_values
+                FROM items
+            ) ia
+            CROSS JOIN (
+                SELECT
+                    ARRAY_AGG(v.vote_idx) AS choice_vote,
+                    ARRAY_AGG(i.idx) AS choice_item,
+                    ARRAY_AGG(i.is_noncompliance) AS choice_is_noncompliance
+                FROM items i
+                CROSS JOIN LATERAL UNNEST(i.vote_idx) AS v(vote_idx)
+            ) ca;
+        """)
+        row = (await self._session.execute(
+            query,
+            {
+                'community_id': community_id,
+                'voting_result_ids': [
+                    it.voting_result_id for it in resources
+                ],
+                'resource_ids': [it.id for it in resources],
+                'resource_types': [it.resource_type for it in resources],
+            },
+        )).one()
+
+        # Массивы голосов агрегируются в произвольном порядке,
+        # раскладываем их по индексам голосов
+        vote_idx = np.array(row.vote_idx or [], dtype=np.int64)
+
+        def by_vote(values: Optional[List[Any]], dtype: Any) -> np.ndarray:
+            result = np.empty(len(vote_idx), dtype=dtype)
+            result[vote_idx] = np.array(values or [], dtype=dtype)
+            return result
+
+        return VoteMatrix(
+            resources=resources,
+            vote_resource=by_vote(row.vote_resource, np.int64),
+            vote_member=by_vote(row.vote_member, np.int64),
+            vote_value=by_vote(row.vote_value, np.int64),
+            vote_blocked=by_vote(row.vote_blocked, bool),
+            vote_choice_resource=by_vote(row.vote_choice_resource, np.int64),
+            choice_vote=np.array(row.choice_vote or [], dtype=np.int64),
+            choice_item=np.array(row.choice_item or [], dtype=np.int64),
+            choice_is_noncompliance=np.array(
+                row.choice_is_noncompliance or [], dtype=bool
+            ),
+            item_ids=list(row.item_ids or []),
+            item_values=list(row.item_values or []),
+        )
+
+    @staticmethod
+    def _build_tally_resource(
+            resource: Resource,
+            resource_type: ResourceType,
+    ) -> TallyResource:
+        voting_result = resource.voting_result
+
+        return TallyResource(
+            id=resource.id,
+            resource_type=resource_type,
+            title=resource.title,
+            voting_result_id=voting_result.id,
+            is_extra_options=bool(resource.is_extra_options),
+            is_multi_select=bool(resource.is_multi_select),
+            status_code=resource.status.code,
+            vote=voting_result.vote,
+            is_significant_minority=bool(
+                voting_result.is_significant_minority
+            ),
+            is_noncompliance_minority=bool(
+                voting_result.is_noncompliance_minority
+            ),
+        )
+
+    @staticmethod
+    def _apply_tally_outcome(
+            resource: Resource,
+            outcome: TallyOutcome,
+            status: Status,
+    ) -> None:
+        """Перенесёт итог подсчёта в результат голосования и ресурс,
+        изменяя только отличающиеся поля.
+        """
+        voting_result = resource.voting_result
+        if voting_result.vote != outcome.vote:
+            voting_result.vote = outcome.vote
+        if (bool(voting_result.is_significant_minority) !=
+                outcome.is_significant_minority):
+            voting_result.is_significant_minority = (
+                outcome.is_significant_minority
+            )
+        if (bool(voting_result.is_noncompliance_minority) !=
+                outcome.is_noncompliance_minority):
+            voting_result.is_noncompliance_minority = (
+                outcome.is_noncompliance_minority
+            )
+        if outcome.options is not None:
+            voting_result.options = outcome.options
+            voting_result.minority_options = outcome.minority_options
+        if outcome.noncompliance is not None:
+            voting_result.noncompliance = outcome.noncompliance
+            voting_result.minority_noncompliance = (
+                outcome.minority_noncompliance
+            )
+        if resource.status is not status:
+            resource.status = status
+
+    async def _get_statuses_by_codes(
+            self, codes: Set[str],
+    ) -> Dict[str, Status]:
+        rows = await self._session.scalars(
+            select(Status).where(Status.code.in_(codes))
+        )
+
+        return {status.code: status for status in rows}
 
     async def _get_community_rules(self, community_id: str) -> List[Rule]:
         query = (
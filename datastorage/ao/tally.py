@@ -0,0 +1,473 @@
+from dataclasses import dataclass
+from math import lcm
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.dataclasses import BaseVotingParams
+from datastorage.ao.dataclasses import TallyOutcome, VoteMatrix
+from datastorage.consts import Code
+from entities.voting_option.dataclasses import VotingOptionData
+
+# Предел точных целочисленных весов в int64, при превышении
+# веса считаются в целых числах Python
+INT64_LIMIT = 2 ** 62
+
+SplitData = Tuple[Dict[str, VotingOptionData], Dict[str, VotingOptionData]]
+
+
+@dataclass(kw_only=True)
+class SourceTally:
+    """Взвешенный подсчёт по вариантам ответа или несоответствиям
+    сразу для всех ресурсов.
+
+    Веса целочисленные: голос участника, выбравшего k вариантов,
+    даёт каждому из них scale / k. Пары ресурс-вариант отсортированы
+    по ресурсу и позиции варианта.
+    """
+    resource: np.ndarray
+    item: np.ndarray
+    weight: np.ndarray
+    position: np.ndarray
+    is_winner: np.ndarray
+    minority_weight: np.ndarray
+    minority_position: np.ndarray
+    # База процентов и порогов по ресурсам в единицах веса
+    base: np.ndarray
+    has_winners: np.ndarray
+
+
+class VoteTally:
+    """Векторизованный подсчёт итогов всех голосований сообщества.
+
+    Повторяет правила AODataStorage.user_vote_count: кворум и решение
+    по процентам голосов, взвешенный выбор вариантов ответа
+    и несоответствий, значимое меньшинство и переходы статусов.
+    """
+
+    def __init__(self, matrix: VoteMatrix) -> None:
+        self.matrix = matrix
+
+    def compute(self, voting_params: BaseVotingParams) -> List[TallyOutcome]:
+        """Вычислит итоги по всем ресурсам матрицы."""
+        resources = self.matrix.resources
+        if not resources:
+            return []
+
+        is_rule = np.array(
+            [it.resource_type == 'rule' for it in resources], dtype=bool
+        )
+        is_extra = np.array(
+            [it.is_extra_options for it in resources], dtype=bool
+        )
+        is_multi_select = np.array(
+            [it.is_multi_select for it in resources], dtype=bool
+        )
+        last_status = np.array(
+            [it.status_code for it in resources], dtype=object
+        )
+        stored_minority = np.array(
+            [it.is_significant_minority for it in resources], dtype=bool
+        )
+
+        yes, no, abstain = self.vote_percents()
+        is_quorum = (yes + no) >= voting_params.quorum
+        is_decision = yes >= voting_params.vote
+        is_accepted = is_quorum & is_decision
+
+        total_users = self.total_users()
+        options = self.source_tally(
+            is_noncompliance=False,
+            vote=voting_params.vote,
+            is_multi_select=is_multi_select,
+            total_users=total_users,
+        )
+        noncompliance = self.source_tally(
+            is_noncompliance=True,
+            vote=voting_params.vote,
+            is_multi_select=is_multi_select,
+            total_users=total_users,
+        )
+        options_data = self.split(options, voting_params.significant_minority)
+        noncompliance_data = self.split(
+            noncompliance, voting_params.significant_minority
+        )
+        has_options_minority = np.array(
+            [bool(minority) for _, minority in options_data], dtype=bool
+        )
+        has_noncompliance_minority = np.array(
+            [bool(minority) for _, minority in noncompliance_data],
+            dtype=bool,
+        ) & is_rule
+
+        is_selected_options = is_accepted & is_extra & options.has_winners
+        is_selected_noncompliance = (
+            is_accepted & is_rule & noncompliance.has_winners
+        )
+        is_significant_minority = np.where(
+            is_accepted & is_extra, has_options_minority, stored_minority
+        )
+        is_noncompliance_minority = is_accepted & has_noncompliance_minority
+        status_codes = self.status_codes(
+            is_rule=is_rule,
+            last_status=last_status,
+            is_extra_options=is_extra,
+            is_selected_options=is_selected_options,
+            is_significant_minority=is_significant_minority,
+            is_selected_noncompliance=is_selected_noncompliance,
+            is_noncompliance_minority=is_noncompliance_minority,
+            is_quorum=is_quorum,
+            is_decision=is_decision,
+        )
+
+        outcomes: List[TallyOutcome] = []
+        for idx, resource in enumerate(resources):
+            vote: Optional[bool] = True
+            if is_accepted[idx]:
+                selected_options, minority_options = (
+                    options_data[idx] if is_extra[idx] else (None, None)
+                )
+                selected_nc, minority_nc = (
+                    noncompliance_data[idx] if is_rule[idx] else ({}, {})
+                )
+            else:
+                vote = (
+                    False if is_quorum[idx] or resource.vote
+                    else resource.vote
+                )
+                selected_options = minority_options = (
+                    {} if is_extra[idx] else None
+                )
+                selected_nc = minority_nc = {} if is_rule[idx] else None
+
+            outcomes.append(TallyOutcome(
+                resource_id=resource.id,
+                resource_type=resource.resource_type,
+                yes=int(yes[idx]),
+                no=int(no[idx]),
+                abstain=int(abstain[idx]),
+                is_quorum=bool(is_quorum[idx]),
+                is_decision=bool(is_decision[idx]),
+                vote=vote,
+                is_significant_minority=bool(
+                    is_accepted[idx] and is_significant_minority[idx]
+                ),
+                is_noncompliance_minority=bool(
+                    is_noncompliance_minority[idx]
+                ),
+                options=selected_options,
+                minority_options=minority_options,
+                noncompliance=selected_nc,
+                minority_noncompliance=minority_nc,
+                status_code=status_codes[idx],
+            ))
+
+        return outcomes
+
+    def vote_percents(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Проценты голосов за, против и воздержавшихся по ресурсам."""
+        matrix = self.matrix
+        count = len(matrix.resources)
+        mask = (matrix.vote_resource >= 0) & ~matrix.vote_blocked
+        resource = matrix.vote_resource[mask]
+        value = matrix.vote_value[mask]
+        total = np.bincount(resource, minlength=count)
+        safe_total = np.where(total > 0, total, 1)
+        # Те же операции с плавающей точкой, что и в get_vote_in_percent
+        yes, no, abstain = (
+            np.where(
+                total > 0,
+                ((np.bincount(resource[value == code], minlength=count)
+                  / safe_total) * 100).astype(np.int64),
+                0,
+            )
+            for code in (1, 0, -1)
+        )
+
+        return yes, no, abstain
+
+    def total_users(self) -> np.ndarray:
+        """Число участников, голосующих по ресурсу: уникальные
+        незаблокированные участники по rule_id / initiative_id.
+        """
+        matrix = self.matrix
+        count = len(matrix.resources)
+        is_voter = (matrix.vote_choice_resource >= 0) & ~matrix.vote_blocked
+        members = int(matrix.vote_member.max(initial=0)) + 1
+        pairs = np.unique(
+            matrix.vote_choice_resource[is_voter] * members
+            + matrix.vote_member[is_voter]
+        )
+
+        return np.bincount(pairs // members, minlength=count)
+
+    def source_tally(
+            self, is_noncompliance: bool,
+            vote: int,
+            is_multi_select: np.ndarray,
+            total_users: np.ndarray,
+    ) -> SourceTally:
+        """Взвешенный подсчёт с победителями и весами меньшинства,
+        как в AODataStorage.get_weighted_tally.
+        """
+        matrix = self.matrix
+        count = len(matrix.resources)
+        votes = len(matrix.vote_choice_resource)
+        items = max(len(matrix.item_ids), 1)
+
+        is_voter = (matrix.vote_choice_resource >= 0) & ~matrix.vote_blocked
+
+        # Выбор участников: вес строки обратно пропорционален
+        # числу вариантов, выбранных участником
+        mask = (
+            (matrix.choice_is_noncompliance == is_noncompliance)
+            & is_voter[matrix.choice_vote]
+        )
+        voter = matrix.choice_vote[mask]
+        item = matrix.choice_item[mask]
+        resource = matrix.vote_choice_resource[voter]
+        size = np.bincount(voter, minlength=votes)[voter]
+        scale = lcm(*np.unique(size).tolist()) if len(size) else 1
+        dtype = (
+            np.int64 if scale * max(votes, 1) * 100 * 100 < INT64_LIMIT
+            else object
+        )
+        row_weight = (scale // size).astype(dtype)
+        is_existing = np.array(
+            [value is not None for value in matrix.item_values] or [False],
+            dtype=bool,
+        )[item]
+
+        # Веса пар ресурс-вариант по существующим вариантам
+        pair_keys, row_pair = np.unique(
+            resource.astype(np.int64) * items + item, return_inverse=True
+        )
+        row_pair = np.where(is_existing, row_pair.reshape(-1), -1)
+        is_pair_existing = np.zeros(len(pair_keys), dtype=bool)
+        is_pair_existing[row_pair[is_existing]] = True
+        weight = np.zeros(len(pair_keys), dtype=dtype)
+        np.add.at(weight, row_pair[is_existing], row_weight[is_existing])
+        pair_resource = pair_keys // items
+        pair_item = pair_keys % items
+
+        # Позиции: по убыванию веса, при равенстве - по id варианта
+        item_rank = self._item_rank()
+        order = self._order(
+            resource=pair_resource,
+            weight=weight,
+            tiebreak=item_rank[pair_item],
+            exclude=~is_pair_existing,
+        )
+        order = order[is_pair_existing[order]]
+        rank = np.full(len(pair_keys), -1, dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        row_pair = np.where(row_pair >= 0, rank[row_pair], -1)
+        pair_resource = pair_resource[order]
+        pair_item = pair_item[order]
+        weight = weight[order]
+        position = self._group_positions(pair_resource)
+
+        total_weight = np.zeros(count, dtype=dtype)
+        np.add.at(total_weight, pair_resource, weight)
+        if is_noncompliance:
+            base = total_weight
+        else:
+            base = total_users.astype(dtype) * scale
+
+        is_winner = weight * 100 >= vote * base[pair_resource]
+        if is_noncompliance:
+            leader_weight = np.zeros(count, dtype=dtype)
+            is_leader = position == 1
+            leader_weight[pair_resource[is_leader]] = weight[is_leader]
+            same_as_leader = np.bincount(
+                pair_resource[weight == leader_weight[pair_resource]],
+                minlength=count,
+            )
+            is_winner &= is_leader & (same_as_leader[pair_resource] == 1)
+        else:
+            is_winner &= is_multi_select[pair_resource] | (position == 1)
+        has_winners = np.bincount(
+            pair_resource[is_winner], minlength=count
+        ) > 0
+
+        # Меньшинство: голоса участников, не поддержавших ни одного победителя
+        is_row_winner = np.zeros(len(row_pair), dtype=bool)
+        is_valid = row_pair >= 0
+        is_row_winner[is_valid] = is_winner[row_pair[is_valid]]
+        backed_winner = np.bincount(
+            voter[is_row_winner], minlength=votes
+        ) > 0
+        is_minority_row = (
+            is_valid & ~is_row_winner
+            & ~backed_winner[voter]
+            & has_winners[resource]
+        )
+        minority_weight = np.zeros(len(weight), dtype=dtype)
+        np.add.at(
+            minority_weight, row_pair[is_minority_row],
+            row_weight[is_minority_row],
+        )
+        is_minority = np.bincount(
+            row_pair[is_minority_row], minlength=len(weight)
+        ) > 0
+        minority_order = self._order(
+            resource=pair_resource,
+            weight=minority_weight,
+            tiebreak=item_rank[pair_item],
+            exclude=~is_minority,
+        )
+        minority_position = np.zeros(len(weight), dtype=np.int64)
+        minority_position[minority_order] = self._group_positions(
+            pair_resource[minority_order]
+        )
+        minority_position[~is_minority] = 0
+
+        return SourceTally(
+            resource=pair_resource,
+            item=pair_item,
+            weight=weight,
+            position=position,
+            is_winner=is_winner,
+            minority_weight=minority_weight,
+            minority_position=minority_position,
+            base=base,
+            has_winners=has_winners,
+        )
+
+    def split(
+            self, tally: SourceTally, significant_minority: int,
+    ) -> List[SplitData]:
+        """Разделит подсчёт на победителей и значимое меньшинство
+        по каждому ресурсу, как AODataStorage._split_tally.
+        """
+        matrix = self.matrix
+        result: List[SplitData] = [({}, {}) for _ in matrix.resources]
+        base = tally.base[tally.resource]
+        with_winners = tally.has_winners[tally.resource]
+        is_base = base > 0
+
+        def add(target: int, idx: int, number: int, weight) -> None:
+            res = int(tally.resource[idx])
+            item = int(tally.item[idx])
+            result[res][target][matrix.item_ids[item]] = VotingOptionData(
+                number=int(number),
+                value=matrix.item_values[item],
+                percent=int(weight * 100 // base[idx]),
+            )
+
+        for idx in np.flatnonzero(tally.is_winner & is_base):
+            add(0, idx, tally.position[idx], tally.weight[idx])
+
+        minority_idx = np.flatnonzero(
+            with_winners & is_base
+            & (tally.minority_position > 0)
+            & (tally.minority_weight * 100 >= significant_minority * base)
+        )
+        minority_idx = minority_idx[np.lexsort((
+            tally.minority_position[minority_idx],
+            tally.resource[minority_idx],
+        ))]
+        for idx in minority_idx:
+            add(
+                1, idx, tally.minority_position[idx],
+                tally.minority_weight[idx],
+            )
+
+        for idx in np.flatnonzero(
+                ~with_winners & is_base
+                & (tally.weight * 100 >= significant_minority * base)
+        ):
+            add(1, idx, tally.position[idx], tally.weight[idx])
+
+        return result
+
+    @staticmethod
+    def status_codes(
+            is_rule: np.ndarray,
+            last_status: np.ndarray,
+            is_extra_options: np.ndarray,
+            is_selected_options: np.ndarray,
+            is_significant_minority: np.ndarray,
+            is_selected_noncompliance: np.ndarray,
+            is_noncompliance_minority: np.ndarray,
+            is_quorum: np.ndarray,
+            is_decision: np.ndarray,
+    ) -> np.ndarray:
+        """Новые статусы ресурсов,
+        как в AODataStorage._update_status_in_resource.
+        """
+        approved = np.where(
+            is_rule, Code.RULE_APPROVED, Code.INITIATIVE_APPROVED
+        ).astype(object)
+        revoked = np.where(
+            is_rule, Code.RULE_REVOKED, Code.INITIATIVE_REVOKED
+        ).astype(object)
+        is_minority = is_significant_minority | (
+            is_rule & is_noncompliance_minority
+        )
+        is_options_ok = ~is_extra_options | is_selected_options
+        is_all_selected = ~is_rule | is_selected_noncompliance
+        is_accepted = is_quorum & is_decision
+        is_complete = is_options_ok & is_all_selected
+
+        return np.select(
+            [
+                (last_status == approved) & (~is_accepted | ~is_complete),
+                is_accepted & is_complete & is_minority,
+                is_accepted & is_complete,
+                is_accepted & ~is_complete & (last_status != revoked),
+                last_status == revoked,
+            ],
+            [
+                revoked,
+                Code.COMPROMISE,
+                approved,
+                Code.PRINCIPAL_AGREEMENT,
+                last_status,
+            ],
+            default=Code.ON_CONSIDERATION,
+        )
+
+    def _item_rank(self) -> np.ndarray:
+        """Порядок вариантов по id для разрешения равенства весов."""
+        ids = self.matrix.item_ids
+        rank = np.zeros(max(len(ids), 1), dtype=np.int64)
+        if ids:
+            rank[np.argsort(np.array(ids, dtype=object))] = np.arange(
+                len(ids)
+            )
+
+        return rank
+
+    @staticmethod
+    def _order(
+            resource: np.ndarray, weight: np.ndarray,
+            tiebreak: np.ndarray, exclude: np.ndarray,
+    ) -> np.ndarray:
+        """Порядок пар: по ресурсу, исключённые в конце,
+        по убыванию веса, при равенстве - по tiebreak.
+        """
+        if weight.dtype != object:
+            return np.lexsort((tiebreak, -weight, exclude, resource))
+
+        return np.array(sorted(
+            range(len(weight)),
+            key=lambda idx: (
+                resource[idx], exclude[idx], -weight[idx], tiebreak[idx]
+            ),
+        ), dtype=np.int64)
+
+    @staticmethod
+    def _group_positions(groups: np.ndarray) -> np.ndarray:
+        """Порядковый номер (с 1) элемента внутри группы
+        для массива, отсортированного по группам.
+        """
+        if not len(groups):
+            return np.zeros(0, dtype=np.int64)
+
+        is_start = np.r_[True, groups[1:] != groups[:-1]]
+        start_idx = np.maximum.accumulate(
+            np.where(is_start, np.arange(len(groups)), 0)
+        )
+
+        return np.arange(len(groups)) - start_idx + 1
@@ -0,0 +1,78 @@
+import numpy as np
+
+from core.dataclasses import BaseVotingParams
+from datastorage.ao.dataclasses import TallyResource, VoteMatrix
+from datastorage.ao.tally import VoteTally
+from datastorage.consts import Code
+
+
+def build_matrix(status_code: str) -> VoteMatrix:
+    """Правило с вариантами ответа: три голоса за, один против.
+
+    Двое выбрали вариант A, один - A и B, один - C.
+    """
+    resource = TallyResource(
+        id='rule',
+        resource_type='rule',
+        title='Rule',
+        voting_result_id='voting_result',
+        is_extra_options=True,
+        is_multi_select=False,
+        status_code=status_code,
+        vote=None,
+        is_significant_minority=False,
+        is_noncompliance_minority=False,
+    )
+
+    return VoteMatrix(
+        resources=[resource],
+        vote_resource=np.array([0, 0, 0, 0]),
+        vote_member=np.array([0, 1, 2, 3]),
+        vote_value=np.array([1, 1, 1, 0]),
+        vote_blocked=np.array([False, False, False, False]),
+        vote_choice_resource=np.array([0, 0, 0, 0]),
+        choice_vote=np.array([0, 1, 2, 2, 3, 0]),
+        choice_item=np.array([0, 0, 0, 1, 2, 3]),
+        choice_is_noncompliance=np.array(
+            [False, False, False, False, False, True]
+        ),
+        item_ids=['a', 'b', 'c', 'n'],
+        item_values=['A', 'B', 'C', 'N'],
+    )
+
+
+def test_weighted_options_and_status():
+    voting_params = BaseVotingParams(
+        vote=50, quorum=50, significant_minority=20
+    )
+    [outcome] = VoteTally(build_matrix(Code.ON_CONSIDERATION)).compute(
+        voting_params
+    )
+
+    assert (outcome.yes, outcome.no, outcome.abstain) == (75, 25, 0)
+    assert outcome.vote is True
+    # A: 1 + 1 + 1/2 = 2.5 из 4 участников
+    assert outcome.options == {
+        'a': {'number': 1, 'value': 'A', 'percent': 62},
+    }
+    # Меньшинство - голос за C участника, не выбравшего A
+    assert outcome.minority_options == {
+        'c': {'number': 1, 'value': 'C', 'percent': 25},
+    }
+    assert outcome.noncompliance == {
+        'n': {'number': 1, 'value': 'N', 'percent': 100},
+    }
+    assert outcome.status_code == Code.COMPROMISE
+
+
+def test_approved_rule_revoked_without_decision():
+    voting_params = BaseVotingParams(
+        vote=80, quorum=50, significant_minority=20
+    )
+    [outcome] = VoteTally(build_matrix(Code.RULE_APPROVED)).compute(
+        voting_params
+    )
+
+    assert outcome.vote is False
+    assert outcome.options == {}
+    assert outcome.status_code == Code.RULE_REVOKED
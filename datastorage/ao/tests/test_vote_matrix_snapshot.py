@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.dataclasses import BaseVotingParams
+from datastorage.ao import datastorage
+from datastorage.ao.datastorage import vote_matrix_snapshots
+from entities.rule.ao.datastorage import RuleDS
+
+
+@pytest.mark.asyncio
+async def test_community_recount_drops_snapshot_after_commit(monkeypatch):
+    session = AsyncSession()
+    ds = RuleDS(session=session)
+    ds._get_community_rules = AsyncMock(return_value=[SimpleNamespace(status=None)])
+    ds._get_community_initiatives = AsyncMock(return_value=[])
+    ds._build_tally_resource = MagicMock()
+    ds.get_vote_matrix = AsyncMock()
+    ds._get_statuses_by_codes = AsyncMock(return_value={})
+    ds._apply_tally_outcome = MagicMock()
+    monkeypatch.setattr(
+        datastorage, 'VoteTally',
+        MagicMock(return_value=MagicMock(
+            compute=lambda _: [SimpleNamespace(status_code='code')]
+        )),
+    )
+    vote_matrix_snapshots.set('community', MagicMock())
+
+    async with session.begin():
+        await ds._recount_community_vote(
+            'community', BaseVotingParams(
+                vote=50, quorum=50, significant_minority=10
+            ),
+        )
+        # До фиксации снимок ещё отдаётся предварительным подсчётам
+        assert vote_matrix_snapshots.get('community') is not None
+
+    assert vote_matrix_snapshots.get('community') is None
@@ -29,6 +29,8 @@ class TableName:
     INTERACTION_COMBINATION = 'interaction_combination'
     COMBINATION_SOURCE_ELEMENT = 'combination_source_element'
     VERSION_INTERACTION_INFLUENCE = 'version_interaction_influence'
+    LLM_RESPONSE_CACHE = 'llm_response_cache'
+    LAB_JOB = 'lab_job'
     RELATION_CS_CATEGORIES = 'relation_community_settings_categories'
     RELATION_CS_RESPONSIBILITIES = 'relation_community_settings_responsibilities'
     RELATION_CS_COMMUNITIES = 'relation_community_settings_communities'
@@ -27,6 +27,8 @@ __all__ = (
     'InteractionCombination',
     'CombinationSourceElement',
     'VersionInteractionInfluence',
+    'LLMResponseCache',
+    'LabJob',
     'Responsibility',
     'RequestMember',
     'Noncompliance',
@@ -66,6 +68,8 @@ from entities.interaction_criticism.model import InteractionCriticism
 from entities.interaction_combination.model import InteractionCombination
 from entities.combination_source_element.model import CombinationSourceElement
 from entities.version_interaction_influence.model import VersionInteractionInfluence
+from entities.llm_response_cache.model import LLMResponseCache
+from entities.lab_job.model import LabJob
 from entities.voting_result.model import VotingResult
 from entities.user_voting_result.model import UserVotingResult
 from entities.voting_option.model import VotingOption
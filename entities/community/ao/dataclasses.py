@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List, TypedDict, Tuple
+from typing import List, TypedDict
 
 from core.dataclasses import PercentByName
 from entities.category.model import Category
@@ -19,11 +19,31 @@ class OtherCommunitySettings:
 
 
 @dataclass(kw_only=True)
-class UserSettingsModifiedData:
+class RelationCount:
+    id: str
+    name: str
+    count: int
+
+
+@dataclass(kw_only=True)
+class RelationWeight:
+    id: str
+    name: str
+    weight: float
+
+
+@dataclass(kw_only=True)
+class CommunitySettingsStats:
     user_count: int
-    categories_data: List[Tuple[str, int]]
-    child_settings_data: List[Tuple[str, int]]
-    responsibility_data: List[Tuple[str, int]]
+    workgroup_count: int
+    secret_ballot_count: int
+    can_offer_count: int
+    minority_not_participate_count: int
+    categories_data: List[RelationCount]
+    child_settings_data: List[RelationCount]
+    responsibility_data: List[RelationCount]
+    name_weights: List[RelationWeight]
+    description_weights: List[RelationWeight]
 
 
 class CsByPercent(TypedDict):
@@ -56,3 +76,22 @@ class SubCommunityData(TypedDict):
     members: int
     isBlocked: bool
     isMyCommunity: bool
+
+
+class RecountPreviewItem(TypedDict):
+    id: str
+    resource_type: str
+    title: str
+    status: str
+    new_status: str
+    yes: int
+    no: int
+    abstain: int
+
+
+class RecountPreview(TypedDict):
+    vote: int
+    quorum: int
+    significant_minority: int
+    total: int
+    changed: List[RecountPreviewItem]
@@ -1,26 +1,33 @@
+import hashlib
+import json
 import logging
 from collections import defaultdict
 from datetime import datetime
 
-from typing import List, Optional, Tuple, cast, Dict
+from typing import Any, List, Optional, Tuple, Dict, Union
 
-from sqlalchemy import select, func, desc, distinct, text
+from sqlalchemy import select, distinct, text, literal
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, aliased
+from sqlalchemy.sql.selectable import CTE, Select
 
-from core.dataclasses import PercentByName
+from core.coalescing import CoalescingScheduler
+from core.config import COMMUNITY_SETTINGS_DEBOUNCE_SECONDS
+from core.dataclasses import BaseVotingParams, PercentByName
+from core.metrics import metrics
 from datastorage.ao.datastorage import AODataStorage
+from datastorage.ao.tally import VoteTally
 from datastorage.consts import Code
 from datastorage.crud.datastorage import CRUDDataStorage
 from datastorage.crud.interfaces.list import Filters, Operation, Filter
 from datastorage.database.models import (
-    Community, UserCommunitySettings, CommunitySettings,
-    RelationUserCsCategories, Category, CommunityName,
-    CommunityDescription, RelationUserCsUserCs, RelationUserCsResponsibilities
+    Community, UserCommunitySettings, CommunitySettings, Category,
+    CommunityName
 )
 from entities.community.ao.dataclasses import (
-    OtherCommunitySettings, CsByPercent, UserSettingsModifiedData,
-    CommunityNameData, ParentCommunity, SubCommunityData
+    OtherCommunitySettings, CsByPercent, CommunitySettingsStats,
+    CommunityNameData, ParentCommunity, SubCommunityData, RelationCount,
+    RelationWeight, RecountPreview, RecountPreviewItem
 )
 from entities.responsibility.model import Responsibility
 from entities.status.model import Status
@@ -30,6 +37,13 @@ from entities.user_community_settings.ao.datastorage import (
 
 logger = logging.getLogger(__name__)
 
+# Пересчёт настроек сообщества: не более одного запуска на сообщество,
+# повторные изменения схлопываются в один завершающий пересчёт
+community_settings_scheduler = CoalescingScheduler(
+    name='community_settings',
+    debounce_seconds=COMMUNITY_SETTINGS_DEBOUNCE_SECONDS,
+)
+
 
 class CommunityDS(AODataStorage[Community], CRUDDataStorage[Community]):
     _model = Community
@@ -38,114 +52,188 @@ class CommunityDS(AODataStorage[Community], CRUDDataStorage[Community]):
             self, community_id: str
     ) -> CsByPercent:
         """Вернёт статистику в процентах по настройкам сообщества."""
-        modified_data = await self._get_user_settings_modified_data(
-            community_id
-        )
-        category_data = {
-            category_id: count
-            for category_id, count in modified_data.categories_data
-        }
-        categories_list = await self._get_categories_by_ids(
-            list(category_data.keys())
-        )
+        stats = await self.get_community_settings_stats(community_id)
+        user_count = stats.user_count
+
         categories = [
             PercentByName(
                 name=category.name,
-                percent=int(
-                    category_data.get(category.id) /
-                    modified_data.user_count * 100
-                )
-            )
-            for category in categories_list
+                percent=self._to_percent(category.count, user_count),
+            ) for category in stats.categories_data
         ]
-
-        child_settings_data = {
-            settings_id: count
-            for settings_id, count in modified_data.child_settings_data
-        }
-        child_settings = await self._get_user_settings_by_ids(
-            list(child_settings_data.keys())
-        )
         sub_communities = [
             PercentByName(
-                name=settings.names[0].name,
-                percent=int(child_settings_data.get(settings.id) /
-                            modified_data.user_count * 100)
-            ) for settings in child_settings]
-
-        responsibility_data = {
-            responsibility_id: count
-            for responsibility_id, count in modified_data.responsibility_data
-        }
-        responsibility_list = await self._get_responsibility_by_ids(
-            list(responsibility_data.keys())
-        )
+                name=settings.name,
+                percent=self._to_percent(settings.count, user_count),
+            ) for settings in stats.child_settings_data
+        ]
         responsibilities = [
             PercentByName(
                 name=responsibility.name,
-                percent=int(responsibility_data.get(responsibility.id) /
-                            modified_data.user_count * 100)
-            ) for responsibility in responsibility_list]
-
-        is_workgroup_count = await self._get_is_workgroup_count(
-            community_id
-        )
-        workgroup_true = int(
-            is_workgroup_count / modified_data.user_count * 100
-        )
-        workgroup = [
-            PercentByName(name='Да', percent=workgroup_true),
-            PercentByName(name='Нет', percent=100 - workgroup_true)
+                percent=self._to_percent(responsibility.count, user_count),
+            ) for responsibility in stats.responsibility_data
         ]
 
-        is_secret_ballot_count = await self._get_is_secret_ballot_count(
-            community_id
-        )
-        secret_ballot_true = int(
-            is_secret_ballot_count / modified_data.user_count * 100
+        return CsByPercent(
+            names=self._to_percent_by_weights(stats.name_weights),
+            descriptions=self._to_percent_by_weights(
+                stats.description_weights
+            ),
+            categories=categories,
+            sub_communities=sub_communities,
+            responsibilities=responsibilities,
+            workgroup=self._to_yes_no_percent(
+                stats.workgroup_count, user_count
+            ),
+            secret_ballot=self._to_yes_no_percent(
+                stats.secret_ballot_count, user_count
+            ),
+            minority_not_participate=self._to_yes_no_percent(
+                stats.minority_not_participate_count, user_count
+            ),
+            can_offer=self._to_yes_no_percent(
+                stats.can_offer_count, user_count
+            ),
         )
-        secret_ballot = [
-            PercentByName(name='Да', percent=secret_ballot_true),
-            PercentByName(name='Нет', percent=100 - secret_ballot_true)
-        ]
 
-        is_minority_not_participate_count = (
-            await self._get_minority_not_participate_count(community_id)
-        )
-        minority_not_participate_true = int(
-            is_minority_not_participate_count / modified_data.user_count * 100
-        )
-        minority_not_participate = [
-            PercentByName(name='Да', percent=minority_not_participate_true),
-            PercentByName(
-                name='Нет',
-                percent=100 - minority_not_participate_true
+    async def get_community_settings_stats(
+            self, community_id: str
+    ) -> CommunitySettingsStats:
+        """Соберёт статистику по пользовательским настройкам
+        сообщества одним агрегирующим запросом.
+        """
+        query = text("""
+            WITH active_ucs AS (
+                SELECT
+                    id,
+                    is_workgroup,
+                    is_secret_ballot,
+                    is_can_offer,
+                    is_minority_not_participate
+                FROM public.user_community_settings
+                WHERE community_id = :community_id
+                  AND is_blocked IS NOT TRUE
+            ),
+            name_weights AS (
+                SELECT
+                    cn.id AS item_id,
+                    cn.name AS item_name,
+                    1.0 / COUNT(*) OVER (PARTITION BY au.id) AS weight
+                FROM active_ucs au
+                JOIN public.relation_ucs_names run ON run.from_id = au.id
+                JOIN public.community_name cn ON cn.id = run.to_id
+            ),
+            desc_weights AS (
+                SELECT
+                    cd.id AS item_id,
+                    cd.value AS item_name,
+                    1.0 / COUNT(*) OVER (PARTITION BY au.id) AS weight
+                FROM active_ucs au
+                JOIN public.relation_ucs_descriptions rud
+                    ON rud.from_id = au.id
+                JOIN public.community_description cd ON cd.id = rud.to_id
             )
-        ]
+            SELECT
+                'total' AS kind,
+                NULL AS item_id,
+                NULL AS item_name,
+                COALESCE(c.members_count, 0) AS item_count,
+                NULL::numeric AS item_weight,
+                COALESCE(c.workgroup_count, 0) AS workgroup_count,
+                COALESCE(c.secret_ballot_count, 0) AS secret_ballot_count,
+                COALESCE(c.can_offer_count, 0) AS can_offer_count,
+                COALESCE(c.minority_not_participate_count, 0)
+                    AS minority_not_participate_count
+            FROM (SELECT 1) AS one
+            LEFT JOIN public.community c ON c.id = :community_id
+            UNION ALL
+            SELECT
+                'category', c.id, c.name, COUNT(*), NULL,
+                NULL, NULL, NULL, NULL
+            FROM public.relation_user_community_settings_categories rc
+            JOIN active_ucs au ON au.id = rc.from_id
+            JOIN public.category c ON c.id = rc.to_id
+            JOIN public.status s ON s.id = c.status_id
+            WHERE s.code != :system_category_code
+            GROUP BY c.id, c.name
+            UNION ALL
+            SELECT
+                'sub_community',
+                ru.to_id,
+                (
+                    SELECT cn.name
+                    FROM public.relation_ucs_names run
+                    JOIN public.community_name cn ON cn.id = run.to_id
+                    WHERE run.from_id = ru.to_id
+                    LIMIT 1
+                ),
+                COUNT(*), NULL,
+                NULL, NULL, NULL, NULL
+            FROM public.relation_user_community_settings_user_cs ru
+            JOIN active_ucs au ON au.id = ru.from_id
+            GROUP BY ru.to_id
+            UNION ALL
+            SELECT
+                'responsibility', r.id, r.name, COUNT(*), NULL,
+                NULL, NULL, NULL, NULL
+            FROM public.relation_user_community_settings_responsibilities rr
+            JOIN active_ucs au ON au.id = rr.from_id
+            JOIN public.responsibility r ON r.id = rr.to_id
+            GROUP BY r.id, r.name
+            UNION ALL
+            SELECT
+                'name', item_id, item_name, NULL, SUM(weight),
+                NULL, NULL, NULL, NULL
+            FROM name_weights
+            GROUP BY item_id, item_name
+            UNION ALL
+            SELECT
+                'description', item_id, item_name, NULL, SUM(weight),
+                NULL, NULL, NULL, NULL
+            FROM desc_weights
+            GROUP BY item_id, item_name
+            ORDER BY item_count DESC NULLS LAST, item_weight DESC NULLS LAST
+        """)
 
-        is_can_offer_count = await self._get_is_can_offer_count(community_id)
-        can_offer_true = int(
-            is_can_offer_count / modified_data.user_count * 100
+        result = await self._session.execute(
+            query,
+            {
+                'community_id': community_id,
+                'system_category_code': Code.SYSTEM_CATEGORY,
+            }
         )
-        can_offer = [
-            PercentByName(name='Да', percent=can_offer_true),
-            PercentByName(name='Нет', percent=100 - can_offer_true)
-        ]
-
-        return CsByPercent(
-            names=await self._get_voting_data_by_names(
-                community_id=community_id, total_users=modified_data.user_count
+        relations: Dict[str, List[RelationCount]] = defaultdict(list)
+        weights: Dict[str, List[RelationWeight]] = defaultdict(list)
+        totals = None
+        for row in result.all():
+            if row.kind == 'total':
+                totals = row
+            elif row.kind in ('name', 'description'):
+                weights[row.kind].append(RelationWeight(
+                    id=row.item_id,
+                    name=row.item_name,
+                    weight=float(row.item_weight),
+                ))
+            else:
+                relations[row.kind].append(RelationCount(
+                    id=row.item_id,
+                    name=row.item_name,
+                    count=row.item_count,
+                ))
+
+        return CommunitySettingsStats(
+            user_count=totals.item_count,
+            workgroup_count=totals.workgroup_count,
+            secret_ballot_count=totals.secret_ballot_count,
+            can_offer_count=totals.can_offer_count,
+            minority_not_participate_count=(
+                totals.minority_not_participate_count
             ),
-            descriptions=await self._get_voting_data_by_desc(
-                community_id=community_id, total_users=modified_data.user_count
-            ),
-            categories=categories,
-            sub_communities=sub_communities,
-            responsibilities=responsibilities,
-            workgroup=workgroup,
-            secret_ballot=secret_ballot,
-            minority_not_participate=minority_not_participate,
-            can_offer=can_offer,
+            categories_data=relations['category'],
+            child_settings_data=relations['sub_community'],
+            responsibility_data=relations['responsibility'],
+            name_weights=weights['name'],
+            description_weights=weights['description'],
         )
 
     async def get_community_name_data(
@@ -159,27 +247,83 @@ class CommunityDS(AODataStorage[Community], CRUDDataStorage[Community]):
         is_blocked = not bool(list(filter(
             lambda it: it.user.id == user_id and it.is_blocked is False,
             community.user_settings or [])))
-        parent_data: List[ParentCommunity] = []
-        parent_community: Optional[Community] = community.parent
-
-        while parent_community:
-            parent_data.append(ParentCommunity(
-                id=cast(str, parent_community.id),
-                name=parent_community.main_settings.name.name
-            ))
-            parent_community = (
-                await self._get_community_with_parent(
-                    parent_community.parent.id
-                )
-                if parent_community.parent else None
+        ancestors = self.ancestors_cte([community_id])
+        query = (
+            select(ancestors.c.id, CommunityName.name)
+            .join(Community, Community.id == ancestors.c.id)
+            .join(
+                CommunitySettings,
+                CommunitySettings.id == Community.main_settings_id,
             )
+            .join(CommunityName, CommunityName.id == CommunitySettings.name_id)
+            .order_by(ancestors.c.depth)
+        )
+        rows = await self._session.execute(query)
 
         return CommunityNameData(
             name=community.main_settings.name.name,
-            parent_data=parent_data,
+            parent_data=[
+                ParentCommunity(id=parent_id, name=name)
+                for parent_id, name in rows.all()
+            ],
             is_blocked=is_blocked,
         )
 
+    @staticmethod
+    def ancestors_cte(community_ids: Union[List[str], Select]) -> CTE:
+        """Рекурсивный CTE родительских сообществ.
+
+        community_ids - список id или подзапрос, возвращающий id сообществ.
+
+        Колонки: community_id - исходное сообщество,
+        id - родительское сообщество, depth - уровень (1 - прямой родитель).
+        """
+        ancestors = (
+            select(
+                Community.id.label('community_id'),
+                Community.parent_id.label('id'),
+                literal(1).label('depth'),
+            )
+            .where(
+                Community.id.in_(community_ids),
+                Community.parent_id.is_not(None),
+            )
+            .cte('ancestors', recursive=True)
+        )
+        parent = aliased(Community)
+
+        return ancestors.union_all(
+            select(
+                ancestors.c.community_id,
+                parent.parent_id,
+                ancestors.c.depth + 1,
+            )
+            .join(parent, parent.id == ancestors.c.id)
+            .where(parent.parent_id.is_not(None))
+        )
+
+    async def get_ancestor_ids(
+            self, community_ids: List[str],
+    ) -> Dict[str, List[str]]:
+        """Вернёт id родительских сообществ для каждого сообщества,
+        начиная с ближайшего, одним запросом.
+        """
+        if not community_ids:
+            return {}
+
+        ancestors = self.ancestors_cte(community_ids)
+        rows = await self._session.execute(
+            select(ancestors.c.community_id, ancestors.c.id)
+            .order_by(ancestors.c.community_id, ancestors.c.depth)
+        )
+        ancestor_ids: Dict[str, List[str]] = {
+            community_id: [] for community_id in community_ids
+        }
+        for community_id, ancestor_id in rows.all():
+            ancestor_ids[community_id].append(ancestor_id)
+
+        return ancestor_ids
+
     async def get_sub_community_data(
             self,
             community_id: str,
@@ -210,50 +354,184 @@ class CommunityDS(AODataStorage[Community], CRUDDataStorage[Community]):
             )
         ).data
 
-        communities_ids = await self.get_user_community_ids_data(user_id)
+        members_data = await self._get_members_data(
+            community_ids=[community.id for community in communities],
+            user_id=user_id,
+        )
         for community in communities:
             user_settings = community.main_settings
+            members, is_my_community = members_data.get(
+                community.id, (0, False)
+            )
             sub_community = SubCommunityData(
                 id=community.id,
                 title=user_settings.name.name,
                 description=user_settings.description.value,
-                members=await self._get_total_count_users(community.id),
-                isMyCommunity=bool(communities_ids.get(community.id)),
+                members=members,
+                isMyCommunity=is_my_community,
                 isBlocked=False,
             )
             sub_community_data.append(sub_community)
 
         return sub_community_data
 
+    async def get_recount_preview(
+            self,
+            community_id: str,
+            vote: Optional[int] = None,
+            quorum: Optional[int] = None,
+            significant_minority: Optional[int] = None,
+    ) -> RecountPreview:
+        """Вернёт правила и инициативы, статус которых изменится
+        при пересчёте голосов с указанными параметрами.
+
+        Не указанные параметры берутся из текущих настроек сообщества.
+        Подсчёт выполняется по снимку матрицы голосов без записи в базу.
+        """
+        # Снимок настроек без метрик подсчёта голосов: предпросмотр
+        # не должен влиять на voting_params.median_avoided
+        current_params = (
+            await self._get_settings_voting_params(community_id)
+            or await self.calc_voting_params(community_id)
+        )
+        voting_params = BaseVotingParams(
+            vote=current_params.vote if vote is None else vote,
+            quorum=current_params.quorum if quorum is None else quorum,
+            significant_minority=(
+                current_params.significant_minority
+                if significant_minority is None else significant_minority
+            ),
+        )
+        matrix = await self.get_vote_matrix_snapshot(community_id)
+        outcomes = VoteTally(matrix).compute(voting_params)
+        metrics.increment('recount_preview.requests')
+
+        return RecountPreview(
+            vote=voting_params.vote,
+            quorum=voting_params.quorum,
+            significant_minority=voting_params.significant_minority,
+            total=len(outcomes),
+            changed=[
+                RecountPreviewItem(
+                    id=resource.id,
+                    resource_type=resource.resource_type,
+                    title=resource.title,
+                    status=resource.status_code,
+                    new_status=outcome.status_code,
+                    yes=outcome.yes,
+                    no=outcome.no,
+                    abstain=outcome.abstain,
+                )
+                for resource, outcome in zip(matrix.resources, outcomes)
+                if outcome.status_code != resource.status_code
+            ],
+        )
+
+    async def reconcile_member_counters(
+            self, community_id: Optional[str] = None,
+    ) -> List[str]:
+        """Сверит счётчики участников сообществ с настройками участников
+        и исправит расхождения.
+
+        Без community_id проверяются все сообщества.
+        Вернёт id сообществ, счётчики которых были исправлены.
+        """
+        query = text("""
+            WITH actual AS (
+                SELECT
+                    c.id,
+                    COUNT(ucs.id) AS members_count,
+                    COUNT(*) FILTER (WHERE ucs.is_workgroup IS TRUE)
+                        AS workgroup_count,
+                    COUNT(*) FILTER (WHERE ucs.is_secret_ballot IS TRUE)
+                        AS secret_ballot_count,
+                    COUNT(*) FILTER (WHERE ucs.is_can_offer IS TRUE)
+                        AS can_offer_count,
+                    COUNT(*) FILTER (
+                        WHERE ucs.is_minority_not_participate IS TRUE
+                    ) AS minority_not_participate_count
+                FROM public.community c
+                LEFT JOIN public.user_community_settings ucs
+                    ON ucs.community_id = c.id
+                   AND ucs.is_blocked IS NOT TRUE
+                WHERE CAST(:community_id AS varchar) IS NULL
+                   OR c.id = :community_id
+                GROUP BY c.id
+            )
+            UPDATE public.community c
+            SET
+                members_count = a.members_count,
+                workgroup_count = a.workgroup_count,
+                secret_ballot_count = a.secret_ballot_count,
+                can_offer_count = a.can_offer_count,
+                minority_not_participate_count =
+                    a.minority_not_participate_count
+            FROM actual a
+            WHERE a.id = c.id
+              AND (
+                  c.members_count, c.workgroup_count, c.secret_ballot_count,
+                  c.can_offer_count, c.minority_not_participate_count
+              ) IS DISTINCT FROM (
+                  a.members_count, a.workgroup_count, a.secret_ballot_count,
+                  a.can_offer_count, a.minority_not_participate_count
+              )
+            RETURNING c.id
+        """)
+        result = await self._session.execute(
+            query, {'community_id': community_id}
+        )
+        repaired_ids = list(result.scalars().all())
+        if repaired_ids:
+            metrics.increment(
+                'community_counters.drift_repaired', len(repaired_ids)
+            )
+            logger.warning(
+                'Исправлены счётчики участников сообществ: %s',
+                ', '.join(repaired_ids),
+            )
+
+        return repaired_ids
+
+    async def schedule_change_community_settings(
+            self, community_id: str,
+    ) -> None:
+        """Запланирует пересчёт настроек сообщества."""
+        community_settings_scheduler.trigger(
+            key=community_id,
+            func=lambda: self.__class__().change_community_settings(
+                community_id
+            ),
+        )
+
     async def change_community_settings(self, community_id: str) -> None:
         start_time = datetime.now()
         async with self.session_scope():
             voting_params = await self.calc_voting_params(community_id)
             time_params = await self.calc_time_params(community_id)
-            total_users = await self._get_total_count_users(community_id)
-            name: Optional[CommunityName] = await self._get_most_popular_name(
-                community_id=community_id,
-                total_users=total_users,
+            stats = await self.get_community_settings_stats(community_id)
+            community: Community = await self._get_community(community_id)
+            community_settings: CommunitySettings = community.main_settings
+            name_id = self._get_most_popular_id(
+                weights=stats.name_weights,
+                total_users=stats.user_count,
                 vote=voting_params.vote,
+                current_id=community_settings.name_id,
             )
-            description: Optional[CommunityDescription] = (
-                await self.get_most_popular_description(
-                    community_id=community_id,
-                    total_users=total_users,
-                    vote=voting_params.vote,
-                )
+            description_id = self._get_most_popular_id(
+                weights=stats.description_weights,
+                total_users=stats.user_count,
+                vote=voting_params.vote,
+                current_id=community_settings.description_id,
             )
-            community: Community = await self._get_community(community_id)
-            community_settings: CommunitySettings = community.main_settings
             is_changed_voting_params = (
-                    voting_params.__dict__ ==
+                    voting_params.__dict__ !=
                     (community_settings.last_voting_params or {})
             )
-            community_settings.last_voting_params = voting_params.__dict__
             system_category = await self.get_system_category()
 
             other_settings = await self._get_other_community_settings(
                 community_id=community_id,
+                stats=stats,
                 vote=voting_params.vote,
                 system_category_id=(system_category.id
                                     if system_category else None)
@@ -261,37 +539,55 @@ class CommunityDS(AODataStorage[Community], CRUDDataStorage[Community]):
             workgroup = 0
             if other_settings.is_workgroup:
                 workgroup = await self.calc_workgroup_size(community_id)
-            community_settings.vote = voting_params.vote
-            community_settings.quorum = voting_params.quorum
-            community_settings.significant_minority = (
-                voting_params.significant_minority
-            )
-            community_settings.decision_delay = time_params.decision_delay
-            community_settings.dispute_time_limit = (
-                time_params.dispute_time_limit
-            )
-            community_settings.is_workgroup = other_settings.is_workgroup
-            community_settings.workgroup = workgroup
-            community_settings.is_secret_ballot = (
-                other_settings.is_secret_ballot
-            )
-            community_settings.is_can_offer = other_settings.is_can_offer
-            community_settings.is_minority_not_participate = (
-                other_settings.is_minority_not_participate
-            )
-            if name:
-                community_settings.name = name
-            if description:
-                community_settings.description = description
             if system_category:
                 other_settings.categories.insert(0, system_category)
-            community_settings.categories = other_settings.categories
-            community_settings.sub_communities_settings = (
-                other_settings.sub_communities_settings
+            values = dict(
+                vote=voting_params.vote,
+                quorum=voting_params.quorum,
+                significant_minority=voting_params.significant_minority,
+                decision_delay=time_params.decision_delay,
+                dispute_time_limit=time_params.dispute_time_limit,
+                last_voting_params=voting_params.__dict__,
+                is_workgroup=other_settings.is_workgroup,
+                workgroup=workgroup,
+                is_secret_ballot=other_settings.is_secret_ballot,
+                is_can_offer=other_settings.is_can_offer,
+                is_minority_not_participate=(
+                    other_settings.is_minority_not_participate
+                ),
+            )
+            if name_id:
+                values['name_id'] = name_id
+            if description_id:
+                values['description_id'] = description_id
+            relations = dict(
+                categories=other_settings.categories,
+                sub_communities_settings=(
+                    other_settings.sub_communities_settings
+                ),
+                responsibilities=other_settings.responsibilities,
             )
-            community_settings.responsibilities = (
-                other_settings.responsibilities
+            new_fingerprint = self._build_settings_fingerprint(
+                values=values, relations=relations,
             )
+            current_fingerprint = self._build_settings_fingerprint(
+                values={
+                    key: getattr(community_settings, key) for key in values
+                },
+                relations={
+                    key: getattr(community_settings, key)
+                    for key in relations
+                },
+            )
+            if new_fingerprint == current_fingerprint:
+                metrics.increment('community_settings.write_skipped')
+            else:
+                metrics.increment('community_settings.write_applied')
+                self._apply_settings_diff(
+                    community_settings=community_settings,
+                    values=values,
+                    relations=relations,
+                )
             if is_changed_voting_params:
                 await self.recount_of_all_votes(
                     community_id=community_id,
@@ -303,6 +599,44 @@ class CommunityDS(AODataStorage[Community], CRUDDataStorage[Community]):
             f'{str(int(result_time.microseconds / 1000))} мс.'
         )
 
+    @staticmethod
+    def _build_settings_fingerprint(
+            values: Dict[str, Any], relations: Dict[str, List[Any]],
+    ) -> str:
+        """Вернёт отпечаток настроек сообщества."""
+        data = {
+            'values': values,
+            'relations': {
+                key: sorted(item.id for item in items)
+                for key, items in relations.items()
+            },
+        }
+        serialized = json.dumps(data, sort_keys=True, default=str)
+
+        return hashlib.sha256(serialized.encode()).hexdigest()
+
+    @staticmethod
+    def _apply_settings_diff(
+            community_settings: CommunitySettings,
+            values: Dict[str, Any], relations: Dict[str, List[Any]],
+    ) -> None:
+        """Запишет в настройки сообщества только изменившиеся значения."""
+        for key, value in values.items():
+            if getattr(community_settings, key) != value:
+                setattr(community_settings, key, value)
+
+        for key, items in relations.items():
+            collection = getattr(community_settings, key)
+            new_ids = {item.id for item in items}
+            current_ids = {item.id for item in collection}
+            for item in list(collection):
+                if item.id not in new_ids:
+                    collection.remove(item)
+            for item in items:
+                if item.id not in current_ids:
+                    collection.append(item)
+                    current_ids.add(item.id)
+
     async def get_system_category(self) -> Optional[Category]:
         filters: Filters = [
             Filter(
@@ -314,31 +648,6 @@ class CommunityDS(AODataStorage[Community], CRUDDataStorage[Community]):
         return await self.first(filters=filters, model=Category)
 
 
-    async def _get_categories_by_ids(
-            self, categories_ids: List[str]
-    ) -> List[Category]:
-        query = (
-            select(Category).options(selectinload(Category.status))
-            .filter(Category.id.in_(categories_ids))
-        )
-        categories_result = await self._session.scalars(query)
-
-        return list(categories_result)
-
-    async def _get_user_settings_by_ids(
-            self, settings_ids: List[str]) -> List[UserCommunitySettings]:
-        query = (
-            select(UserCommunitySettings).options(
-                selectinload(UserCommunitySettings.user),
-                selectinload(UserCommunitySettings.names),
-                selectinload(UserCommunitySettings.descriptions),
-                selectinload(UserCommunitySettings.categories),
-            ).filter(UserCommunitySettings.id.in_(settings_ids))
-        )
-        settings_result = await self._session.scalars(query)
-
-        return list(settings_result)
-
     async def _get_responsibility_by_ids(
             self, responsibility_ids: List[str]
     ) -> List[Responsibility]:
@@ -366,33 +675,12 @@ class CommunityDS(AODataStorage[Community], CRUDDataStorage[Community]):
 
         return await self._session.scalar(query)
 
-    async def _get_community_with_parent(
-            self, community_id: Optional[str]
-    ) -> Optional[Community]:
-        if not community_id:
-            return None
-
-        query = (
-            select(self._model)
-            .where(self._model.id == community_id)
-            .options(
-                selectinload(self._model.parent)
-                .selectinload(self._model.main_settings)
-                .selectinload(CommunitySettings.name)
-            )
-        )
-
-        return await self._session.scalar(query)
-
     async def _get_community_for_name_data(
             self, community_id: str
     ) -> Optional[Community]:
         query = (
             select(self._model).where(self._model.id == community_id)
             .options(
-                selectinload(self._model.parent)
-                .selectinload(self._model.main_settings)
-                .selectinload(CommunitySettings.name),
                 selectinload(self._model.user_settings)
                 .selectinload(UserCommunitySettings.user),
                 selectinload(self._model.main_settings)
@@ -412,297 +700,34 @@ class CommunityDS(AODataStorage[Community], CRUDDataStorage[Community]):
 
         return [row[0] for row in community_ids.all()]
 
-    async def get_user_community_ids_data(
-            self, user_id: str
-    ) -> Dict[str, str]:
-        query = (
-            select(distinct(UserCommunitySettings.community_id))
-            .select_from(UserCommunitySettings)
-            .where(UserCommunitySettings.user_id == user_id)
-        )
-        community_ids = await self._session.execute(query)
-
-        return {row[0]: row[0] for row in community_ids.all()}
-
-    async def _get_most_popular_name(
-            self,
-            community_id: str,
+    @staticmethod
+    def _get_most_popular_id(
+            weights: List[RelationWeight],
             total_users: int,
-            vote: int
-    ) -> Optional[CommunityName]:
-        """Возвращает наиболее популярное
-        наименование сообщества если оно превышает порог.
-        """
-        if not total_users or vote <= 0:
-            return None
+            vote: int,
+            current_id: Optional[str] = None
+    ) -> Optional[str]:
+        """Вернёт id наиболее популярного варианта (наименования
+        или описания сообщества), если его доля достигает порога.
 
-        stmt = """
-            WITH user_name_weights AS (
-                SELECT 
-                    cn.id,
-                    ucs.id AS user_id,
-                    1.0 / COUNT(cn.id) OVER (PARTITION BY ucs.id) AS weight
-                FROM public.user_community_settings ucs
-                JOIN relation_ucs_names run ON ucs.id = run.from_id
-                JOIN community_name cn ON run.to_id = cn.id
-                WHERE ucs.community_id = :community_id
-                AND ucs.is_blocked IS NOT TRUE
-            ),
-            aggregated_weights AS (
-                SELECT 
-                    id,
-                    SUM(weight) AS total_weight,
-                    (SUM(weight) / :total_users * 100) AS percentage
-                FROM user_name_weights
-                GROUP BY id
-                HAVING (SUM(weight) / :total_users * 100) >= :vote
-                ORDER BY total_weight DESC
-            )
-            SELECT id FROM aggregated_weights LIMIT 1
+        При равных весах остаётся текущий вариант.
         """
-
-        result = await self._session.execute(
-            text(stmt),
-            {
-                'community_id': community_id,
-                'total_users': total_users,
-                'vote': vote,
-            }
-        )
-        name_id = result.scalar()
-
-        return await self._session.get(
-            CommunityName, name_id
-        ) if name_id else None
-
-    async def get_most_popular_description(
-            self,
-            community_id: str,
-            total_users: int,
-            vote: int
-    ) -> Optional[CommunityDescription]:
-        """Возвращает наиболее популярное
-         описание сообщества если оно превышает порог.
-         """
-        if not total_users or vote <= 0:
+        if not total_users or vote <= 0 or not weights:
             return None
 
-        stmt = """
-            WITH user_desc_weights AS (
-                SELECT 
-                    cd.id,
-                    ucs.id AS user_id,
-                    1.0 / COUNT(cd.id) OVER (PARTITION BY ucs.id) AS weight
-                FROM public.user_community_settings ucs
-                JOIN relation_ucs_descriptions rud ON ucs.id = rud.from_id
-                JOIN community_description cd ON rud.to_id = cd.id
-                WHERE ucs.community_id = :community_id
-                AND ucs.is_blocked IS NOT TRUE
-            ),
-            aggregated_weights AS (
-                SELECT 
-                    id,
-                    SUM(weight) AS total_weight,
-                    (SUM(weight) / :total_users * 100) AS percentage
-                FROM user_desc_weights
-                GROUP BY id
-                HAVING (SUM(weight) / :total_users * 100) >= :vote
-                ORDER BY total_weight DESC
-            )
-            SELECT id FROM aggregated_weights LIMIT 1
-        """
-
-        result = await self._session.execute(
-            text(stmt),
-            {
-                'community_id': community_id,
-                'total_users': total_users,
-                'vote': vote
-            }
-        )
-        desc_id = result.scalar()
-
-        return await self._session.get(
-            CommunityDescription, desc_id
-        ) if desc_id else None
-
-    async def _get_voting_data_by_names(
-            self,
-            community_id: str,
-            total_users: int,
-    ) -> List[PercentByName]:
-        if not total_users:
-            return []
-
-        # Сначала получаем количество вариантов для каждого пользователя
-        user_name_counts = await self._session.execute(
-            select(
-                UserCommunitySettings.id,
-                func.count(CommunityName.id).label('count')
-            )
-            .join(UserCommunitySettings.names)
-            .where(
-                UserCommunitySettings.community_id == community_id,
-                UserCommunitySettings.is_blocked.is_not(True),
-            )
-            .group_by(UserCommunitySettings.id)
-        )
-        user_name_counts = dict(user_name_counts.all())
-
-        if not user_name_counts:
-            return []
-
-        # Получаем все варианты с весами
-        name_weights = defaultdict(float)
-        names_query = await self._session.execute(
-            select(
-                UserCommunitySettings.id,
-                CommunityName.name
-            )
-            .join(UserCommunitySettings.names)
-            .where(
-                UserCommunitySettings.community_id == community_id,
-                UserCommunitySettings.is_blocked.is_not(True),
-            )
-        )
-
-        for user_id, name in names_query:
-            name_weights[name] += 1.0 / user_name_counts[user_id]
-
-        total_weight = sum(name_weights.values())
-        if total_weight <= 0:
-            return []
-
-        return [
-            PercentByName(
-                name=name,
-                percent=int(round((weight / total_weight) * 100)),
-            )
-            for name, weight in sorted(
-                name_weights.items(),
-                key=lambda x: x[1],
-                reverse=True
-            )
-        ]
-
-    async def _get_voting_data_by_desc(
-            self,
-            community_id: str,
-            total_users: int,
-    ) -> List[PercentByName]:
-        if not total_users:
-            return []
-
-        user_desc_counts = await self._session.execute(
-            select(
-                UserCommunitySettings.id,
-                func.count(CommunityDescription.id).label('count')
-            )
-            .join(UserCommunitySettings.descriptions)
-            .where(
-                UserCommunitySettings.community_id == community_id,
-                UserCommunitySettings.is_blocked.is_not(True),
-            )
-            .group_by(UserCommunitySettings.id)
-        )
-        user_desc_counts = dict(user_desc_counts.all())
-
-        if not user_desc_counts:
-            return []
-
-        desc_weights = defaultdict(float)
-        descs_query = await self._session.execute(
-            select(
-                UserCommunitySettings.id,
-                CommunityDescription.value
-            )
-            .join(UserCommunitySettings.descriptions)
-            .where(
-                UserCommunitySettings.community_id == community_id,
-                UserCommunitySettings.is_blocked.is_not(True),
-            )
+        winner = max(
+            weights,
+            key=lambda item: (item.weight, item.id == current_id, item.id),
         )
+        if winner.weight / total_users * 100 < vote:
+            return None
 
-        for user_id, desc_value in descs_query:
-            desc_weights[desc_value] += 1.0 / user_desc_counts[user_id]
-
-        total_weight = sum(desc_weights.values())
-        if total_weight <= 0:
-            return []
-
-        return [
-            PercentByName(
-                name=desc_value,
-                percent=int(round((weight / total_weight) * 100)),
-            )
-            for desc_value, weight in sorted(
-                desc_weights.items(),
-                key=lambda x: x[1],
-                reverse=True
-            )
-        ]
-
-    async def _get_user_settings_modified_data(
-            self, community_id: str) -> UserSettingsModifiedData:
-        user_cs_query = (
-            select(UserCommunitySettings.id)
-            .select_from(UserCommunitySettings)
-            .where(
-                UserCommunitySettings.community_id == community_id,
-                UserCommunitySettings.is_blocked.is_not(True),
-            )
-        )
-        user_cs = await self._session.scalars(user_cs_query)
-        user_cs_ids = list(user_cs)
-        user_count = len(user_cs_ids)
-        categories_query = (
-            select(RelationUserCsCategories.to_id,
-                   func.count(RelationUserCsCategories.to_id).label('count'))
-            .join(Category,
-                  RelationUserCsCategories.to_id == Category.id)
-            .join(Status,
-                  Category.status_id == Status.id)
-            .where(
-                RelationUserCsCategories.from_id.in_(user_cs_ids),
-                Status.code != Code.SYSTEM_CATEGORY
-            )
-            .group_by(RelationUserCsCategories.to_id)
-            .order_by(desc('count'))
-        )
-        categories = await self._session.execute(categories_query)
-
-        child_settings_query = (
-            select(RelationUserCsUserCs.to_id,
-                   func.count(RelationUserCsUserCs.to_id).label('count'))
-            .where(RelationUserCsUserCs.from_id.in_(user_cs_ids))
-            .group_by(RelationUserCsUserCs.to_id)
-            .order_by(desc('count'))
-        )
-        child_settings = await self._session.execute(child_settings_query)
-
-        responsibility_query = (
-            select(RelationUserCsResponsibilities.to_id,
-                   func.count(
-                       RelationUserCsResponsibilities.to_id
-                   ).label('count'))
-            .where(RelationUserCsResponsibilities.from_id.in_(user_cs_ids))
-            .group_by(RelationUserCsResponsibilities.to_id)
-            .order_by(desc('count'))
-        )
-        responsibilities = await self._session.execute(responsibility_query)
-
-        return UserSettingsModifiedData(
-            user_count=user_count,
-            categories_data=cast(List[Tuple[str, int]], categories.all()),
-            child_settings_data=cast(List[Tuple[str, int]],
-                                     child_settings.all()),
-            responsibility_data=cast(List[Tuple[str, int]],
-                                     responsibilities.all()),
-        )
+        return winner.id
 
     async def _get_other_community_settings(
             self,
             community_id: str,
+            stats: CommunitySettingsStats,
             vote: int,
             system_category_id: Optional[str],
     ) -> OtherCommunitySettings:
@@ -711,22 +736,20 @@ class CommunityDS(AODataStorage[Community], CRUDDataStorage[Community]):
         all_user_settings_ids = []
         selected_user_settings_ids: Dict[str, str] = {}
         selected_responsibility_ids = []
-        modified_data = await self._get_user_settings_modified_data(
-            community_id
-        )
-        for category_id, count in modified_data.categories_data:
-            all_category_ids.append(category_id)
-            if int(count / modified_data.user_count * 100) >= vote:
-                selected_category_ids[category_id] = category_id
+        user_count = stats.user_count
+        for category in stats.categories_data:
+            all_category_ids.append(category.id)
+            if self._to_percent(category.count, user_count) >= vote:
+                selected_category_ids[category.id] = category.id
 
-        for settings_id, count in modified_data.child_settings_data:
-            all_user_settings_ids.append(settings_id)
-            if int(count / modified_data.user_count * 100) >= vote:
-                selected_user_settings_ids[settings_id] = settings_id
+        for settings in stats.child_settings_data:
+            all_user_settings_ids.append(settings.id)
+            if self._to_percent(settings.count, user_count) >= vote:
+                selected_user_settings_ids[settings.id] = settings.id
 
-        for responsibility_id, count in modified_data.responsibility_data:
-            if int(count / modified_data.user_count * 100) >= vote:
-                selected_responsibility_ids.append(responsibility_id)
+        for responsibility in stats.responsibility_data:
+            if self._to_percent(responsibility.count, user_count) >= vote:
+                selected_responsibility_ids.append(responsibility.id)
 
         categories = await self._get_selected_categories(
             all_ids=all_category_ids,
@@ -742,38 +765,22 @@ class CommunityDS(AODataStorage[Community], CRUDDataStorage[Community]):
             selected_responsibility_ids
         )
 
-        is_workgroup_count = await self._get_is_workgroup_count(community_id)
-        is_workgroup = int(
-            is_workgroup_count / modified_data.user_count * 100
-        ) >= vote
-
-        is_secret_ballot_count = await self._get_is_secret_ballot_count(
-            community_id
-        )
-        is_secret_ballot = int(
-            is_secret_ballot_count / modified_data.user_count * 100
-        ) >= vote
-
-        is_can_offer_count = await self._get_is_can_offer_count(community_id)
-        is_can_offer = int(
-            is_can_offer_count / modified_data.user_count * 100
-        ) >= vote
-
-        is_minority_not_participate_count = (
-            await self._get_minority_not_participate_count(community_id)
-        )
-        is_minority_not_participate = int(
-            is_minority_not_participate_count / modified_data.user_count * 100
-        ) >= vote
-
         return OtherCommunitySettings(
             categories=categories,
             sub_communities_settings=sub_communities_settings,
             responsibilities=responsibilities,
-            is_secret_ballot=is_secret_ballot,
-            is_minority_not_participate=is_minority_not_participate,
-            is_can_offer=is_can_offer,
-            is_workgroup=is_workgroup,
+            is_secret_ballot=self._to_percent(
+                stats.secret_ballot_count, user_count
+            ) >= vote,
+            is_minority_not_participate=self._to_percent(
+                stats.minority_not_participate_count, user_count
+            ) >= vote,
+            is_can_offer=self._to_percent(
+                stats.can_offer_count, user_count
+            ) >= vote,
+            is_workgroup=self._to_percent(
+                stats.workgroup_count, user_count
+            ) >= vote,
         )
 
     async def _get_selected_categories(
@@ -853,59 +860,71 @@ class CommunityDS(AODataStorage[Community], CRUDDataStorage[Community]):
 
         return await self._session.scalar(status_query)
 
-    async def _get_total_count_users(self, community_id: str) -> int:
-        total_query = select(func.count()).where(
-            UserCommunitySettings.community_id == community_id,
-            UserCommunitySettings.is_blocked.is_not(True),
-        )
-
-        return await self._session.scalar(total_query)
+    async def _get_members_data(
+            self, community_ids: List[str],
+            user_id: str,
+    ) -> Dict[str, Tuple[int, bool]]:
+        """Вернёт число незаблокированных участников сообществ
+        и признак участия в них пользователя одним запросом.
+        """
+        if not community_ids:
+            return {}
 
-    async def _get_is_workgroup_count(self, community_id: str) -> int:
-        count_query = (
-            select(func.count()).select_from(UserCommunitySettings)
+        is_my_community = (
+            select(UserCommunitySettings.id)
             .where(
-                UserCommunitySettings.is_workgroup.is_(True),
-                UserCommunitySettings.is_blocked.is_not(True),
-                UserCommunitySettings.community_id == community_id,
+                UserCommunitySettings.community_id == Community.id,
+                UserCommunitySettings.user_id == user_id,
             )
+            .exists()
         )
-        return await self._session.scalar(count_query)
-
-    async def _get_is_secret_ballot_count(self, community_id: str) -> int:
-        count_query = (
-            select(func.count()).select_from(UserCommunitySettings)
-            .where(
-                UserCommunitySettings.is_secret_ballot.is_(True),
-                UserCommunitySettings.is_blocked.is_not(True),
-                UserCommunitySettings.community_id == community_id,
-            )
+        query = (
+            select(Community.id, Community.members_count, is_my_community)
+            .where(Community.id.in_(community_ids))
         )
-        return await self._session.scalar(count_query)
+        rows = await self._session.execute(query)
 
-    async def _get_is_can_offer_count(self, community_id: str) -> int:
-        count_query = (
-            select(func.count()).select_from(UserCommunitySettings)
-            .where(
-                UserCommunitySettings.is_can_offer.is_(True),
-                UserCommunitySettings.is_blocked.is_not(True),
-                UserCommunitySettings.community_id == community_id,
-            )
-        )
-        return await self._session.scalar(count_query)
+        return {
+            community_id: (members, bool(is_my_community))
+            for community_id, members, is_my_community in rows.all()
+        }
 
-    async def _get_minority_not_participate_count(
-            self, community_id: str
-    ) -> int:
-        count_query = (
-            select(func.count()).select_from(UserCommunitySettings)
-            .where(
-                UserCommunitySettings.is_minority_not_participate.is_(True),
-                UserCommunitySettings.is_blocked.is_not(True),
-                UserCommunitySettings.community_id == community_id,
+    @staticmethod
+    def _to_percent(count: int, total: int) -> int:
+        return int(count / total * 100) if total else 0
+
+    @classmethod
+    def _to_yes_no_percent(cls, count: int, total: int) -> List[PercentByName]:
+        true_percent = cls._to_percent(count, total)
+
+        return [
+            PercentByName(name='Да', percent=true_percent),
+            PercentByName(name='Нет', percent=100 - true_percent),
+        ]
+
+    @staticmethod
+    def _to_percent_by_weights(
+            weights: List[RelationWeight]
+    ) -> List[PercentByName]:
+        # Одинаковые тексты разных записей показываются одним вариантом
+        by_name: Dict[str, float] = defaultdict(float)
+        for item in weights:
+            by_name[item.name] += item.weight
+        total_weight = sum(by_name.values())
+        if total_weight <= 0:
+            return []
+
+        return [
+            PercentByName(
+                name=name,
+                percent=int(round((weight / total_weight) * 100)),
             )
-        )
-        return await self._session.scalar(count_query)
+            for name, weight in sorted(
+                by_name.items(),
+                key=lambda x: x[1],
+                reverse=True
+            )
+        ]
 
     async def _add_old_category(
             self, new_category_id: str,
@@ -1,6 +1,6 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 
 from auth.auth import auth_service
 from datastorage.crud.interfaces.base import Include
@@ -9,7 +9,7 @@ from datastorage.crud.interfaces.list import (
 )
 from datastorage.crud.interfaces.schema import ListResponseSchema
 from entities.community.ao.dataclasses import (
-    CsByPercent, CommunityNameData, SubCommunityData
+    CsByPercent, CommunityNameData, SubCommunityData, RecountPreview
 )
 from entities.community.ao.datastorage import CommunityDS
 from entities.community.crud.schemas import CommunityRead
@@ -66,6 +66,28 @@ async def get_sub_communities_data(
         )
 
 
+@router.get(
+    '/{community_id}/recount_preview',
+    dependencies=[Depends(auth_service.get_current_user)],
+    response_model=RecountPreview,
+)
+async def get_recount_preview(
+    community_id: str,
+    vote: Optional[int] = Query(None, ge=0, le=100),
+    quorum: Optional[int] = Query(None, ge=0, le=100),
+    significant_minority: Optional[int] = Query(None, ge=0, le=100),
+) -> RecountPreview:
+    ds = CommunityDS()
+    async with ds.session_scope(read_only=True):
+
+        return await ds.get_recount_preview(
+            community_id=community_id,
+            vote=vote,
+            quorum=quorum,
+            significant_minority=significant_minority,
+        )
+
+
 @router.post(
     '/my_list',
     response_model=ListResponseSchema[CommunityRead],  # type: ignore
@@ -0,0 +1,32 @@
+import pytest
+
+from entities.community.ao.dataclasses import RelationWeight
+from entities.community.ao.datastorage import CommunityDS
+
+WEIGHTS = [
+    RelationWeight(id='a', name='Alpha', weight=14.0),
+    RelationWeight(id='b', name='Beta', weight=14.0),
+    RelationWeight(id='c', name='Beta', weight=2.0),
+]
+
+
+@pytest.mark.parametrize('vote, current_id, expected', [
+    (50, None, 'b'),
+    (50, 'a', 'a'),
+    (51, 'a', None),
+    (0, 'a', None),
+])
+def test_most_popular_id_uses_threshold_and_keeps_current_on_tie(
+        vote, current_id, expected
+):
+    assert CommunityDS._get_most_popular_id(
+        weights=WEIGHTS, total_users=28, vote=vote, current_id=current_id,
+    ) == expected
+
+
+def test_percent_merges_variants_with_same_text():
+    percents = CommunityDS._to_percent_by_weights(WEIGHTS)
+
+    assert [(it['name'], it['percent']) for it in percents] == [
+        ('Beta', 53), ('Alpha', 47)
+    ]
@@ -0,0 +1,30 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.metrics import metrics
+from entities.community.ao import datastorage
+from entities.community.ao.datastorage import CommunityDS
+
+
+@pytest.mark.asyncio
+async def test_recount_preview_does_not_count_median_avoided(monkeypatch):
+    session = MagicMock(spec=AsyncSession)
+    settings_row = MagicMock()
+    settings_row.first.return_value = (50, 40, 10)
+    session.execute = AsyncMock(return_value=settings_row)
+    ds = CommunityDS(session=session)
+    ds.get_vote_matrix_snapshot = AsyncMock(
+        return_value=MagicMock(resources=[])
+    )
+    monkeypatch.setattr(
+        datastorage, 'VoteTally',
+        MagicMock(return_value=MagicMock(compute=lambda _: [])),
+    )
+    before = metrics.get('voting_params.median_avoided')
+
+    preview = await ds.get_recount_preview('community', vote=60)
+
+    assert (preview['vote'], preview['quorum']) == (60, 40)
+    assert metrics.get('voting_params.median_avoided') == before
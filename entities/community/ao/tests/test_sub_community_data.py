@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from entities.community.ao.datastorage import CommunityDS
+
+
+def build_community(idx: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=f'community-{idx}',
+        main_settings=SimpleNamespace(
+            name=SimpleNamespace(name=f'Name {idx}'),
+            description=SimpleNamespace(value=f'Description {idx}'),
+        ),
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('count', [1, 5, 50])
+async def test_sub_community_data_constant_queries(count):
+    communities = [build_community(idx) for idx in range(count)]
+    session = MagicMock(spec=AsyncSession)
+    result = MagicMock()
+    result.all.return_value = [
+        (community.id, idx, idx % 2 == 0)
+        for idx, community in enumerate(communities)
+    ]
+    session.execute = AsyncMock(return_value=result)
+    session.scalar = AsyncMock()
+    ds = CommunityDS(session=session)
+    ds.list = AsyncMock(return_value=SimpleNamespace(data=communities))
+
+    data = await ds.get_sub_community_data(
+        community_id='parent', user_id='user'
+    )
+
+    assert [it['members'] for it in data] == list(range(count))
+    assert [it['isMyCommunity'] for it in data] == [
+        idx % 2 == 0 for idx in range(count)
+    ]
+    ds.list.assert_awaited_once()
+    session.execute.assert_awaited_once()
+    session.scalar.assert_not_awaited()
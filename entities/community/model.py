@@ -47,6 +47,23 @@ class Community(Base):
     is_blocked: Mapped[bool] = mapped_column(nullable=False, default=False)
     created: Mapped[datetime] = mapped_column(default=datetime.now)
     tracker: Mapped[Optional[str]] = mapped_column(nullable=True, index=True)
+    # Счётчики незаблокированных участников и их настроек, поддерживаются
+    # триггерами на user_community_settings
+    members_count: Mapped[int] = mapped_column(
+        nullable=False, server_default='0'
+    )
+    workgroup_count: Mapped[int] = mapped_column(
+        nullable=False, server_default='0'
+    )
+    secret_ballot_count: Mapped[int] = mapped_column(
+        nullable=False, server_default='0'
+    )
+    can_offer_count: Mapped[int] = mapped_column(
+        nullable=False, server_default='0'
+    )
+    minority_not_participate_count: Mapped[int] = mapped_column(
+        nullable=False, server_default='0'
+    )
 
 
 @event.listens_for(Community, 'before_insert')
@@ -12,8 +12,6 @@ from entities.initiative.ao.dataclasses import CreatingNewInitiative
 from entities.initiative.model import Initiative
 from entities.status.model import Status
 from auth.models.user import User
-from entities.user_community_settings.model import UserCommunitySettings
-from entities.user_voting_result.model import UserVotingResult
 from entities.voting_option.model import VotingOption
 from entities.voting_result.model import VotingResult
 
@@ -123,24 +121,10 @@ class InitiativeDS(AODataStorage[Initiative], CRUDDataStorage):
             extra_options: List[VotingOption],
             creator_id: str,
     ) -> None:
-        user_cs_query = (
-            select(
-                UserCommunitySettings.user_id,
-                UserCommunitySettings.is_blocked,
-            ).where(
-                UserCommunitySettings.community_id == initiative.community_id
-            )
+        await self.create_user_voting_results(
+            community_id=initiative.community_id,
+            voting_result_id=voting_result.id,
+            creator_id=creator_id,
+            extra_option_ids=[option.id for option in extra_options],
+            initiative_id=initiative.id,
         )
-        user_cs_data = await self._session.execute(user_cs_query)
-        user_cs_list = user_cs_data.all()
-
-        for user_id, is_blocked in user_cs_list:
-            user_voting_result = UserVotingResult()
-            user_voting_result.voting_result = voting_result
-            user_voting_result.member_id = user_id
-            user_voting_result.community_id = initiative.community_id
-            user_voting_result.initiative_id = initiative.id
-            user_voting_result.is_blocked = is_blocked
-            if user_id == creator_id:
-                user_voting_result.extra_options = extra_options
-            self._session.add(user_voting_result)
@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import JSON, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from datastorage.database.classes import TableName
+from datastorage.database.models import Base
+from datastorage.utils import build_uuid
+from entities.lab_job.enums import LabJobStatus
+
+
+class LabJob(Base):
+    """
+    Фоновая задача лаборатории (запрос к коллективному интеллекту)
+
+    payload - параметры запроса, result - ответ в том же виде,
+    что у синхронного эндпоинта, error - код статуса и описание ошибки.
+    started_at отмечает запуск, который владеет задачей, heartbeat_at
+    обновляется, пока обработчик работает, attempts - число запусков.
+    """
+    __tablename__ = TableName.LAB_JOB
+
+    id: Mapped[str] = mapped_column(primary_key=True, default=build_uuid)
+    user_id: Mapped[str] = mapped_column(
+        ForeignKey(f'{TableName.USER}.id'),
+        nullable=False,
+        index=True
+    )
+    job_type: Mapped[str] = mapped_column(nullable=False)
+    status: Mapped[str] = mapped_column(
+        nullable=False,
+        default=LabJobStatus.QUEUED.value,
+    )
+    payload: Mapped[Dict[str, Any]] = mapped_column(JSON, nullable=False)
+    result: Mapped[Optional[Dict[str, Any]]] = mapped_column(
+        JSON, nullable=True
+    )
+    error: Mapped[Optional[Dict[str, Any]]] = mapped_column(
+        JSON, nullable=True
+    )
+    created_at: Mapped[datetime] = mapped_column(default=datetime.now)
+    started_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+    attempts: Mapped[int] = mapped_column(
+        nullable=False, default=0, server_default='0'
+    )
+    finished_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+
+    __table_args__ = (
+        Index('idx_lab_job_status_created', 'status', 'created_at'),
+    )
@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import JSON, Index, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Mapped, mapped_column
+
+from datastorage.database.classes import TableName
+from datastorage.database.models import Base
+
+
+class LLMResponseCache(Base):
+    """
+    Сохранённые ответы LLM для повторных одинаковых запросов
+
+    Ключ - хеш модели, температуры, формата ответа и текстов промптов.
+    solution_ids - решения, тексты которых вошли в промпт,
+    по ним записи удаляются при появлении новой версии решения.
+    """
+    __tablename__ = TableName.LLM_RESPONSE_CACHE
+
+    key: Mapped[str] = mapped_column(primary_key=True)
+    model: Mapped[str] = mapped_column(nullable=False)
+    response: Mapped[Dict[str, Any]] = mapped_column(JSON, nullable=False)
+    latency_ms: Mapped[float] = mapped_column(nullable=False, default=0)
+    solution_ids: Mapped[List[str]] = mapped_column(
+        ARRAY(String), nullable=False, default=list
+    )
+    created_at: Mapped[datetime] = mapped_column(default=datetime.now)
+    expires_at: Mapped[datetime] = mapped_column(nullable=False, index=True)
+
+    __table_args__ = (
+        Index('idx_llm_response_cache_solution_ids', 'solution_ids',
+              postgresql_using='gin'),
+    )
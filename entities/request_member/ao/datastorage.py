@@ -1,9 +1,10 @@
 import logging
+from collections import defaultdict
 from datetime import datetime
-from typing import Optional, List, cast, Dict, Set, Tuple
+from typing import Optional, List, cast, Dict, Tuple
 
-from sqlalchemy import select, func
-from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy import select, text
+from sqlalchemy.orm import selectinload
 
 from auth.models.user import User
 from core.dataclasses import PercentByName, SimpleVoteResult
@@ -12,15 +13,13 @@ from datastorage.consts import Code
 from datastorage.crud.datastorage import CRUDDataStorage
 from datastorage.crud.interfaces.list import Filters, Filter, Operation
 from datastorage.database.models import (
-    RequestMember, CommunitySettings, UserCommunitySettings
+    RequestMember, CommunitySettings, UserCommunitySettings, Status,
+    CommunityName, CommunityDescription
 )
 from datastorage.utils import build_uuid
+from entities.community.ao.datastorage import CommunityDS
 from entities.community.model import Community
 from entities.request_member.ao.dataclasses import MyMemberRequest
-from entities.status.model import Status
-from entities.user_voting_result.model import UserVotingResult
-from entities.voting_option.model import VotingOption
-from entities.voting_result.model import VotingResult
 
 logger = logging.getLogger(__name__)
 
@@ -141,112 +140,97 @@ class RequestMemberDS(
         )
         if is_new:
             community.user_settings.append(user_settings)
+            await self.refresh_voting_params(
+                community.id, recount_votes=True
+            )
         await self._update_parent_request_member(request_member)
         await self._create_child_request_members(request_member)
         await self._create_new_voting_results(request_member)
 
     async def my_list(self, member_id: str) -> List[MyMemberRequest]:
-        """Вернёт список заявок на добавление
+        """Вернёт дерево заявок на добавление
         в сообщества для текущего пользователя.
+
+        Заявка вкладывается в заявку ближайшего родительского сообщества,
+        в котором у пользователя тоже есть заявка. Сначала идут заявки
+        без вложенных, затем по дате создания (новые выше).
         """
-        stmt = (
-            select(self._model)
+        member_community_ids = select(self._model.community_id).where(
+            self._model.member_id == member_id,
+            self._model.parent_id.is_(None),
+        )
+        ancestors = CommunityDS.ancestors_cte(member_community_ids)
+        parent_community_id = (
+            select(ancestors.c.id)
+            .where(
+                ancestors.c.community_id == self._model.community_id,
+                ancestors.c.id.in_(member_community_ids),
+            )
+            .order_by(ancestors.c.depth)
+            .limit(1)
+            .scalar_subquery()
+        )
+        query = (
+            select(
+                self._model.id,
+                self._model.community_id,
+                self._model.reason,
+                self._model.created,
+                Status.name.label('status_name'),
+                Status.code.label('status_code'),
+                CommunityName.name.label('community_name'),
+                CommunityDescription.value.label('community_description'),
+                parent_community_id.label('parent_community_id'),
+            )
+            .join(Status, Status.id == self._model.status_id)
+            .join(Community, Community.id == self._model.community_id)
+            .join(
+                CommunitySettings,
+                CommunitySettings.id == Community.main_settings_id,
+            )
+            .join(CommunityName, CommunityName.id == CommunitySettings.name_id)
+            .join(
+                CommunityDescription,
+                CommunityDescription.id == CommunitySettings.description_id,
+            )
             .where(
                 self._model.member_id == member_id,
                 self._model.parent_id.is_(None),
             )
-            .options(
-                joinedload(self._model.status),
-                joinedload(self._model.community)
-                .joinedload(Community.main_settings)
-                .joinedload(CommunitySettings.name),
-                joinedload(self._model.community)
-                .joinedload(Community.main_settings)
-                .joinedload(CommunitySettings.description),
-                joinedload(self._model.community)
-                .joinedload(Community.parent),
-            )
+            .order_by(self._model.created.desc())
         )
+        rows = await self._session.execute(query)
 
-        result = await self._session.execute(stmt)
-        request_members: List[RequestMember] = list(result.scalars())
-
-        all_requests: Dict[str, MyMemberRequest] = {}
-        communities_in_requests: Set[str] = set()
-
-        for req in request_members:
-            community: Community = req.community
-            settings: Optional[CommunitySettings] = community.main_settings
-
-            # FIXME: разобраться, почему иногда не срабатывает joinedload
-            if settings is None and community.main_settings_id:
-                settings = await self.get(
-                    instance_id=community.main_settings_id,
-                    include=['name', 'description'],
-                    model=CommunitySettings,
-                )
-
+        root_requests: List[MyMemberRequest] = []
+        children: Dict[str, List[MyMemberRequest]] = defaultdict(list)
+        for row in rows.all():
             req_data = MyMemberRequest(
-                key=req.id,
-                communityId=community.id,
-                communityName=settings.name.name,
-                communityDescription=settings.description.value,
-                status=req.status.name,
-                statusCode=req.status.code,
-                reason=req.reason,
-                created=req.created.strftime('%d.%m.%Y %H:%M'),
-                children=[],
+                key=row.id,
+                communityId=row.community_id,
+                communityName=row.community_name,
+                communityDescription=row.community_description,
+                status=row.status_name,
+                statusCode=row.status_code,
+                reason=row.reason,
+                created=row.created.strftime('%d.%m.%Y %H:%M'),
+                children=children[row.community_id],
             )
-
-            all_requests[community.id] = req_data
-            communities_in_requests.add(community.id)
-
-            if community.parent_id:
-                communities_in_requests.add(community.parent_id)
-
-        root_requests: List[MyMemberRequest] = []
-
-        for req in request_members:
-            community: Community = req.community
-            req_data: MyMemberRequest = all_requests[community.id]
-
-            if (not community.parent_id or
-                    community.parent_id not in all_requests):
+            if row.parent_community_id:
+                children[row.parent_community_id].append(req_data)
+            else:
                 root_requests.append(req_data)
 
-        for req in request_members:
-            community: Community = req.community
-            if community.parent_id and community.parent_id in all_requests:
-                parent_data: MyMemberRequest = all_requests[
-                    community.parent_id
-                ]
-                parent_data['children'].append(all_requests[community.id])
-
-        def sort_key(r_: MyMemberRequest) -> tuple:
-            """Ключ для сортировки:
-            сначала корневые, затем по дате (новые выше).
-            """
-            try:
-                dt = datetime.strptime(
-                    r_.get('created'), '%d.%m.%Y %H:%M'
-                )
-                return (
-                    0 if not r_.get('children') else 1,
-                    -dt.timestamp()
-                )
-            except ValueError:
-                return 0, 0
-
-        root_requests.sort(key=sort_key)
-        for r in root_requests:
-            if r.get('children'):
-                r['children'].sort(key=sort_key)
+        # Сортировка устойчивая, порядок по дате из запроса сохраняется
+        root_requests.sort(key=lambda it: bool(it['children']))
+        for req_data in root_requests:
+            req_data['children'].sort(key=lambda it: bool(it['children']))
 
         return root_requests
 
     async def _delete_child_request_members(
             self,
-            request_member_id: str
+            request_member_id: str,
+            ancestor_request_members: Optional[List[RequestMember]] = None,
     ) -> None:
         community_id, user_id, creator_id = None, None, None
         child_request_members = await self._get_child_request_members(
@@ -279,20 +263,20 @@ class RequestMemberDS(
                 community_id=community_id, user_id=user_id
             )
 
-            child_community_id = await self._get_child_community_id(
-                community_id
-            )
-            if child_community_id:
-                child_request_member = await self._get_child_request_member(
-                    community_id=child_community_id,
-                    user_id=user_id
-                )
-                if child_request_member:
-                    child_request_member_id = child_request_member.id
-                    await self._delete_request_member(child_request_member)
-                    await self._delete_child_request_members(
-                        child_request_member_id
+            if ancestor_request_members is None:
+                ancestor_request_members = (
+                    await self._get_ancestor_request_members(
+                        community_id=community_id, user_id=user_id
                     )
+                )
+            if ancestor_request_members:
+                parent_request_member = ancestor_request_members[0]
+                parent_request_member_id = parent_request_member.id
+                await self._delete_request_member(parent_request_member)
+                await self._delete_child_request_members(
+                    request_member_id=parent_request_member_id,
+                    ancestor_request_members=ancestor_request_members[1:],
+                )
 
         await self._delete_user_voting_results(user_id)
 
@@ -425,6 +409,14 @@ class RequestMemberDS(
                 f'Не удалось удались пользовательские настройки '
                 f'сообщества с id: {user_settings.id}: {e.__str__()}'
                 )
+                return
+
+            # text() запросы медиан не вызывают autoflush: без flush
+            # ушедший участник попал бы в пересчёт параметров
+            await self._session.flush()
+            await self.refresh_voting_params(
+                community_id, recount_votes=True
+            )
 
     async def _get_request_member(
             self,
@@ -444,15 +436,6 @@ class RequestMemberDS(
         )
         return await self._session.scalar(query)
 
-    async def _get_child_community_id(
-            self, community_id: str
-    ) -> Optional[str]:
-        query = select(Community.parent_id).where(Community.id == community_id)
-        result = await self._session.execute(query)
-        row = result.fetchone()
-
-        return row[0] if row else None
-
     async def _get_child_request_members(
             self,
             request_member_id: str,
@@ -484,18 +467,35 @@ class RequestMemberDS(
 
         return list(child_request_members)
 
-    async def _get_child_request_member(
+    async def _get_ancestor_request_members(
             self,
             community_id: str,
             user_id: str
-    ) -> Optional[RequestMember]:
-        query = select(RequestMember).where(
-            RequestMember.community_id == community_id,
-            RequestMember.member_id == user_id,
-            RequestMember.parent_id.is_(None),
+    ) -> List[RequestMember]:
+        """Вернёт основные запросы пользователя на членство
+        в родительских сообществах, начиная с ближайшего.
+
+        Цепочка обрывается на первом родительском сообществе,
+        в котором у пользователя нет запроса.
+        """
+        ancestors = CommunityDS.ancestors_cte([community_id])
+        query = (
+            select(RequestMember, ancestors.c.depth)
+            .join(ancestors, ancestors.c.id == RequestMember.community_id)
+            .where(
+                RequestMember.member_id == user_id,
+                RequestMember.parent_id.is_(None),
+            )
+            .order_by(ancestors.c.depth)
         )
+        rows = await self._session.execute(query)
+        request_members: List[RequestMember] = []
+        for request_member, depth in rows.all():
+            if depth != len(request_members) + 1:
+                break
+            request_members.append(request_member)
 
-        return await self._session.scalar(query)
+        return request_members
 
     async def _create_child_request_members_after_main(
             self,
@@ -503,38 +503,53 @@ class RequestMemberDS(
     ) -> None:
         """Создание дочерних запросов на членство,
          после создания основного запроса.
+
+         Участники, одобряющие новых членов по умолчанию, и сам кандидат
+         сразу получают дочерний запрос с голосом «за».
         """
-        user_cs_query = (
-            select(
-                UserCommunitySettings.id,
-                UserCommunitySettings.is_default_add_member,
-                UserCommunitySettings.user_id,
-            ).where(
-                UserCommunitySettings.community_id ==
-                request_member.community_id
+        query = text("""
+            WITH voted_status AS (
+                SELECT id FROM public.status WHERE code = :voted_code
             )
-        )
-        user_cs_data = await self._session.execute(user_cs_query)
-        user_cs_list = user_cs_data.all()
-
-        for id_, is_default_add_member, user_id in user_cs_list:
-            child_request_member = self._create_copy_request_member(
-                request_member
+            INSERT INTO public.request_member (
+                id, member_id, community_id, status_id, vote, reason,
+                parent_id, creator_id, created, updated
             )
-            child_request_member.parent_id = request_member.id
-            child_request_member.creator_id = user_id
-            if is_default_add_member or request_member.member.id == user_id:
-                status_query = select(Status).where(Status.code == Code.VOTED)
-                status = await self._session.scalar(status_query)
-                child_request_member.vote = True
-                child_request_member.status = status
-            try:
-                self._session.add(child_request_member)
-            except Exception as e:
-                logger.error(f'Дочерний запрос на добавление члена сообщества '
-                             f'(родителя с id {request_member.id}) не может '
-                             f'быть создан: {e.__str__()}')
-                continue
+            SELECT
+                gen_random_uuid()::varchar,
+                rm.member_id,
+                rm.community_id,
+                CASE
+                    WHEN ucs.is_default_add_member
+                        OR ucs.user_id = rm.member_id
+                    THEN (SELECT id FROM voted_status)
+                    ELSE rm.status_id
+                END,
+                CASE
+                    WHEN ucs.is_default_add_member
+                        OR ucs.user_id = rm.member_id
+                    THEN TRUE
+                    ELSE rm.vote
+                END,
+                rm.reason,
+                rm.id,
+                ucs.user_id,
+                rm.created,
+                rm.updated
+            FROM public.request_member rm
+            JOIN public.user_community_settings ucs
+                ON ucs.community_id = rm.community_id
+            WHERE rm.id = :request_member_id
+            ON CONFLICT ON CONSTRAINT idx_unique_request_member DO NOTHING;
+        """)
+
+        await self._session.execute(
+            query,
+            {
+                'request_member_id': request_member.id,
+                'voted_code': Code.VOTED,
+            }
+        )
 
     @staticmethod
     def _create_copy_request_member(
@@ -556,65 +571,67 @@ class RequestMemberDS(
     ) -> None:
         """Создание пользовательских результатов голосований
         при вступлении нового участника в сообщество.
+
+        Новому участнику по умолчанию засчитываются текущие итоги
+        голосований и выбранные большинством варианты ответов.
         """
-        query = (
-            select(
-                UserVotingResult.voting_result_id,
-                func.max(UserVotingResult.initiative_id)
-                .label('initiative_id'),
-                func.max(UserVotingResult.rule_id).label('rule_id'),
+        query = text("""
+            WITH grouped_results AS (
+                SELECT
+                    voting_result_id,
+                    MAX(initiative_id) AS initiative_id,
+                    MAX(rule_id) AS rule_id
+                FROM public.user_voting_result
+                WHERE community_id = :community_id
+                GROUP BY voting_result_id
+            ),
+            new_user_results AS (
+                INSERT INTO public.user_voting_result (
+                    id, vote, member_id, community_id, voting_result_id,
+                    initiative_id, rule_id, is_blocked,
+                    is_voted_myself, is_voted_by_default
+                )
+                SELECT
+                    gen_random_uuid()::varchar,
+                    vr.vote,
+                    :member_id,
+                    :community_id,
+                    gr.voting_result_id,
+                    gr.initiative_id,
+                    gr.rule_id,
+                    FALSE,
+                    FALSE,
+                    TRUE
+                FROM grouped_results gr
+                JOIN public.voting_result vr ON vr.id = gr.voting_result_id
+                RETURNING id, voting_result_id
             )
-            .where(
-                UserVotingResult.community_id == request_member.community_id
+            INSERT INTO public.relation_user_voting_result_voting_options (
+                id, from_id, to_id
             )
-            .group_by(UserVotingResult.voting_result_id)
-        )
-
-        grouped_results = (await self._session.execute(query)).all()
-        voting_result_ids = [row.voting_result_id for row in grouped_results]
+            SELECT
+                gen_random_uuid()::varchar,
+                nur.id,
+                vo.id
+            FROM new_user_results nur
+            JOIN public.voting_result vr ON vr.id = nur.voting_result_id
+            CROSS JOIN LATERAL json_object_keys(
+                CASE WHEN json_typeof(vr.options) = 'object'
+                    THEN vr.options ELSE '{}'::json END
+            ) AS option_id
+            JOIN public.voting_option vo ON vo.id = option_id;
+        """)
 
-        related_query = (
-            select(VotingResult)
-            .where(VotingResult.id.in_(voting_result_ids))
-        )
-
-        related_results = {
-            row.id: row
-            for row in (
-                await self._session.execute(related_query)
-            ).scalars().all()
-        }
-
-        for row in grouped_results:
-            voting_result = related_results.get(row.voting_result_id)
-            option_ids = list((voting_result.options or {}).keys())
-            options = (
-                await self._get_options_by_ids(option_ids)
-                if option_ids else []
+        try:
+            await self._session.execute(
+                query,
+                {
+                    'community_id': request_member.community_id,
+                    'member_id': request_member.member_id,
+                }
+            )
+        except Exception as e:
+            raise Exception(
+                f'Не удалось создать пользовательские '
+                f'результаты голосования: {e.__str__()}'
             )
-            user_voting_result = UserVotingResult()
-            user_voting_result.vote = voting_result.vote
-            user_voting_result.extra_options = options
-            user_voting_result.member_id = request_member.member_id
-            user_voting_result.community_id = request_member.community_id
-            user_voting_result.voting_result = voting_result
-            user_voting_result.initiative_id = row.initiative_id
-            user_voting_result.rule_id = row.rule_id
-            user_voting_result.is_voted_by_default = True
-
-            try:
-                self._session.add(user_voting_result)
-            except Exception as e:
-                raise Exception(
-                    f'Не удалось создать пользовательский '
-                    f'результат голосования: {e.__str__()}'
-                )
-
-    async def _get_options_by_ids(self, ids: List[str]) -> List[VotingOption]:
-        query = (
-            select(VotingOption)
-            .where(VotingOption.id.in_(ids))
-        )
-        result = await self._session.scalars(query)
-
-        return list(result)
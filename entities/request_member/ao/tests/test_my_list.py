@@ -0,0 +1,63 @@
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from entities.request_member.ao.datastorage import RequestMemberDS
+
+
+def build_row(
+        community_id: str,
+        created: datetime,
+        parent_community_id: str = None,
+) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=f'request-{community_id}',
+        community_id=community_id,
+        reason=None,
+        created=created,
+        status_name='Status',
+        status_code='status',
+        community_name=f'Name {community_id}',
+        community_description=f'Description {community_id}',
+        parent_community_id=parent_community_id,
+    )
+
+
+@pytest.mark.asyncio
+async def test_my_list_builds_tree_with_one_query():
+    # Строки приходят отсортированными по дате создания (новые выше),
+    # вложенная заявка может прийти раньше родительской
+    rows = [
+        build_row('child-new', datetime(2024, 5, 3), 'parent'),
+        build_row('single', datetime(2024, 5, 2)),
+        build_row('grandchild', datetime(2024, 5, 2), 'child-new'),
+        build_row('parent', datetime(2024, 5, 1)),
+        build_row('child-old', datetime(2024, 4, 1), 'parent'),
+        build_row('single-old', datetime(2024, 3, 1)),
+    ]
+    session = MagicMock(spec=AsyncSession)
+    result = MagicMock()
+    result.all.return_value = rows
+    session.execute = AsyncMock(return_value=result)
+    session.scalar = AsyncMock()
+    session.scalars = AsyncMock()
+    ds = RequestMemberDS(session=session)
+
+    data = await ds.my_list(member_id='user')
+
+    assert [it['communityId'] for it in data] == [
+        'single', 'single-old', 'parent'
+    ]
+    parent = data[2]
+    assert [it['communityId'] for it in parent['children']] == [
+        'child-old', 'child-new'
+    ]
+    assert [it['communityId'] for it in parent['children'][1]['children']] \
+        == ['grandchild']
+    assert parent['created'] == '01.05.2024 00:00'
+    session.execute.assert_awaited_once()
+    session.scalar.assert_not_awaited()
+    session.scalars.assert_not_awaited()
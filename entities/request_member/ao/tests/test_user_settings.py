@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.dataclasses import BaseTimeParams, BaseVotingParams
+from entities.request_member.ao.datastorage import RequestMemberDS
+
+
+@pytest.mark.asyncio
+async def test_deleted_settings_are_flushed_before_voting_params_refresh():
+    calls = []
+    session = MagicMock(spec=AsyncSession)
+    session.scalar = AsyncMock(return_value=SimpleNamespace(id='settings'))
+    session.delete = AsyncMock(side_effect=lambda _: calls.append('delete'))
+    session.flush = AsyncMock(side_effect=lambda: calls.append('flush'))
+    ds = RequestMemberDS(session=session)
+    ds.refresh_voting_params = AsyncMock(
+        side_effect=lambda *_, **__: calls.append('refresh')
+    )
+
+    await ds._check_and_delete_user_settings('community', 'user')
+
+    assert calls == ['delete', 'flush', 'refresh']
+    ds.refresh_voting_params.assert_awaited_once_with(
+        'community', recount_votes=True
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('vote_median, is_recounted', [(60, True), (50, False)])
+async def test_leave_recounts_votes_when_median_shifts(
+        vote_median, is_recounted
+):
+    community_settings = SimpleNamespace(
+        last_voting_params={
+            'vote': 50, 'quorum': 40, 'significant_minority': 10,
+        },
+    )
+    session = MagicMock(spec=AsyncSession)
+    session.scalar = AsyncMock(
+        side_effect=[SimpleNamespace(id='settings'), community_settings]
+    )
+    ds = RequestMemberDS(session=session)
+    voting_params = BaseVotingParams(
+        vote=vote_median, quorum=40, significant_minority=10
+    )
+    ds.calc_voting_params = AsyncMock(return_value=voting_params)
+    ds.calc_time_params = AsyncMock(return_value=BaseTimeParams(
+        decision_delay=1, dispute_time_limit=1
+    ))
+    ds.recount_of_all_votes = AsyncMock()
+
+    await ds._check_and_delete_user_settings('community', 'user')
+
+    assert community_settings.vote == vote_median
+    assert ds.recount_of_all_votes.await_count == int(is_recounted)
+    assert community_settings.last_voting_params == voting_params.__dict__
+    if is_recounted:
+        ds.recount_of_all_votes.assert_awaited_once_with(
+            community_id='community', voting_params=voting_params
+        )
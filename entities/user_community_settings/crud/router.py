@@ -10,7 +10,7 @@ post_processing = [
     PostProcessingData(
         data_storage=CommunityDS,
         methods=[Method.CREATE, Method.UPDATE, Method.DELETE],
-        func_name='change_community_settings',
+        func_name='schedule_change_community_settings',
         instance_attr='community_id',
     )
 ]
@@ -1,9 +1,15 @@
+import logging
 from typing import Optional, Union, Tuple, List
 
-from sqlalchemy import select
+from sqlalchemy import select, text
 from sqlalchemy.orm import selectinload
 
-from datastorage.ao.datastorage import AODataStorage
+from core.coalescing import CoalescingScheduler
+from core.config import VOTE_RECOUNT_DEBOUNCE_SECONDS
+from core.metrics import metrics
+from datastorage.ao.datastorage import (
+    AODataStorage, vote_matrix_snapshots
+)
 from datastorage.crud.datastorage import CRUDDataStorage
 from entities.user_voting_result.ao.interfaces import Resource, ResourceType
 from datastorage.database.models import (
@@ -11,6 +17,16 @@ from datastorage.database.models import (
     Noncompliance, DelegateSettings
 )
 
+logger = logging.getLogger(__name__)
+
+# Пересчёт итогов голосования: не более одного запуска на результат
+# голосования в процессе, голоса, пришедшие во время пересчёта,
+# схлопываются в один завершающий пересчёт
+vote_recount_scheduler = CoalescingScheduler(
+    name='vote_recount',
+    debounce_seconds=VOTE_RECOUNT_DEBOUNCE_SECONDS,
+)
+
 
 class UserVotingResultDS(
     AODataStorage[UserVotingResult],
@@ -20,16 +36,14 @@ class UserVotingResultDS(
     _model = UserVotingResult
 
     async def recount_vote(self, result_id: str) -> None:
-        """Пересчитает результаты голосования."""
+        """Передаст голос доверителям и запланирует
+        пересчёт результатов голосования.
+        """
         async with self.session_scope():
             user_voting_result: UserVotingResult = await self.get(
                 instance_id=result_id,
                 include=['extra_options', 'noncompliance']
             )
-            voting_result: Optional[VotingResult] = await self.get(
-                instance_id=user_voting_result.voting_result_id,
-                model=VotingResult,
-            )
             resource, resource_type = await self._get_resource(
                 user_voting_result
             )
@@ -44,11 +58,72 @@ class UserVotingResultDS(
                 noncompliance=user_voting_result.noncompliance,
             )
 
+        voting_result_id = user_voting_result.voting_result_id
+        resource_id = resource.id
+        vote_recount_scheduler.trigger(
+            key=voting_result_id,
+            func=lambda: self.__class__().recount_voting_result(
+                voting_result_id=voting_result_id,
+                resource_id=resource_id,
+                resource_type=resource_type,
+            ),
+        )
+
+    async def recount_voting_result(
+            self, voting_result_id: str,
+            resource_id: str,
+            resource_type: ResourceType,
+    ) -> None:
+        """Пересчитает результаты голосования.
+
+        Пересчёты одного результата голосования в разных процессах
+        выполняются по очереди под advisory lock транзакции. После
+        пересчёта снимок матрицы голосов сообщества сбрасывается.
+        """
+        async with self.session_scope():
+            await self._lock_voting_result(voting_result_id)
+            voting_result: Optional[VotingResult] = await self.get(
+                instance_id=voting_result_id,
+                model=VotingResult,
+            )
+            resource = await self._get_resource_by_type(
+                resource_id=resource_id,
+                resource_type=resource_type,
+            )
             await self.user_vote_count(
                 voting_result=voting_result,
                 resource=resource,
                 resource_type=resource_type,
             )
+            community_id = resource.community_id
+
+        # Сброс после фиксации транзакции: снимок, собранный до неё,
+        # не должен пережить пересчёт
+        vote_matrix_snapshots.invalidate(community_id)
+
+    async def _lock_voting_result(self, voting_result_id: str) -> None:
+        """Захватит advisory lock результата голосования
+        до конца транзакции.
+        """
+        params = {'key': f'voting_result:{voting_result_id}'}
+        is_locked = await self._session.scalar(
+            text(
+                'SELECT pg_try_advisory_xact_lock(hashtextextended(:key, 0))'
+            ),
+            params,
+        )
+        if not is_locked:
+            metrics.increment('vote_recount.lock_waits')
+            logger.info(
+                f'Ожидание пересчёта результата голосования '
+                f'{voting_result_id} в другом процессе'
+            )
+            await self._session.execute(
+                text(
+                    'SELECT pg_advisory_xact_lock(hashtextextended(:key, 0))'
+                ),
+                params,
+            )
 
     async def _get_resource(
             self, user_voting_result: UserVotingResult
@@ -56,16 +131,10 @@ class UserVotingResultDS(
         rule_id: Optional[str] = user_voting_result.rule_id
         initiative_id: Optional[str] = user_voting_result.initiative_id
         if rule_id:
-            return await self.get(
-                instance_id=rule_id,
-                include=['status'],
-                model=Rule,
-            ), 'rule'
+            return await self._get_resource_by_type(rule_id, 'rule'), 'rule'
         elif initiative_id:
-            return await self.get(
-                instance_id=initiative_id,
-                include=['status'],
-                model=Initiative,
+            return await self._get_resource_by_type(
+                initiative_id, 'initiative'
             ), 'initiative'
 
         else:
@@ -74,6 +143,16 @@ class UserVotingResultDS(
                 f'{user_voting_result.id} не имеет связи с источником'
             )
 
+    async def _get_resource_by_type(
+            self, resource_id: str,
+            resource_type: ResourceType,
+    ) -> Optional[Resource]:
+        return await self.get(
+            instance_id=resource_id,
+            include=['status'],
+            model=Rule if resource_type == 'rule' else Initiative,
+        )
+
     async def _propagate_vote(
             self, user_id: str,
             community_id: str,
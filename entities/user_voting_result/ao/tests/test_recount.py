@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from datastorage.ao.datastorage import vote_matrix_snapshots
+from entities.user_voting_result.ao.datastorage import UserVotingResultDS
+
+
+@pytest.mark.asyncio
+async def test_recount_voting_result_invalidates_vote_matrix_snapshot():
+    ds = UserVotingResultDS(session=MagicMock(spec=AsyncSession))
+    ds._lock_voting_result = AsyncMock()
+    ds.get = AsyncMock(return_value=SimpleNamespace(id='voting_result'))
+    ds._get_resource_by_type = AsyncMock(
+        return_value=SimpleNamespace(id='rule', community_id='community')
+    )
+    ds.user_vote_count = AsyncMock()
+    vote_matrix_snapshots.set('community', MagicMock())
+
+    await ds.recount_voting_result(
+        voting_result_id='voting_result',
+        resource_id='rule',
+        resource_type='rule',
+    )
+
+    ds.user_vote_count.assert_awaited_once()
+    assert vote_matrix_snapshots.get('community') is None
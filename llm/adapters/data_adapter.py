@@ -1,14 +1,19 @@
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
+from sqlalchemy import text
+
 from datastorage.crud.datastorage import CRUDDataStorage
 from datastorage.crud.exceptions import CRUDNotFound
-from datastorage.crud.interfaces.list import Filter, Operation, PaginationModel
+from datastorage.crud.interfaces.list import (
+    Direction, Filter, Operation, Order, PaginationModel
+)
 from datastorage.database.models import (
     Challenge, Solution, CollectiveInteraction, SolutionVersion,
     InteractionSuggestion, InteractionCriticism, InteractionCombination,
     CombinationSourceElement, VersionInteractionInfluence
 )
+from datastorage.utils import build_uuid
 from entities.solution_preprocessing.model import SolutionPreprocessing
 
 
@@ -18,6 +23,38 @@ class DataAdapter:
     def __init__(self, session=None):
         self.session = session
 
+    async def release_connection(self) -> None:
+        """
+        Возврат соединения в пул перед долгим запросом к LLM
+
+        К этому моменту выполнено только чтение, фиксировать нечего.
+        Загруженные объекты остаются доступны (expire_on_commit=False),
+        следующий запрос к БД возьмёт соединение заново.
+        """
+        if self.session is not None and self.session.in_transaction():
+            await self.session.commit()
+
+    @staticmethod
+    async def _list_all(
+            ds: CRUDDataStorage,
+            filters: List[Filter],
+            page_size: int = 500
+    ) -> List:
+        """Все объекты по фильтрам: без пагинации list отдаёт
+        только MAX_PAGE_SIZE записей"""
+        items = []
+        page = 1
+        while True:
+            response = await ds.list(
+                filters=filters,
+                orders=[Order(field="id", direction=Direction.ASC)],
+                pagination=PaginationModel(limit=page_size, skip=page)
+            )
+            items.extend(response.data)
+            if len(response.data) < page_size or len(items) >= response.total:
+                return items
+            page += 1
+
     async def get_challenge(self, challenge_id: str) -> Optional[Challenge]:
         """Получение задачи по ID"""
         ds = CRUDDataStorage(model=Challenge, session=self.session)
@@ -41,8 +78,7 @@ class DataAdapter:
                     val='',
                 ),
             ]
-            response = await ds.list(filters=filters)
-            return response.data
+            return await self._list_all(ds, filters)
 
     async def get_solution(self, solution_id: str) -> Optional[Solution]:
         """Получение решения по ID"""
@@ -92,8 +128,7 @@ class DataAdapter:
                     val=exclude_user_id
                 )
             ]
-            response = await ds.list(filters=filters)
-            return response.data
+            return await self._list_all(ds, filters)
 
     async def create_collective_interaction(
             self,
@@ -576,6 +611,113 @@ class DataAdapter:
                                 val=solution_id)]
             )
 
+    async def get_preprocessings(
+            self,
+            solution_ids: List[str]
+    ) -> Dict[str, SolutionPreprocessing]:
+        """Предобработки решений одним запросом: {solution_id: prep}"""
+        if not solution_ids:
+            return {}
+        ds = CRUDDataStorage(model=SolutionPreprocessing, session=self.session)
+        async with ds.session_scope(read_only=True):
+            response = await ds.list(
+                filters=[Filter(field="solution_id", op=Operation.IN,
+                                val=list(solution_ids))],
+                pagination=PaginationModel(limit=len(solution_ids), skip=1)
+            )
+            return {prep.solution_id: prep for prep in response.data}
+
+    async def get_solutions_to_preprocess(
+            self,
+            challenge_id: Optional[str] = None,
+            community_id: Optional[str] = None,
+            force: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Решения задачи или сообщества без предобработки или с устаревшей
+        предобработкой (решение изменено после неё): [{id, current_content}]
+        """
+        conditions = ["s.current_content <> ''"]
+        params = {}
+        if challenge_id:
+            conditions.append("s.challenge_id = :challenge_id")
+            params['challenge_id'] = challenge_id
+        if community_id:
+            conditions.append("c.community_id = :community_id")
+            params['community_id'] = community_id
+        if not force:
+            conditions.append("(p.id IS NULL OR p.updated_at < s.updated_at)")
+
+        result = await self.session.execute(
+            text(f"""
+                SELECT s.id, s.current_content
+                FROM public.solution s
+                JOIN public.challenge c ON c.id = s.challenge_id
+                LEFT JOIN public.solution_preprocessing p
+                    ON p.solution_id = s.id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY s.id
+            """),
+            params,
+        )
+        return [dict(row) for row in result.mappings().all()]
+
+    async def upsert_preprocessings(
+            self,
+            rows: List[Dict[str, Any]],
+            processed_at: datetime
+    ) -> int:
+        """
+        Запись предобработок одним INSERT ... ON CONFLICT (solution_id)
+
+        rows: [{solution_id, embedding, key_points, category, metrics}],
+        embedding и metrics - JSON строки. processed_at - момент чтения
+        текстов: решение, изменённое во время обработки, останется
+        устаревшим для следующего запуска.
+        """
+        if not rows:
+            return 0
+
+        await self.session.execute(
+            text("""
+                INSERT INTO public.solution_preprocessing (
+                    id, solution_id, embedding, key_points, category,
+                    metrics, created_at, updated_at
+                )
+                SELECT
+                    data.id, data.solution_id, data.embedding,
+                    data.key_points, data.category, data.metrics,
+                    :processed_at, :processed_at
+                FROM unnest(
+                    CAST(:ids AS varchar[]),
+                    CAST(:solution_ids AS varchar[]),
+                    CAST(:embeddings AS varchar[]),
+                    CAST(:key_points AS varchar[]),
+                    CAST(:categories AS varchar[]),
+                    CAST(:metrics AS varchar[])
+                ) AS data(
+                    id, solution_id, embedding, key_points, category, metrics
+                )
+                ON CONFLICT (solution_id) DO UPDATE SET
+                    embedding = EXCLUDED.embedding,
+                    key_points = EXCLUDED.key_points,
+                    category = EXCLUDED.category,
+                    metrics = EXCLUDED.metrics,
+                    updated_at = EXCLUDED.updated_at
+            """),
+            {
+                'ids': [build_uuid() for _ in rows],
+                'solution_ids': [row['solution_id'] for row in rows],
+                'embeddings': [row['embedding'] for row in rows],
+                'key_points': [row['key_points'] for row in rows],
+                'categories': [row['category'] for row in rows],
+                'metrics': [row['metrics'] for row in rows],
+                'processed_at': processed_at,
+            },
+        )
+        await self.session.commit()
+        return len(rows)
+
     async def update_preprocessing(
             self,
             solution_id: str,
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import List, Optional, Dict, Any
 
 from pydantic import BaseModel, Field
@@ -19,6 +20,23 @@ class LLMProvider(BaseModel):
     priority: int = 1
 
 
+class HedgingPolicy(BaseModel):
+    """Настройки хеджирования запросов к LLM для типа задачи"""
+    enabled: bool = False
+    # Перцентиль наблюдаемой задержки, после которого запрос
+    # дублируется следующему провайдеру
+    percentile: float = 0.9
+    min_delay_seconds: float = 5
+    # Задержка, пока по провайдеру недостаточно наблюдений
+    default_delay_seconds: float = 30
+
+    def hedge_delay(self, observed_latency: Optional[float]) -> float:
+        """Сколько ждать ответа перед отправкой запроса следующему"""
+        if observed_latency is None:
+            return self.default_delay_seconds
+        return max(observed_latency, self.min_delay_seconds)
+
+
 class ThinkingDirection(BaseModel):
     """Направление мысли с готовым стартовым решением"""
     title: str
@@ -179,3 +197,31 @@ class CommunityAIOverviewResponse(BaseModel):
     ai_adoption_rate: float
     total_ai_interactions: int
     average_interactions_per_solution: float
+
+
+class PreprocessBatchRequest(BaseModel):
+    challenge_id: Optional[str] = None
+    community_id: Optional[str] = None
+    force: bool = False
+
+
+class PreprocessBatchResponse(BaseModel):
+    processed: int
+    embedding_type: str
+    compute_seconds: float
+    total_seconds: float
+    solutions_per_second: float
+
+
+class LabJobResponse(BaseModel):
+    """Состояние фоновой задачи лаборатории"""
+    job_id: str
+    job_type: str
+    status: str
+    # Ответ в том же виде, что у синхронного эндпоинта
+    result: Optional[Dict[str, Any]] = None
+    # {"status_code": ..., "detail": ...}
+    error: Optional[Dict[str, Any]] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
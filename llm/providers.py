@@ -1,5 +1,16 @@
-from typing import List
-from llm.models.lab import LLMProvider
+from typing import Dict, List, Optional
+from llm.models.lab import HedgingPolicy, LLMProvider
+
+# Хеджирование по типам задач: анализ решений ждёт ответа долго,
+# поэтому медленный провайдер дублируется следующим. Интеграция
+# правок в текст решения не хеджируется, чтобы не тратить квоту
+TASK_HEDGING_POLICIES: Dict[str, HedgingPolicy] = {
+    "directions": HedgingPolicy(enabled=True),
+    "ideas": HedgingPolicy(enabled=True),
+    "improvements": HedgingPolicy(enabled=True),
+    "criticism": HedgingPolicy(enabled=True),
+    "integration": HedgingPolicy(enabled=False),
+}
 
 
 def create_default_llm_providers() -> List[LLMProvider]:
@@ -51,21 +62,7 @@ def create_default_llm_providers() -> List[LLMProvider]:
     ]
 
 
-def create_provider_for_task(task_type: str, solutions_count: int) -> str:
-    """
-    Выбирает оптимальный провайдер на основе типа задачи и количества решений
-
-    Args:
-        task_type: "directions", "ideas", "improvements", "criticism"
-        solutions_count: количество решений для анализа
-
-    Returns:
-        Имя провайдера
-    """
-    if solutions_count <= 12 and task_type in ["improvements", "criticism"]:
-        return "together"
-
-    if task_type in ["ideas", "directions"] or solutions_count > 12:
-        return "together"
+def get_hedging_policy(task_type: Optional[str]) -> HedgingPolicy:
+    """Настройки хеджирования для типа задачи"""
+    return TASK_HEDGING_POLICIES.get(task_type, HedgingPolicy())
 
-    return "together"
\ No newline at end of file
@@ -1,53 +1,76 @@
+import asyncio
+import json
 from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Type
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from auth.auth import auth_service
 from core.config import USE_MOCK_LLM
 from datastorage.crud.exceptions import CRUDNotFound
-from datastorage.database.base import get_async_session
+from datastorage.database.base import async_session_maker, get_async_session
 from ..models.lab import (
     DirectionsResponse, DirectionsRequest, ThinkingDirectionResponse,
     IdeasResponse, CollectiveRequest, CollectiveIdeaResponse,
     ImprovementsResponse, ImprovementSuggestionResponse, CriticismResponse,
     CriticismPointResponse, InteractionResponse, IntegrationResponse,
     IntegrationRequest, SolutionVersionRequest, AIInfluenceResponse,
-    CollectiveMetricsResponse, CommunityAIOverviewResponse
+    CollectiveMetricsResponse, CommunityAIOverviewResponse, LabJobResponse,
+    PreprocessBatchRequest, PreprocessBatchResponse
 )
 from ..providers import create_default_llm_providers
+from ..services.lab_jobs import LabJobFailed, lab_job_queue
 from ..services.rate_limiting_service import get_rate_limiting_service
+from ..services.provider_router import get_provider_router
+from ..services.response_cache import get_llm_response_cache
 from ..services.token_calculator_service import get_token_calculator
 from ..services.laboratory_service import LaboratoryService
-from ..services.llm_service import LLMService
+from ..services.llm_service import LLMService, llm_token_stream
 from ..services.preprocessing_service import PreprocessingService
 from ..adapters.data_adapter import DataAdapter
 from ..services.mock_llm_service import MockLLMService
 
 router = APIRouter()
 
+SSE_KEEPALIVE_SECONDS = 15
 
-async def get_laboratory_service(
-        session: AsyncSession = Depends(get_async_session)
-) -> LaboratoryService:
-    """Фабрика для создания LaboratoryService."""
+_llm_service_instance: Optional[LLMService] = None
 
-    if USE_MOCK_LLM:
-        llm_service = MockLLMService()
-    else:
-        providers = create_default_llm_providers()
 
-        import os
-        for provider in providers:
-            if provider.name == "groq":
-                provider.api_key = os.getenv("GROQ_API_KEY")
-            elif provider.name == "together":
-                provider.api_key = os.getenv("TOGETHER_API_KEY")
-            elif provider.name == "huggingface":
-                provider.api_key = os.getenv("HUGGINGFACE_API_KEY")
+def get_llm_service() -> LLMService:
+    """Получение singleton instance LLM сервиса.
+
+    Провайдеры собираются один раз, HTTP соединения берутся
+    из общего пула приложения.
+    """
+    global _llm_service_instance
+    if _llm_service_instance is None:
+        if USE_MOCK_LLM:
+            _llm_service_instance = MockLLMService()
+        else:
+            providers = create_default_llm_providers()
+
+            import os
+            for provider in providers:
+                if provider.name == "groq":
+                    provider.api_key = os.getenv("GROQ_API_KEY")
+                elif provider.name == "together":
+                    provider.api_key = os.getenv("TOGETHER_API_KEY")
+                elif provider.name == "huggingface":
+                    provider.api_key = os.getenv("HUGGINGFACE_API_KEY")
+
+            _llm_service_instance = LLMService(providers)
+    return _llm_service_instance
 
-        llm_service = LLMService(providers)
 
+def create_laboratory_service(session: AsyncSession) -> LaboratoryService:
+    """Сборка LaboratoryService для сессии БД."""
+
+    llm_service = get_llm_service()
     data_adapter = DataAdapter(session)
     preprocessing_service = PreprocessingService(data_adapter)
     rate_limiting_service = get_rate_limiting_service()
@@ -62,59 +85,222 @@ async def get_laboratory_service(
     )
 
 
-# === Работа с направлениями мысли ===
+async def get_laboratory_service(
+        session: AsyncSession = Depends(get_async_session)
+) -> LaboratoryService:
+    """Фабрика для создания LaboratoryService."""
+    return create_laboratory_service(session)
 
-@router.post("/directions/generate", response_model=DirectionsResponse)
-async def generate_thinking_directions(
-        request: DirectionsRequest,
+
+# === Потоковая передача ответов LLM (SSE) ===
+
+def _sse_event(event: str, data: Any) -> str:
+    """Событие text/event-stream"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _error_payload(e: Exception, error_message: str) -> Dict[str, Any]:
+    """Ошибка запроса лаборатории с тем же кодом статуса,
+    что у синхронного эндпоинта"""
+    if isinstance(e, HTTPException):
+        return {"status_code": e.status_code, "detail": e.detail}
+    if isinstance(e, ValueError):
+        return {"status_code": 400, "detail": str(e)}
+    return {"status_code": 500, "detail": f"{error_message}: {str(e)}"}
+
+
+def _stream_lab_request(
+        handler: Callable[[LaboratoryService], Awaitable[BaseModel]],
+        error_message: str
+) -> StreamingResponse:
+    """
+    Выполнение запроса лаборатории с передачей токенов LLM по мере генерации
+
+    События: start - сразу после подключения, token - фрагмент текста
+    модели, reset - провайдер упал посреди ответа и генерация начата
+    заново, result - итоговый ответ (та же схема, что у обычного
+    эндпоинта), error - ошибка с кодом статуса.
+
+    Сессия БД создаётся внутри потока: зависимость с yield закрывает
+    свою сессию до начала передачи ответа. При отключении клиента
+    запрос к LLM отменяется.
+    """
+
+    async def events():
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def run() -> BaseModel:
+            llm_token_stream.set(queue)
+            async with async_session_maker() as session:
+                return await handler(create_laboratory_service(session))
+
+        task = asyncio.create_task(run())
+        try:
+            yield _sse_event("start", {})
+            while not task.done() or not queue.empty():
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait(
+                    {getter, task},
+                    timeout=SSE_KEEPALIVE_SECONDS,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if getter in done:
+                    event, data = getter.result()
+                    yield _sse_event(event, data)
+                    continue
+                getter.cancel()
+                if not done:
+                    yield ": keep-alive\n\n"
+
+            try:
+                result = task.result()
+            except Exception as e:
+                yield _sse_event("error", _error_payload(e, error_message))
+            else:
+                yield _sse_event("result", jsonable_encoder(result))
+        finally:
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# === Фоновые задачи лаборатории ===
+
+def _job_response(job) -> LabJobResponse:
+    return LabJobResponse(
+        job_id=job.id,
+        job_type=job.job_type,
+        status=job.status,
+        result=job.result,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+async def _submit_lab_job(
+        job_type: str,
+        request: BaseModel,
+        user_id: str,
+        session: AsyncSession
+) -> LabJobResponse:
+    """Постановка запроса лаборатории в очередь фоновых задач"""
+    job = await lab_job_queue.submit(
+        session, job_type, jsonable_encoder(request), user_id
+    )
+    return _job_response(job)
+
+
+def _register_lab_job(
+        job_type: str,
+        request_model: Type[BaseModel],
+        handler: Callable[[Any, str, LaboratoryService], Awaitable[BaseModel]],
+        error_message: str
+) -> None:
+    """
+    Регистрация запроса лаборатории как фоновой задачи
+
+    Задача выполняется тем же обработчиком, что и синхронный
+    эндпоинт, в собственной сессии БД воркера.
+    """
+
+    async def run(payload: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+        try:
+            async with async_session_maker() as session:
+                response = await handler(
+                    request_model(**payload),
+                    user_id,
+                    create_laboratory_service(session)
+                )
+        except Exception as e:
+            raise LabJobFailed(_error_payload(e, error_message)) from e
+        return jsonable_encoder(response)
+
+    lab_job_queue.register(job_type, run)
+
+
+@router.get("/jobs/{job_id}", response_model=LabJobResponse)
+async def get_lab_job(
+        job_id: str,
         current_user=Depends(auth_service.get_current_user),
-        service: LaboratoryService = Depends(get_laboratory_service)
+        session: AsyncSession = Depends(get_async_session)
 ):
+    """Состояние и результат фоновой задачи лаборатории"""
+    job = await lab_job_queue.get(session, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    if job.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Нет доступа к задаче")
+    return _job_response(job)
+
+
+# === Работа с направлениями мысли ===
+
+async def _generate_thinking_directions(
+        request: DirectionsRequest,
+        user_id: str,
+        service: LaboratoryService
+) -> DirectionsResponse:
     """Генерация направлений мысли для новых участников с готовыми стартовыми решениями"""
-    try:
-        # Проверка rate limit
-        allowed, seconds_remaining = service.rate_limiter.check_rate_limit(
-            user_id=current_user.id,
-            request_type="directions"
+    # Проверка rate limit
+    allowed, seconds_remaining = service.rate_limiter.check_rate_limit(
+        user_id=user_id,
+        request_type="directions"
+    )
+
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "error": "rate_limit_exceeded",
+                "message": "Вы можете делать запрос этого типа раз в 30 минут",
+                "seconds_remaining": seconds_remaining,
+                "request_type": "directions"
+            }
         )
 
-        if not allowed:
-            raise HTTPException(
-                status_code=429,
-                detail={
-                    "error": "rate_limit_exceeded",
-                    "message": "Вы можете делать запрос этого типа раз в 30 минут",
-                    "seconds_remaining": seconds_remaining,
-                    "request_type": "directions"
-                }
-            )
+    # Генерируем направления
+    directions = await service.generate_thinking_directions(
+        challenge_id=request.challenge_id,
+        user_id=request.user_id
+    )
 
-        # Генерируем направления
-        directions = await service.generate_thinking_directions(
-            challenge_id=request.challenge_id,
-            user_id=request.user_id
-        )
+    # Записываем факт запроса
+    service.rate_limiter.record_request(
+        user_id=user_id,
+        request_type="directions"
+    )
 
-        # Записываем факт запроса
-        service.rate_limiter.record_request(
-            user_id=current_user.id,
-            request_type="directions"
-        )
+    # Получаем информацию о задаче для ответа
+    challenge = await service.data_adapter.get_challenge(request.challenge_id)
+    solutions = await service.data_adapter.get_challenge_solutions(
+        request.challenge_id)
+
+    return DirectionsResponse(
+        directions=[
+            ThinkingDirectionResponse(**direction.dict())
+            for direction in directions
+        ],
+        total_participants=len(solutions),
+        challenge_title=challenge.title if challenge else "Неизвестная задача"
+    )
 
-        # Получаем информацию о задаче для ответа
-        challenge = await service.data_adapter.get_challenge(request.challenge_id)
-        solutions = await service.data_adapter.get_challenge_solutions(
-            request.challenge_id)
-
-        return DirectionsResponse(
-            directions=[
-                ThinkingDirectionResponse(**direction.dict())
-                for direction in directions
-            ],
-            total_participants=len(solutions),
-            challenge_title=challenge.title if challenge else "Неизвестная задача"
-        )
 
+@router.post("/directions/generate", response_model=DirectionsResponse)
+async def generate_thinking_directions(
+        request: DirectionsRequest,
+        current_user=Depends(auth_service.get_current_user),
+        service: LaboratoryService = Depends(get_laboratory_service)
+):
+    """Генерация направлений мысли для новых участников с готовыми стартовыми решениями"""
+    try:
+        return await _generate_thinking_directions(request, current_user.id, service)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -124,62 +310,98 @@ async def generate_thinking_directions(
         )
 
 
-# === Запросы к коллективному интеллекту ===
+@router.post("/directions/generate/stream")
+async def generate_thinking_directions_stream(
+        request: DirectionsRequest,
+        current_user=Depends(auth_service.get_current_user)
+):
+    """Генерация направлений мысли с потоковой передачей ответа LLM (SSE)"""
+    return _stream_lab_request(
+        lambda service: _generate_thinking_directions(request, current_user.id, service),
+        error_message="Ошибка генерации направлений"
+    )
 
-@router.post("/ideas/request", response_model=IdeasResponse)
-async def request_collective_ideas(
-        request: CollectiveRequest,
+
+@router.post("/directions/generate/job", response_model=LabJobResponse, status_code=202)
+async def generate_thinking_directions_job(
+        request: DirectionsRequest,
         current_user=Depends(auth_service.get_current_user),
-        service: LaboratoryService = Depends(get_laboratory_service)
+        session: AsyncSession = Depends(get_async_session)
 ):
+    """Генерация направлений мысли в фоновой задаче: сразу возвращает id задачи, результат - GET /jobs/{job_id}"""
+    return await _submit_lab_job("directions", request, current_user.id, session)
+
+
+_register_lab_job(
+    "directions", DirectionsRequest, _generate_thinking_directions,
+    error_message="Ошибка генерации направлений"
+)
+
+
+# === Запросы к коллективному интеллекту ===
+
+async def _request_collective_ideas(
+        request: CollectiveRequest,
+        user_id: str,
+        service: LaboratoryService
+) -> IdeasResponse:
     """Запрос новых идей (комбинации элементов) от коллективного интеллекта"""
-    try:
-        # Проверка rate limit
-        allowed, seconds_remaining = service.rate_limiter.check_rate_limit(
-            user_id=current_user.id,
-            request_type="ideas"
+    # Проверка rate limit
+    allowed, seconds_remaining = service.rate_limiter.check_rate_limit(
+        user_id=user_id,
+        request_type="ideas"
+    )
+
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "error": "rate_limit_exceeded",
+                "message": "Вы можете делать запрос этого типа раз в 30 минут",
+                "seconds_remaining": seconds_remaining,
+                "request_type": "ideas"
+            }
         )
 
-        if not allowed:
-            raise HTTPException(
-                status_code=429,
-                detail={
-                    "error": "rate_limit_exceeded",
-                    "message": "Вы можете делать запрос этого типа раз в 30 минут",
-                    "seconds_remaining": seconds_remaining,
-                    "request_type": "ideas"
-                }
-            )
+    # Генерируем идеи
+    result = await service.request_collective_ideas(
+        solution_id=request.solution_id,
+        max_ideas=request.max_items or 3
+    )
 
-        # Генерируем идеи
-        result = await service.request_collective_ideas(
-            solution_id=request.solution_id,
-            max_ideas=request.max_items or 3
-        )
+    # Записываем факт запроса
+    service.rate_limiter.record_request(
+        user_id=user_id,
+        request_type="ideas"
+    )
 
-        # Записываем факт запроса
-        service.rate_limiter.record_request(
-            user_id=current_user.id,
-            request_type="ideas"
-        )
+    return IdeasResponse(
+        interaction_id=result["interaction_id"],
+        ideas=[
+            CollectiveIdeaResponse(
+                idea_description=idea.idea_description,
+                combination_elements=[
+                    e.get("element") for e in idea.combination_elements
+                ],
+                source_solutions_count=idea.source_solutions_count,
+                potential_impact=idea.potential_impact,
+                reasoning=idea.reasoning,
+            )
+            for idea in result["ideas"]
+        ],
+        total_count=result["total_count"]
+    )
 
-        return IdeasResponse(
-            interaction_id=result["interaction_id"],
-            ideas=[
-                CollectiveIdeaResponse(
-                    idea_description=idea.idea_description,
-                    combination_elements=[
-                        e.get("element") for e in idea.combination_elements
-                    ],
-                    source_solutions_count=idea.source_solutions_count,
-                    potential_impact=idea.potential_impact,
-                    reasoning=idea.reasoning,
-                )
-                for idea in result["ideas"]
-            ],
-            total_count=result["total_count"]
-        )
 
+@router.post("/ideas/request", response_model=IdeasResponse)
+async def request_collective_ideas(
+        request: CollectiveRequest,
+        current_user=Depends(auth_service.get_current_user),
+        service: LaboratoryService = Depends(get_laboratory_service)
+):
+    """Запрос новых идей (комбинации элементов) от коллективного интеллекта"""
+    try:
+        return await _request_collective_ideas(request, current_user.id, service)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -189,52 +411,88 @@ async def request_collective_ideas(
         )
 
 
-@router.post("/improvements/request", response_model=ImprovementsResponse)
-async def request_improvement_suggestions(
+@router.post("/ideas/request/stream")
+async def request_collective_ideas_stream(
+        request: CollectiveRequest,
+        current_user=Depends(auth_service.get_current_user)
+):
+    """Запрос новых идей с потоковой передачей ответа LLM (SSE)"""
+    return _stream_lab_request(
+        lambda service: _request_collective_ideas(request, current_user.id, service),
+        error_message="Ошибка запроса идей"
+    )
+
+
+@router.post("/ideas/request/job", response_model=LabJobResponse, status_code=202)
+async def request_collective_ideas_job(
         request: CollectiveRequest,
         current_user=Depends(auth_service.get_current_user),
-        service: LaboratoryService = Depends(get_laboratory_service)
+        session: AsyncSession = Depends(get_async_session)
 ):
+    """Запрос новых идей в фоновой задаче: сразу возвращает id задачи, результат - GET /jobs/{job_id}"""
+    return await _submit_lab_job("ideas", request, current_user.id, session)
+
+
+_register_lab_job(
+    "ideas", CollectiveRequest, _request_collective_ideas,
+    error_message="Ошибка запроса идей"
+)
+
+
+async def _request_improvement_suggestions(
+        request: CollectiveRequest,
+        user_id: str,
+        service: LaboratoryService
+) -> ImprovementsResponse:
     """Запрос предложений по улучшению решения"""
-    try:
-        # Проверка rate limit
-        allowed, seconds_remaining = service.rate_limiter.check_rate_limit(
-            user_id=current_user.id,
-            request_type="improvements"
+    # Проверка rate limit
+    allowed, seconds_remaining = service.rate_limiter.check_rate_limit(
+        user_id=user_id,
+        request_type="improvements"
+    )
+
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "error": "rate_limit_exceeded",
+                "message": "Вы можете делать запрос этого типа раз в 30 минут",
+                "seconds_remaining": seconds_remaining,
+                "request_type": "improvements"
+            }
         )
 
-        if not allowed:
-            raise HTTPException(
-                status_code=429,
-                detail={
-                    "error": "rate_limit_exceeded",
-                    "message": "Вы можете делать запрос этого типа раз в 30 минут",
-                    "seconds_remaining": seconds_remaining,
-                    "request_type": "improvements"
-                }
-            )
+    # Генерируем предложения
+    result = await service.request_improvement_suggestions(
+        solution_id=request.solution_id,
+        max_suggestions=request.max_items or 4
+    )
 
-        # Генерируем предложения
-        result = await service.request_improvement_suggestions(
-            solution_id=request.solution_id,
-            max_suggestions=request.max_items or 4
-        )
+    # Записываем факт запроса
+    service.rate_limiter.record_request(
+        user_id=user_id,
+        request_type="improvements"
+    )
 
-        # Записываем факт запроса
-        service.rate_limiter.record_request(
-            user_id=current_user.id,
-            request_type="improvements"
-        )
+    return ImprovementsResponse(
+        interaction_id=result["interaction_id"],
+        suggestions=[
+            ImprovementSuggestionResponse(**suggestion.dict())
+            for suggestion in result["suggestions"]
+        ],
+        total_count=result["total_count"]
+    )
 
-        return ImprovementsResponse(
-            interaction_id=result["interaction_id"],
-            suggestions=[
-                ImprovementSuggestionResponse(**suggestion.dict())
-                for suggestion in result["suggestions"]
-            ],
-            total_count=result["total_count"]
-        )
 
+@router.post("/improvements/request", response_model=ImprovementsResponse)
+async def request_improvement_suggestions(
+        request: CollectiveRequest,
+        current_user=Depends(auth_service.get_current_user),
+        service: LaboratoryService = Depends(get_laboratory_service)
+):
+    """Запрос предложений по улучшению решения"""
+    try:
+        return await _request_improvement_suggestions(request, current_user.id, service)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -244,52 +502,88 @@ async def request_improvement_suggestions(
         )
 
 
-@router.post("/criticism/request", response_model=CriticismResponse)
-async def request_solution_criticism(
+@router.post("/improvements/request/stream")
+async def request_improvement_suggestions_stream(
+        request: CollectiveRequest,
+        current_user=Depends(auth_service.get_current_user)
+):
+    """Запрос предложений по улучшению с потоковой передачей ответа LLM (SSE)"""
+    return _stream_lab_request(
+        lambda service: _request_improvement_suggestions(request, current_user.id, service),
+        error_message="Ошибка запроса улучшений"
+    )
+
+
+@router.post("/improvements/request/job", response_model=LabJobResponse, status_code=202)
+async def request_improvement_suggestions_job(
         request: CollectiveRequest,
         current_user=Depends(auth_service.get_current_user),
-        service: LaboratoryService = Depends(get_laboratory_service)
+        session: AsyncSession = Depends(get_async_session)
 ):
+    """Запрос предложений по улучшению в фоновой задаче: сразу возвращает id задачи, результат - GET /jobs/{job_id}"""
+    return await _submit_lab_job("improvements", request, current_user.id, session)
+
+
+_register_lab_job(
+    "improvements", CollectiveRequest, _request_improvement_suggestions,
+    error_message="Ошибка запроса улучшений"
+)
+
+
+async def _request_solution_criticism(
+        request: CollectiveRequest,
+        user_id: str,
+        service: LaboratoryService
+) -> CriticismResponse:
     """Запрос критики решения от коллективного интеллекта"""
-    try:
-        # Проверка rate limit
-        allowed, seconds_remaining = service.rate_limiter.check_rate_limit(
-            user_id=current_user.id,
-            request_type="criticism"
+    # Проверка rate limit
+    allowed, seconds_remaining = service.rate_limiter.check_rate_limit(
+        user_id=user_id,
+        request_type="criticism"
+    )
+
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "error": "rate_limit_exceeded",
+                "message": "Вы можете делать запрос этого типа раз в 30 минут",
+                "seconds_remaining": seconds_remaining,
+                "request_type": "criticism"
+            }
         )
 
-        if not allowed:
-            raise HTTPException(
-                status_code=429,
-                detail={
-                    "error": "rate_limit_exceeded",
-                    "message": "Вы можете делать запрос этого типа раз в 30 минут",
-                    "seconds_remaining": seconds_remaining,
-                    "request_type": "criticism"
-                }
-            )
+    # Генерируем критику
+    result = await service.request_solution_criticism(
+        solution_id=request.solution_id,
+        max_criticisms=request.max_items or 3
+    )
 
-        # Генерируем критику
-        result = await service.request_solution_criticism(
-            solution_id=request.solution_id,
-            max_criticisms=request.max_items or 3
-        )
+    # Записываем факт запроса
+    service.rate_limiter.record_request(
+        user_id=user_id,
+        request_type="criticism"
+    )
 
-        # Записываем факт запроса
-        service.rate_limiter.record_request(
-            user_id=current_user.id,
-            request_type="criticism"
-        )
+    return CriticismResponse(
+        interaction_id=result["interaction_id"],
+        criticisms=[
+            CriticismPointResponse(**criticism.dict())
+            for criticism in result["criticisms"]
+        ],
+        total_count=result["total_count"]
+    )
 
-        return CriticismResponse(
-            interaction_id=result["interaction_id"],
-            criticisms=[
-                CriticismPointResponse(**criticism.dict())
-                for criticism in result["criticisms"]
-            ],
-            total_count=result["total_count"]
-        )
 
+@router.post("/criticism/request", response_model=CriticismResponse)
+async def request_solution_criticism(
+        request: CollectiveRequest,
+        current_user=Depends(auth_service.get_current_user),
+        service: LaboratoryService = Depends(get_laboratory_service)
+):
+    """Запрос критики решения от коллективного интеллекта"""
+    try:
+        return await _request_solution_criticism(request, current_user.id, service)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -299,6 +593,34 @@ async def request_solution_criticism(
         )
 
 
+@router.post("/criticism/request/stream")
+async def request_solution_criticism_stream(
+        request: CollectiveRequest,
+        current_user=Depends(auth_service.get_current_user)
+):
+    """Запрос критики решения с потоковой передачей ответа LLM (SSE)"""
+    return _stream_lab_request(
+        lambda service: _request_solution_criticism(request, current_user.id, service),
+        error_message="Ошибка запроса критики"
+    )
+
+
+@router.post("/criticism/request/job", response_model=LabJobResponse, status_code=202)
+async def request_solution_criticism_job(
+        request: CollectiveRequest,
+        current_user=Depends(auth_service.get_current_user),
+        session: AsyncSession = Depends(get_async_session)
+):
+    """Запрос критики решения в фоновой задаче: сразу возвращает id задачи, результат - GET /jobs/{job_id}"""
+    return await _submit_lab_job("criticism", request, current_user.id, session)
+
+
+_register_lab_job(
+    "criticism", CollectiveRequest, _request_solution_criticism,
+    error_message="Ошибка запроса критики"
+)
+
+
 # === Обработка ответов пользователя ===
 
 @router.post("/interaction/{interaction_id}/respond")
@@ -377,6 +699,37 @@ async def delete_solution(
         )
 
 
+async def _apply_integration(
+        request: IntegrationRequest,
+        user_id: str,
+        service: LaboratoryService
+) -> IntegrationResponse:
+    """Интеграция принятых предложений в решение с помощью ИИ"""
+    # Проверяем права доступа к решению
+    has_access = await service.validate_solution_access(
+        request.solution_id,
+        user_id
+    )
+
+    if not has_access:
+        raise HTTPException(
+            status_code=403,
+            detail="Нет прав доступа к решению"
+        )
+
+    integrated_text = await service.integrate_accepted_items(
+        solution_id=request.solution_id,
+        interaction_id=request.interaction_id,
+        accepted_items=request.accepted_items,
+        user_modifications=request.user_modifications
+    )
+
+    return IntegrationResponse(
+        integrated_text=integrated_text,
+        change_description=f"Интеграция {len(request.accepted_items)} предложений КИ"
+    )
+
+
 @router.post("/integration/apply", response_model=IntegrationResponse)
 async def apply_integration(
         request: IntegrationRequest,
@@ -385,30 +738,7 @@ async def apply_integration(
 ):
     """Интеграция принятых предложений в решение с помощью ИИ"""
     try:
-        # Проверяем права доступа к решению
-        has_access = await service.validate_solution_access(
-            request.solution_id,
-            current_user.id
-        )
-
-        if not has_access:
-            raise HTTPException(
-                status_code=403,
-                detail="Нет прав доступа к решению"
-            )
-
-        integrated_text = await service.integrate_accepted_items(
-            solution_id=request.solution_id,
-            interaction_id=request.interaction_id,
-            accepted_items=request.accepted_items,
-            user_modifications=request.user_modifications
-        )
-
-        return IntegrationResponse(
-            integrated_text=integrated_text,
-            change_description=f"Интеграция {len(request.accepted_items)} предложений КИ"
-        )
-
+        return await _apply_integration(request, current_user.id, service)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -418,6 +748,34 @@ async def apply_integration(
         )
 
 
+@router.post("/integration/apply/stream")
+async def apply_integration_stream(
+        request: IntegrationRequest,
+        current_user=Depends(auth_service.get_current_user)
+):
+    """Интеграция принятых предложений с потоковой передачей ответа LLM (SSE)"""
+    return _stream_lab_request(
+        lambda service: _apply_integration(request, current_user.id, service),
+        error_message="Ошибка интеграции"
+    )
+
+
+@router.post("/integration/apply/job", response_model=LabJobResponse, status_code=202)
+async def apply_integration_job(
+        request: IntegrationRequest,
+        current_user=Depends(auth_service.get_current_user),
+        session: AsyncSession = Depends(get_async_session)
+):
+    """Интеграция принятых предложений в фоновой задаче: сразу возвращает id задачи, результат - GET /jobs/{job_id}"""
+    return await _submit_lab_job("integration", request, current_user.id, session)
+
+
+_register_lab_job(
+    "integration", IntegrationRequest, _apply_integration,
+    error_message="Ошибка интеграции"
+)
+
+
 @router.post("/solution/version/create")
 async def create_solution_version(
         request: SolutionVersionRequest,
@@ -641,6 +999,54 @@ async def trigger_preprocessing(
         )
 
 
+async def _preprocess_batch(
+        request: PreprocessBatchRequest,
+        user_id: str,
+        service: LaboratoryService
+) -> PreprocessBatchResponse:
+    """Пакетная предобработка новых и изменённых решений задачи или сообщества"""
+    stats = await service.preprocessing.preprocess_batch(
+        challenge_id=request.challenge_id,
+        community_id=request.community_id,
+        force=request.force
+    )
+    return PreprocessBatchResponse(**stats)
+
+
+@router.post("/preprocess/batch", response_model=PreprocessBatchResponse)
+async def preprocess_batch(
+        request: PreprocessBatchRequest,
+        current_user=Depends(auth_service.get_current_user),
+        service: LaboratoryService = Depends(get_laboratory_service)
+):
+    """Пакетная предобработка новых и изменённых решений задачи или сообщества"""
+    try:
+        return await _preprocess_batch(request, current_user.id, service)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка пакетной предобработки: {str(e)}"
+        )
+
+
+@router.post("/preprocess/batch/job", response_model=LabJobResponse, status_code=202)
+async def preprocess_batch_job(
+        request: PreprocessBatchRequest,
+        current_user=Depends(auth_service.get_current_user),
+        session: AsyncSession = Depends(get_async_session)
+):
+    """Пакетная предобработка в фоновой задаче: сразу возвращает id задачи, результат - GET /jobs/{job_id}"""
+    return await _submit_lab_job("preprocess_batch", request, current_user.id, session)
+
+
+_register_lab_job(
+    "preprocess_batch", PreprocessBatchRequest, _preprocess_batch,
+    error_message="Ошибка пакетной предобработки"
+)
+
+
 @router.get("/health")
 async def llm_service_health(
         service: LaboratoryService = Depends(get_laboratory_service)
@@ -648,21 +1054,28 @@ async def llm_service_health(
     """Проверка здоровья LLM провайдеров и сервисов"""
     try:
         providers_status = []
+        routing_state = {
+            (state["name"], state["model"]): state
+            for state in get_provider_router().get_state()
+        }
 
         for provider in service.llm_service.providers:
+            routing = routing_state.get((provider.name, provider.model), {})
             providers_status.append({
                 "name": provider.name,
                 "model": provider.model,
                 "priority": provider.priority,
                 "max_tokens": provider.max_tokens,
                 "max_context": provider.max_context_tokens,
-                "status": "configured"
+                "status": routing.get("circuit", "configured"),
+                "routing": routing or None
             })
 
         return {
             "status": "healthy",
             "providers": providers_status,
             "rate_limiting": service.get_rate_limit_stats(),
+            "response_cache": get_llm_response_cache().get_stats(),
             "timestamp": datetime.now().isoformat()
         }
 
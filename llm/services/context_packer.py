@@ -0,0 +1,182 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+@dataclass(kw_only=True)
+class PackedSolution:
+    """
+    Решение в контексте промпта
+
+    Подставляется в промпт вместо Solution: current_content - полный
+    текст решения или, если он не поместился, его ключевые тезисы.
+    """
+    id: str
+    user_id: str
+    current_content: str
+    is_summary: bool = False
+
+
+@dataclass(kw_only=True)
+class PackingCandidate:
+    """Решение-кандидат с размерами полного текста и тезисов в токенах"""
+    id: str
+    user_id: str
+    content: str
+    tokens: int
+    summary: Optional[str] = None
+    summary_tokens: int = 0
+
+
+@dataclass(kw_only=True)
+class PackingResult:
+    """Итог упаковки решений в бюджет контекста"""
+    solutions: List[PackedSolution] = field(default_factory=list)
+    budget_tokens: int = 0
+    used_tokens: int = 0
+    candidates_count: int = 0
+
+    @property
+    def full_count(self) -> int:
+        return sum(1 for sol in self.solutions if not sol.is_summary)
+
+    @property
+    def summary_count(self) -> int:
+        return sum(1 for sol in self.solutions if sol.is_summary)
+
+    @property
+    def utilization(self) -> float:
+        if not self.budget_tokens:
+            return 0.0
+        return self.used_tokens / self.budget_tokens
+
+
+def solution_cost(tokens: int) -> int:
+    """Токены решения в промпте с запасом на заголовки и разделители"""
+    return int(tokens * 1.05) + 50
+
+
+def pack_solutions(
+        candidates: List[PackingCandidate],
+        budget_tokens: int,
+        priority: Optional[List[str]] = None,
+        max_share: float = 0.25,
+        full_share: float = 0.7
+) -> PackingResult:
+    """
+    Жадная упаковка решений в бюджет контекста
+
+    priority - id решений по убыванию ценности (порядок MMR: сначала
+    самые непохожие), решения не из списка идут следом в исходном
+    порядке. Проходы:
+    1. полные тексты в порядке ценности в пределах full_share бюджета,
+       если решение не занимает больше max_share бюджета - неподходящие
+       пропускаются, а не обрывают отбор;
+    2. ключевые тезисы для не вошедших решений в пределах бюджета;
+    3. оставшийся бюджет - на замену тезисов полными текстами.
+    В промпте решения идут в исходном порядке кандидатов.
+    """
+    result = PackingResult(
+        budget_tokens=max(budget_tokens, 0),
+        candidates_count=len(candidates),
+    )
+    by_id = {candidate.id: candidate for candidate in candidates}
+    ordered_ids = list(dict.fromkeys(
+        [sid for sid in (priority or []) if sid in by_id]
+        + [candidate.id for candidate in candidates]
+    ))
+
+    full_cost = {c.id: solution_cost(c.tokens) for c in candidates}
+    summary_cost = {
+        c.id: solution_cost(c.summary_tokens) for c in candidates if c.summary
+    }
+    cap = result.budget_tokens * max_share
+    full_budget = result.budget_tokens * full_share
+    chosen = {}
+    used = 0
+
+    for sid in ordered_ids:
+        cost = full_cost[sid]
+        if cost <= cap and used + cost <= full_budget:
+            chosen[sid] = False
+            used += cost
+
+    for sid in ordered_ids:
+        if sid in chosen or sid not in summary_cost:
+            continue
+        # Короткое решение целиком может быть дешевле своих тезисов
+        is_summary = summary_cost[sid] < full_cost[sid]
+        cost = summary_cost[sid] if is_summary else full_cost[sid]
+        if used + cost <= result.budget_tokens:
+            chosen[sid] = is_summary
+            used += cost
+
+    for sid in ordered_ids:
+        if chosen.get(sid) is False:
+            continue
+        delta = full_cost[sid] - (summary_cost[sid] if sid in chosen else 0)
+        if used + delta <= result.budget_tokens:
+            chosen[sid] = False
+            used += delta
+
+    result.used_tokens = used
+    for candidate in candidates:
+        if candidate.id not in chosen:
+            continue
+        is_summary = chosen[candidate.id]
+        result.solutions.append(PackedSolution(
+            id=candidate.id,
+            user_id=candidate.user_id,
+            current_content=(
+                candidate.summary if is_summary else candidate.content
+            ),
+            is_summary=is_summary,
+        ))
+    return result
+
+
+def chunk_solutions(
+        candidates: List[PackingCandidate],
+        budget_tokens: int
+) -> List[List[PackedSolution]]:
+    """
+    Разбиение решений на части, каждая из которых влезает в бюджет
+
+    Решения идут подряд в исходном порядке (похожие решения стоит
+    ставить рядом), части выравниваются по размеру. Решение больше
+    бюджета заменяется ключевыми тезисами, без тезисов - пропускается.
+    """
+    items = []
+    for candidate in candidates:
+        cost = solution_cost(candidate.tokens)
+        if cost <= budget_tokens:
+            items.append((cost, PackedSolution(
+                id=candidate.id,
+                user_id=candidate.user_id,
+                current_content=candidate.content,
+            )))
+            continue
+        summary_cost = solution_cost(candidate.summary_tokens)
+        if candidate.summary and summary_cost <= budget_tokens:
+            items.append((summary_cost, PackedSolution(
+                id=candidate.id,
+                user_id=candidate.user_id,
+                current_content=candidate.summary,
+                is_summary=True,
+            )))
+
+    if not items:
+        return []
+
+    total = sum(cost for cost, _ in items)
+    chunks_count = -(-total // budget_tokens)
+    target = -(-total // chunks_count)
+
+    chunks = [[]]
+    used = 0
+    for cost, solution in items:
+        if chunks[-1] and (used >= target or used + cost > budget_tokens):
+            chunks.append([])
+            used = 0
+        chunks[-1].append(solution)
+        used += cost
+    return chunks
@@ -0,0 +1,71 @@
+import logging
+from typing import Optional
+
+import aiohttp
+
+from core.config import (
+    LLM_HTTP_POOL_LIMIT, LLM_HTTP_POOL_LIMIT_PER_HOST,
+    LLM_HTTP_KEEPALIVE_SECONDS, LLM_HTTP_DNS_CACHE_SECONDS,
+    LLM_HTTP_CONNECT_TIMEOUT_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LLMHttpClient:
+    """
+    Общий пул HTTP соединений к LLM провайдерам.
+
+    Одна ClientSession на приложение: соединения с провайдерами
+    переиспользуются (keep-alive), DNS кешируется, число соединений
+    ограничено как всего, так и на каждый хост провайдера.
+    Создаётся при старте приложения и закрывается при завершении.
+    """
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Сессия пула, создаётся при первом обращении"""
+        if self._session is None or self._session.closed:
+            self.start()
+        return self._session
+
+    def start(self) -> None:
+        """Создание пула соединений"""
+        if self._session is not None and not self._session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=LLM_HTTP_POOL_LIMIT,
+            limit_per_host=LLM_HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=LLM_HTTP_KEEPALIVE_SECONDS,
+            ttl_dns_cache=LLM_HTTP_DNS_CACHE_SECONDS,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(
+                connect=LLM_HTTP_CONNECT_TIMEOUT_SECONDS
+            ),
+        )
+        logger.info("HTTP пул LLM провайдеров создан")
+
+    @staticmethod
+    def request_timeout(total_seconds: float) -> aiohttp.ClientTimeout:
+        """Таймаут запроса к провайдеру с общим таймаутом соединения"""
+        return aiohttp.ClientTimeout(
+            total=total_seconds,
+            connect=LLM_HTTP_CONNECT_TIMEOUT_SECONDS,
+        )
+
+    async def close(self) -> None:
+        """Закрытие пула соединений"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP пул LLM провайдеров закрыт")
+        self._session = None
+
+
+# Глобальный пул соединений к LLM провайдерам
+llm_http_client = LLMHttpClient()
@@ -0,0 +1,292 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import JSON, DateTime, Integer, String, func, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import (
+    LAB_JOB_WORKERS, LAB_JOB_POLL_SECONDS, LAB_JOB_STALE_SECONDS,
+    LAB_JOB_HEARTBEAT_SECONDS, LAB_JOB_MAX_ATTEMPTS
+)
+from core.metrics import metrics
+from datastorage.database.base import async_session_maker
+from datastorage.database.models import LabJob
+from entities.lab_job.enums import LabJobStatus
+
+logger = logging.getLogger(__name__)
+
+# Обработчик задачи: (payload, user_id) -> результат для сохранения
+LabJobHandler = Callable[[Dict[str, Any], str], Awaitable[Dict[str, Any]]]
+
+
+class LabJobFailed(Exception):
+    """Ошибка задачи в виде, который сохраняется и отдаётся клиенту"""
+
+    def __init__(self, error: Dict[str, Any]):
+        super().__init__(error.get("detail"))
+        self.error = error
+
+
+class LabJobQueue:
+    """
+    Очередь фоновых задач лаборатории
+
+    Задачи хранятся в таблице lab_job, поэтому статус и результат
+    доступны любому процессу приложения. Ограниченный пул воркеров
+    забирает задачи через SELECT ... FOR UPDATE SKIP LOCKED: одну задачу
+    выполняет ровно один воркер, даже если процессов несколько.
+    Пока обработчик работает, воркер раз в heartbeat_seconds обновляет
+    heartbeat_at. Задачи без отметки дольше stale_seconds (процесс упал)
+    забираются повторно, после max_attempts запусков - завершаются
+    ошибкой, чтобы задача не перезапускалась бесконечно.
+
+    Сессия БД берётся только на короткие шаги: захват задачи, отметка
+    и запись результата. Обработчик открывает свою сессию сам.
+    """
+
+    def __init__(
+            self,
+            workers: int = 4,
+            poll_seconds: float = 2,
+            stale_seconds: float = 600,
+            heartbeat_seconds: float = 60,
+            max_attempts: int = 3
+    ):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.stale_seconds = stale_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_attempts = max_attempts
+        self._handlers: Dict[str, LabJobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def register(self, job_type: str, handler: LabJobHandler) -> None:
+        """Регистрация обработчика типа задачи"""
+        self._handlers[job_type] = handler
+
+    @property
+    def job_types(self) -> List[str]:
+        return list(self._handlers)
+
+    async def submit(
+            self,
+            session: AsyncSession,
+            job_type: str,
+            payload: Dict[str, Any],
+            user_id: str
+    ) -> LabJob:
+        """Постановка задачи в очередь"""
+        if job_type not in self._handlers:
+            raise ValueError(f"Неизвестный тип задачи: {job_type}")
+
+        job = LabJob(job_type=job_type, payload=payload, user_id=user_id)
+        session.add(job)
+        await session.commit()
+        metrics.increment('lab_jobs.submitted')
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    @staticmethod
+    async def get(session: AsyncSession, job_id: str) -> Optional[LabJob]:
+        """Задача по id"""
+        return await session.get(LabJob, job_id)
+
+    def start(self) -> None:
+        """Запуск воркеров"""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(number))
+            for number in range(self.workers)
+        ]
+        logger.info(f"Запущено воркеров задач лаборатории: {self.workers}")
+
+    async def close(self) -> None:
+        """Остановка воркеров. Прерванные задачи заберут повторно
+        после stale_seconds"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+
+    async def _worker(self, number: int) -> None:
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Ошибка получения задачи лаборатории: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=self.poll_seconds
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._execute(job)
+            except Exception as e:
+                # Воркер не должен останавливаться из-за сбоя записи
+                # результата: задачу заберут повторно после stale_seconds
+                # без отметок
+                logger.error(
+                    f"Ошибка выполнения задачи лаборатории {job['id']}: {e}"
+                )
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.now()
+        stale = now - timedelta(seconds=self.stale_seconds)
+        async with async_session_maker() as session:
+            # Зависшие задачи, исчерпавшие запуски, больше не забираются
+            abandoned = await session.execute(
+                update(LabJob)
+                .where(
+                    LabJob.status == LabJobStatus.RUNNING.value,
+                    func.coalesce(LabJob.heartbeat_at, LabJob.started_at)
+                    < stale,
+                    LabJob.attempts >= self.max_attempts,
+                )
+                .values(
+                    status=LabJobStatus.FAILED.value,
+                    error={
+                        "status_code": 500,
+                        "detail": (
+                            f"Исчерпано число запусков задачи: "
+                            f"{self.max_attempts}"
+                        ),
+                    },
+                    finished_at=now,
+                )
+            )
+            if abandoned.rowcount:
+                metrics.increment('lab_jobs.abandoned', abandoned.rowcount)
+
+            row = (await session.execute(
+                text("""
+                    UPDATE public.lab_job
+                    SET status = :running,
+                        started_at = :now,
+                        heartbeat_at = :now,
+                        attempts = attempts + 1
+                    WHERE id = (
+                        SELECT id FROM public.lab_job
+                        WHERE status = :queued
+                           OR (status = :running
+                               AND COALESCE(heartbeat_at, started_at) < :stale)
+                        ORDER BY created_at
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, job_type, payload, user_id, created_at,
+                              started_at, attempts
+                """).columns(
+                    id=String, job_type=String, payload=JSON,
+                    user_id=String, created_at=DateTime,
+                    started_at=DateTime, attempts=Integer,
+                ),
+                {
+                    'running': LabJobStatus.RUNNING.value,
+                    'queued': LabJobStatus.QUEUED.value,
+                    'now': now,
+                    'stale': stale,
+                },
+            )).mappings().first()
+            await session.commit()
+        if row and row['attempts'] > 1:
+            metrics.increment('lab_jobs.retried')
+        return dict(row) if row else None
+
+    async def _heartbeat(self, job: Dict[str, Any]) -> None:
+        """Отметка о том, что запуск задачи ещё работает"""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                async with async_session_maker() as session:
+                    await session.execute(
+                        update(LabJob)
+                        .where(
+                            LabJob.id == job['id'],
+                            LabJob.status == LabJobStatus.RUNNING.value,
+                            LabJob.started_at == job['started_at'],
+                        )
+                        .values(heartbeat_at=datetime.now())
+                    )
+                    await session.commit()
+            except Exception as e:
+                logger.warning(
+                    f"Не удалось отметить задачу лаборатории {job['id']}: {e}"
+                )
+
+    async def _execute(self, job: Dict[str, Any]) -> None:
+        metrics.increment(
+            'lab_jobs.wait_ms',
+            int((datetime.now() - job['created_at']).total_seconds() * 1000)
+        )
+        handler = self._handlers.get(job['job_type'])
+        result, error = None, None
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            if handler is None:
+                raise ValueError(f"Неизвестный тип задачи: {job['job_type']}")
+            result = await handler(job['payload'], job['user_id'])
+            status = LabJobStatus.DONE
+            metrics.increment('lab_jobs.done')
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status = LabJobStatus.FAILED
+            error = (
+                e.error if isinstance(e, LabJobFailed)
+                else {"status_code": 500, "detail": str(e)}
+            )
+            metrics.increment('lab_jobs.failed')
+            logger.warning(f"Задача лаборатории {job['id']} завершилась ошибкой: {e}")
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+        # Результат пишет только тот запуск, который владеет задачей:
+        # если задачу забрали повторно как зависшую, медленный первый
+        # запуск не перезапишет её
+        async with async_session_maker() as session:
+            updated = await session.execute(
+                update(LabJob)
+                .where(
+                    LabJob.id == job['id'],
+                    LabJob.status == LabJobStatus.RUNNING.value,
+                    LabJob.started_at == job['started_at'],
+                )
+                .values(
+                    status=status.value,
+                    result=result,
+                    error=error,
+                    finished_at=datetime.now(),
+                )
+            )
+            await session.commit()
+
+        if not updated.rowcount:
+            metrics.increment('lab_jobs.superseded')
+            logger.warning(
+                f"Результат задачи лаборатории {job['id']} не сохранён: "
+                f"задача уже забрана повторно"
+            )
+
+
+lab_job_queue = LabJobQueue(
+    workers=LAB_JOB_WORKERS,
+    poll_seconds=LAB_JOB_POLL_SECONDS,
+    stale_seconds=LAB_JOB_STALE_SECONDS,
+    heartbeat_seconds=LAB_JOB_HEARTBEAT_SECONDS,
+    max_attempts=LAB_JOB_MAX_ATTEMPTS,
+)
@@ -1,9 +1,17 @@
+import asyncio
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
-from .llm_service import LLMService, ThinkingDirection
+from core.config import LLM_MAP_REDUCE_CONCURRENCY
+from core.metrics import metrics
+from .context_packer import (
+    PackingCandidate, chunk_solutions, pack_solutions, solution_cost
+)
+from .llm_service import LLMService, ThinkingDirection, llm_token_stream
 from .preprocessing_service import PreprocessingService
 from .rate_limiting_service import RateLimitingService
+from .response_cache import get_llm_response_cache
+from .solution_text_cache import get_solution_text_cache
 from .token_calculator_service import TokenCalculatorService
 from ..adapters.data_adapter import DataAdapter
 
@@ -29,6 +37,7 @@ class LaboratoryService:
         self.preprocessing = preprocessing_service
         self.rate_limiter = rate_limiting_service
         self.token_calc = token_calculator
+        self.text_cache = get_solution_text_cache()
 
     # === Работа с направлениями мысли ===
 
@@ -59,14 +68,148 @@ class LaboratoryService:
         if len(existing_solutions) < 3:
             raise ValueError("Недостаточно решений для генерации направлений")
 
+        chunks = await self._chunk_solutions_for_directions(
+            challenge, existing_solutions
+        )
+
         # Генерируем направления через LLM
+        await self.data_adapter.release_connection()
         async with self.llm_service:
-            directions = await self.llm_service.generate_thinking_directions(
-                challenge, existing_solutions, preferred_provider="together"
-            )
+            if len(chunks) <= 1:
+                directions = await self.llm_service.generate_thinking_directions(
+                    challenge, chunks[0] if chunks else [],
+                    preferred_provider="together"
+                )
+            else:
+                directions = await self._map_reduce_directions(
+                    challenge, chunks, preferred_provider="together"
+                )
 
         return directions
 
+    async def _chunk_solutions_for_directions(
+            self,
+            challenge,
+            solutions: List
+    ) -> List[List]:
+        """
+        Части решений для map-reduce направлений мысли
+
+        Если все решения влезают в контекст - одна часть. Иначе решения
+        группируются по категории из предобработки (похожие подходы
+        попадают в одну часть) и режутся по бюджету токенов.
+        Без провайдеров (mock режим) лимитов контекста нет - одна часть
+        """
+        if not self.llm_service.providers:
+            return [solutions]
+
+        provider = self.llm_service.providers[0]
+        system_prompt, base_prompt = self.llm_service.get_directions_prompts(
+            challenge, []
+        )
+        solution_tokens = [
+            self.text_cache.count_tokens(sol.current_content)
+            for sol in solutions
+        ]
+        fit_info = self.token_calc.calculate_max_solutions_fit(
+            provider=provider,
+            system_prompt=system_prompt,
+            base_prompt=base_prompt,
+            solution_texts=[],
+            solution_tokens=solution_tokens,
+            min_response_tokens=2000
+        )
+
+        if "error" in fit_info:
+            raise ValueError(
+                "Базовый контекст не влезает в лимиты провайдера. "
+                f"Детали: {fit_info['error']}"
+            )
+
+        budget_tokens = fit_info["available_for_solutions"]
+        if sum(solution_cost(t) for t in solution_tokens) <= budget_tokens:
+            return [solutions]
+
+        preprocessings = await self.data_adapter.get_preprocessings(
+            [sol.id for sol in solutions]
+        )
+        ordered = sorted(
+            zip(solutions, solution_tokens),
+            key=lambda item: (
+                item[0].id not in preprocessings,
+                preprocessings[item[0].id].category
+                if item[0].id in preprocessings else "",
+            )
+        )
+
+        candidates = []
+        for sol, tokens in ordered:
+            prep = preprocessings.get(sol.id)
+            summary = prep.key_points if prep and prep.key_points else None
+            candidates.append(PackingCandidate(
+                id=sol.id,
+                user_id=sol.user_id,
+                content=sol.current_content,
+                tokens=tokens,
+                summary=summary,
+                summary_tokens=(
+                    self.text_cache.count_tokens(summary) if summary else 0
+                ),
+            ))
+
+        return chunk_solutions(candidates, budget_tokens)
+
+    async def _map_reduce_directions(
+            self,
+            challenge,
+            chunks: List[List],
+            preferred_provider: Optional[str] = None
+    ) -> List[ThinkingDirection]:
+        """
+        Направления мысли для большого числа решений
+
+        map: направления по каждой части, не больше
+        LLM_MAP_REDUCE_CONCURRENCY запросов одновременно;
+        reduce: один запрос сводит частичные направления.
+        Упавшие части пропускаются, если есть хотя бы одна успешная
+        """
+        semaphore = asyncio.Semaphore(LLM_MAP_REDUCE_CONCURRENCY)
+
+        async def map_chunk(chunk: List) -> List[ThinkingDirection]:
+            # Частичные ответы клиенту не транслируются - в поток
+            # попадает только итоговая свёртка
+            llm_token_stream.set(None)
+            async with semaphore:
+                return await self.llm_service.generate_thinking_directions(
+                    challenge, chunk, preferred_provider=preferred_provider
+                )
+
+        metrics.increment('directions_map_reduce.calls')
+        metrics.increment('directions_map_reduce.chunks', len(chunks))
+        results = await asyncio.gather(
+            *(map_chunk(chunk) for chunk in chunks),
+            return_exceptions=True
+        )
+
+        errors = [r for r in results if isinstance(r, Exception)]
+        partial_directions = [
+            r for r in results if not isinstance(r, BaseException) and r
+        ]
+        if errors:
+            metrics.increment('directions_map_reduce.failed_chunks', len(errors))
+            if not partial_directions:
+                raise errors[0]
+
+        if len(partial_directions) <= 1:
+            return partial_directions[0] if partial_directions else []
+
+        return await self.llm_service.merge_thinking_directions(
+            challenge,
+            partial_directions,
+            solution_ids=[sol.id for chunk in chunks for sol in chunk],
+            preferred_provider=preferred_provider
+        )
+
     # === Запросы к коллективному интеллекту ===
 
     async def request_collective_ideas(
@@ -100,6 +243,7 @@ class LaboratoryService:
         )
 
         # Генерируем идеи через LLM
+        await self.data_adapter.release_connection()
         async with self.llm_service:
             ideas = await self.llm_service.generate_collective_ideas(
                 solution, selected_solutions, max_ideas
@@ -183,6 +327,7 @@ class LaboratoryService:
         )
 
         # Генерируем предложения через LLM
+        await self.data_adapter.release_connection()
         async with self.llm_service:
             suggestions = await self.llm_service.generate_improvement_suggestions(
                 solution, selected_solutions, max_suggestions
@@ -249,6 +394,7 @@ class LaboratoryService:
         )
 
         # Генерируем критику через LLM
+        await self.data_adapter.release_connection()
         async with self.llm_service:
             criticisms = await self.llm_service.generate_solution_criticism(
                 solution, selected_solutions, max_criticisms
@@ -304,18 +450,31 @@ class LaboratoryService:
 
         Стратегия:
         - Рассчитываем сколько решений влезет в контекст
-        - Применяем дивергентный RAG для максимального разнообразия
+        - Если влезают не все, упаковываем бюджет: решения в порядке
+          разнообразия (MMR), крупные не обрывают отбор, вместо
+          не поместившихся полных текстов - ключевые тезисы
         """
         n = len(all_solutions)
 
+        # Без провайдеров (mock режим) лимитов контекста нет
+        if not self.llm_service.providers:
+            return all_solutions
+
         provider = self.llm_service.providers[0]
 
         # Базовые промпты для расчёта (примерные)
         system_prompt = self._get_system_prompt_for_type(request_type)
         base_prompt = self._get_base_prompt_for_type(request_type, target_solution)
 
-        # Форматируем тексты решений
-        solution_texts = [sol.current_content for sol in all_solutions]
+        # Очищенные тексты решений и их размер - те же, что попадут в промпт
+        solution_texts = [
+            self.text_cache.clean_text(sol.current_content)
+            for sol in all_solutions
+        ]
+        solution_tokens = [
+            self.text_cache.count_tokens(sol.current_content)
+            for sol in all_solutions
+        ]
 
         # Рассчитываем сколько решений влезет
         fit_info = self.token_calc.calculate_max_solutions_fit(
@@ -323,28 +482,58 @@ class LaboratoryService:
             system_prompt=system_prompt,
             base_prompt=base_prompt,
             solution_texts=solution_texts,
+            solution_tokens=solution_tokens,
             min_response_tokens=2000
         )
 
-        max_solutions = fit_info["max_solutions_count"]
-
-        if max_solutions == 0:
+        if "error" in fit_info:
             raise ValueError(
                 "Базовый контекст не влезает в лимиты провайдера. "
-                f"Детали: {fit_info.get('error', 'Unknown error')}"
+                f"Детали: {fit_info['error']}"
             )
 
-        # Применяем дивергентный RAG если решений больше чем влезает
-        if n <= max_solutions:
+        # Все решения влезают целиком - отбор не нужен. Сумма, а не
+        # max_solutions_count: тот обрывается на первом крупном решении
+        budget_tokens = fit_info["available_for_solutions"]
+        if sum(solution_cost(t) for t in solution_tokens) <= budget_tokens:
             return all_solutions
 
-        # Дивергентный отбор: максимально различающиеся решения
-        diverse_solutions = await self.preprocessing.find_diverse_solutions(
-            all_solutions=all_solutions,
-            target_count=max_solutions
+        # Упаковка по бюджету: полные тексты самых разнообразных решений,
+        # для остальных - ключевые тезисы, пока есть место
+        solution_ids = [sol.id for sol in all_solutions]
+        preprocessings = await self.data_adapter.get_preprocessings(
+            solution_ids
+        )
+        priority = await self.preprocessing.rank_by_diversity(
+            solution_ids, preprocessings
+        )
+
+        candidates = []
+        for sol, tokens in zip(all_solutions, solution_tokens):
+            prep = preprocessings.get(sol.id)
+            summary = prep.key_points if prep and prep.key_points else None
+            candidates.append(PackingCandidate(
+                id=sol.id,
+                user_id=sol.user_id,
+                content=sol.current_content,
+                tokens=tokens,
+                summary=summary,
+                summary_tokens=(
+                    self.text_cache.count_tokens(summary) if summary else 0
+                ),
+            ))
+
+        packing = pack_solutions(
+            candidates,
+            budget_tokens=budget_tokens,
+            priority=priority
         )
+        metrics.increment('context_packing.calls')
+        metrics.increment('context_packing.candidates', n)
+        metrics.increment('context_packing.full', packing.full_count)
+        metrics.increment('context_packing.summary', packing.summary_count)
 
-        return diverse_solutions
+        return packing.solutions
 
     @staticmethod
     def _get_system_prompt_for_type(request_type: str) -> str:
@@ -442,6 +631,7 @@ class LaboratoryService:
             raise ValueError("Решение не найдено")
 
         # Генерируем интегрированную версию через LLM
+        await self.data_adapter.release_connection()
         async with self.llm_service:
             integrated_text = await self.llm_service.integrate_accepted_items(
                 solution, accepted_items, user_modifications
@@ -465,6 +655,8 @@ class LaboratoryService:
             influenced_by_interactions=influenced_by_interactions
         )
         await self.data_adapter.session.commit()
+        if success:
+            await get_llm_response_cache().invalidate_solution(solution_id)
 
         return success
 
@@ -0,0 +1,74 @@
+from collections import defaultdict, deque
+from threading import Lock
+from typing import Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+from llm.models.lab import LLMProvider
+
+
+class LatencyTracker:
+    """
+    Скользящее окно задержек ответов по (провайдер, модель)
+
+    Используется для бюджета хеджирования запросов и порядка
+    провайдеров: перцентиль задержки показывает, когда ответа уже
+    стоит не ждать. Если указан тип задачи, задержка учитывается
+    ещё и отдельно для него - длина ответа у задач разная.
+    """
+
+    def __init__(self, window: int = 50, min_samples: int = 5):
+        self.window = window
+        self.min_samples = min_samples
+        self._latencies: Dict[Tuple[str, ...], Deque[float]] = defaultdict(
+            lambda: deque(maxlen=self.window)
+        )
+        self._lock = Lock()
+
+    def record(
+            self,
+            provider: LLMProvider,
+            latency_seconds: float,
+            task_type: Optional[str] = None
+    ) -> None:
+        """Учёт задержки ответа провайдера"""
+        with self._lock:
+            self._latencies[(provider.name, provider.model)].append(
+                latency_seconds
+            )
+            if task_type:
+                self._latencies[
+                    (provider.name, provider.model, task_type)
+                ].append(latency_seconds)
+
+    def percentile(
+            self,
+            provider: LLMProvider,
+            q: float,
+            task_type: Optional[str] = None
+    ) -> Optional[float]:
+        """
+        Перцентиль задержки в секундах, None если данных мало
+
+        Для типа задачи с недостаточным числом наблюдений
+        берутся все задержки провайдера.
+        """
+        key = (provider.name, provider.model)
+        with self._lock:
+            latencies = list(self._latencies.get(key + (task_type,), ()))
+            if len(latencies) < self.min_samples:
+                latencies = list(self._latencies.get(key, ()))
+        if len(latencies) < self.min_samples:
+            return None
+        return float(np.percentile(latencies, q * 100))
+
+
+_latency_tracker_instance: Optional[LatencyTracker] = None
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """Получение singleton instance трекера задержек"""
+    global _latency_tracker_instance
+    if _latency_tracker_instance is None:
+        _latency_tracker_instance = LatencyTracker()
+    return _latency_tracker_instance
@@ -1,48 +1,34 @@
+import asyncio
 import json
-from typing import List, Dict, Any, Optional
+import time
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, Tuple
 import aiohttp
 
+from core.metrics import metrics
 from datastorage.database.models import Challenge, Solution
-from .text_optimizer import TextOptimizer
+from llm.providers import get_hedging_policy
+from .http_client import llm_http_client
+from .latency_tracker import get_latency_tracker
+from .provider_router import get_provider_router
+from .response_cache import get_llm_response_cache
+from .solution_text_cache import get_solution_text_cache
 from .token_calculator_service import get_token_calculator
 from llm.models.lab import (
     LLMProvider, ThinkingDirection, ImprovementSuggestion,
-    CriticismPoint, CollectiveIdea
+    CriticismPoint, CollectiveIdea, HedgingPolicy
 )
 
 
-class LLMService:
-
-    def __init__(self, providers: List[LLMProvider]):
-        self.providers = sorted(providers, key=lambda x: x.priority)
-        self.session: Optional[aiohttp.ClientSession] = None
-        self.token_calc = get_token_calculator()
-        self._text_optimizer = TextOptimizer()
-
-        self.groq_requests_count = 0
-        self.groq_last_reset = None
-
-    async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
-        return self
-
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
-
-    async def generate_thinking_directions(
-            self,
-            challenge: Challenge,
-            existing_solutions: List[Solution],
-            max_directions: int = 5,
-            preferred_provider: str = None
-    ) -> List[ThinkingDirection]:
-        """Генерация направлений мысли"""
+# Очередь событий (event, data) для потоковой передачи ответа клиенту.
+# Пока она задана, OpenAI-совместимые провайдеры вызываются в режиме
+# stream и каждый фрагмент текста сразу отправляется в очередь
+llm_token_stream: ContextVar[Optional[asyncio.Queue]] = ContextVar(
+    "llm_token_stream", default=None
+)
 
-        if len(existing_solutions) < 3:
-            return []
 
-        system_prompt = """Ты голос коллективного интеллекта. Анализируй решения по СУТИ, выделяй общие подходы группы.
+DIRECTIONS_SYSTEM_PROMPT = """Ты голос коллективного интеллекта. Анализируй решения по СУТИ, выделяй общие подходы группы.
 
             КРИТИЧЕСКИЕ ТРЕБОВАНИЯ:
             1. Включай ТОЛЬКО подходы с 2+ участниками (participants_count > 1)
@@ -68,6 +54,77 @@ class LLMService:
               ]
             }"""
 
+
+class ProviderHTTPError(Exception):
+    """Ошибочный HTTP ответ провайдера LLM"""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+class LLMService:
+
+    def __init__(
+            self,
+            providers: List[LLMProvider],
+            session: Optional[aiohttp.ClientSession] = None
+    ):
+        self.providers = sorted(providers, key=lambda x: x.priority)
+        self._session = session
+        self.token_calc = get_token_calculator()
+        self.response_cache = get_llm_response_cache()
+        self.latency_tracker = get_latency_tracker()
+        self.router = get_provider_router()
+        self.text_cache = get_solution_text_cache()
+
+        self.groq_requests_count = 0
+        self.groq_last_reset = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """HTTP сессия: переданная явно или общий пул приложения"""
+        return self._session or llm_http_client.session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        # Сессия принадлежит общему пулу и закрывается при остановке
+        # приложения
+        pass
+
+    async def generate_thinking_directions(
+            self,
+            challenge: Challenge,
+            existing_solutions: List[Solution],
+            max_directions: int = 5,
+            preferred_provider: str = None
+    ) -> List[ThinkingDirection]:
+        """Генерация направлений мысли"""
+
+        if len(existing_solutions) < 3:
+            return []
+
+        system_prompt, prompt = self.get_directions_prompts(
+            challenge, existing_solutions, max_directions
+        )
+
+        provider_name = preferred_provider or "together"
+        response = await self._make_llm_request(
+            prompt, system_prompt, "json", provider_name,
+            solution_ids=[solution.id for solution in existing_solutions],
+            task_type="directions"
+        )
+        return self._parse_directions_response(response)
+
+    def get_directions_prompts(
+            self,
+            challenge: Challenge,
+            existing_solutions: List[Solution],
+            max_directions: int = 5
+    ) -> Tuple[str, str]:
+        """Системный промпт и промпт для генерации направлений мысли"""
         solutions_text = self._format_solutions_for_analysis(existing_solutions)
 
         prompt = f"""ЗАДАЧА: {challenge.title}
@@ -84,11 +141,182 @@ class LLMService:
             
             Шаблон должен быть ОСНОВОЙ для развития, не готовым текстом."""
 
-        provider_name = preferred_provider or "together"
-        response = await self._make_llm_request(
-            prompt, system_prompt, "json", provider_name
+        return DIRECTIONS_SYSTEM_PROMPT, prompt
+
+    async def merge_thinking_directions(
+            self,
+            challenge: Challenge,
+            partial_directions: List[List[ThinkingDirection]],
+            solution_ids: List[str],
+            max_directions: int = 5,
+            preferred_provider: str = None
+    ) -> List[ThinkingDirection]:
+        """
+        Свёртка направлений, найденных по частям решений (reduce)
+
+        Одинаковые подходы из разных частей объединяются, число
+        участников суммируется. Если направления всех частей не влезают
+        в контекст, свёртка идёт по уровням: сначала пачки частей,
+        затем их итоги. Чтобы любые две части влезали в один запрос,
+        шаблоны слишком больших частей укорачиваются
+        """
+        system_prompt = DIRECTIONS_SYSTEM_PROMPT
+        fit_info = self.token_calc.calculate_max_solutions_fit(
+            provider=self.providers[0],
+            system_prompt=system_prompt,
+            base_prompt=self._get_merge_directions_prompt(
+                challenge, [], max_directions
+            ),
+            solution_texts=[],
+            solution_tokens=[],
+            min_response_tokens=2000
         )
-        return self._parse_directions_response(response)
+        if "error" in fit_info:
+            raise ValueError(
+                "Базовый контекст не влезает в лимиты провайдера. "
+                f"Детали: {fit_info['error']}"
+            )
+        budget_tokens = fit_info["available_for_solutions"]
+
+        groups = [
+            self._shrink_directions_group(
+                [direction.model_dump() for direction in directions],
+                budget_tokens // 2
+            )
+            for directions in partial_directions
+        ]
+        batches = self._batch_directions_groups(groups, budget_tokens)
+
+        # Если пачками число частей не сокращается (части не ужались
+        # даже без шаблонов) - один запрос по всем частям
+        if len(batches) == 1 or len(batches) == len(groups):
+            prompt = self._get_merge_directions_prompt(
+                challenge, groups, max_directions
+            )
+            provider_name = preferred_provider or "together"
+            response = await self._make_llm_request(
+                prompt, system_prompt, "json", provider_name,
+                solution_ids=solution_ids,
+                task_type="directions"
+            )
+            return self._parse_directions_response(response)
+
+        async def merge_batch(batch: List[List[Dict[str, Any]]]):
+            # Промежуточные свёртки клиенту не транслируются
+            llm_token_stream.set(None)
+            return await self.merge_thinking_directions(
+                challenge,
+                [
+                    [ThinkingDirection(**direction) for direction in group]
+                    for group in batch
+                ],
+                solution_ids,
+                max_directions=max_directions,
+                preferred_provider=preferred_provider
+            )
+
+        metrics.increment('directions_map_reduce.reduce_batches', len(batches))
+        merged = await asyncio.gather(
+            *(merge_batch(batch) for batch in batches)
+        )
+        merged = [directions for directions in merged if directions]
+        if len(merged) <= 1:
+            return merged[0] if merged else []
+
+        return await self.merge_thinking_directions(
+            challenge, merged, solution_ids,
+            max_directions=max_directions,
+            preferred_provider=preferred_provider
+        )
+
+    @staticmethod
+    def _get_merge_directions_prompt(
+            challenge: Challenge,
+            groups: List[List[Dict[str, Any]]],
+            max_directions: int
+    ) -> str:
+        """Промпт свёртки частичных направлений мысли"""
+        numbered_groups = [
+            {"group": number, "directions": directions}
+            for number, directions in enumerate(groups, 1)
+        ]
+
+        return f"""ЗАДАЧА: {challenge.title}
+            ОПИСАНИЕ: {challenge.description}
+            
+            Решения участников разбиты на группы, для каждой группы уже
+            выделены подходы:
+            {json.dumps(numbered_groups, ensure_ascii=False)}
+            
+            Сведи их в {max_directions} основных подходов по всем решениям:
+            1. Объедини одинаковые по сути подходы из разных групп,
+               participants_count - сумма по объединённым подходам
+            2. Подходы с 2+ участниками после объединения тоже включай
+            3. Объедини шаблоны initial_solution_text, сохрани незавершенные разделы
+            4. Оставь самые показательные цитаты-примеры"""
+
+    def _directions_group_tokens(
+            self,
+            directions: List[Dict[str, Any]]
+    ) -> int:
+        """Размер направлений одной части в промпте свёртки"""
+        return self.token_calc.count_tokens(
+            json.dumps({"group": 0, "directions": directions},
+                       ensure_ascii=False)
+        )
+
+    def _shrink_directions_group(
+            self,
+            directions: List[Dict[str, Any]],
+            max_tokens: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Укорачивание шаблонов и цитат направлений до max_tokens
+
+        Названия, описания и число участников - то, по чему подходы
+        объединяются, - не трогаются
+        """
+        tokens = self._directions_group_tokens(directions)
+        if tokens <= max_tokens:
+            return directions
+
+        ratio = max_tokens / tokens * 0.9
+        shrunk = []
+        for direction in directions:
+            template = direction["initial_solution_text"]
+            shrunk.append({
+                **direction,
+                "initial_solution_text": template[:int(len(template) * ratio)],
+                "example_excerpts": [
+                    excerpt[:int(len(excerpt) * ratio)]
+                    for excerpt in direction["example_excerpts"][:2]
+                ],
+            })
+
+        if self._directions_group_tokens(shrunk) > max_tokens:
+            shrunk = [
+                {**direction, "initial_solution_text": "",
+                 "example_excerpts": []}
+                for direction in shrunk
+            ]
+        return shrunk
+
+    def _batch_directions_groups(
+            self,
+            groups: List[List[Dict[str, Any]]],
+            budget_tokens: int
+    ) -> List[List[List[Dict[str, Any]]]]:
+        """Пачки частей подряд, каждая влезает в бюджет свёртки"""
+        batches = [[]]
+        used = 0
+        for group in groups:
+            tokens = self._directions_group_tokens(group)
+            if batches[-1] and used + tokens > budget_tokens:
+                batches.append([])
+                used = 0
+            batches[-1].append(group)
+            used += tokens
+        return batches
 
     async def generate_collective_ideas(
             self,
@@ -150,7 +378,11 @@ class LLMService:
 
         provider_name = preferred_provider or "together"
         response = await self._make_llm_request(
-            prompt, system_prompt, "json", provider_name
+            prompt, system_prompt, "json", provider_name,
+            solution_ids=self._get_solution_ids(
+                target_solution, other_solutions
+            ),
+            task_type="ideas"
         )
         return self._parse_ideas_response(response)
 
@@ -211,7 +443,11 @@ class LLMService:
 
         provider_name = preferred_provider or "together"
         response = await self._make_llm_request(
-            prompt, system_prompt, "json", provider_name
+            prompt, system_prompt, "json", provider_name,
+            solution_ids=self._get_solution_ids(
+                target_solution, other_solutions
+            ),
+            task_type="improvements"
         )
         return self._parse_suggestions_response(response)
 
@@ -267,7 +503,11 @@ class LLMService:
 
         provider_name = preferred_provider or "together"
         response = await self._make_llm_request(
-            prompt, system_prompt, "json", provider_name
+            prompt, system_prompt, "json", provider_name,
+            solution_ids=self._get_solution_ids(
+                target_solution, other_solutions
+            ),
+            task_type="criticism"
         )
         return self._parse_criticism_response(response)
 
@@ -310,7 +550,9 @@ class LLMService:
             ЦЕЛЬ: То же решение, но улучшенное. Узнаваемый оригинал + точечные улучшения."""
 
         response = await self._make_llm_request(
-            prompt, system_prompt, "text", "together"
+            prompt, system_prompt, "text", "together",
+            solution_ids=[current_solution.id],
+            task_type="integration"
         )
         return response.get("text", "")
 
@@ -321,36 +563,194 @@ class LLMService:
             prompt: str,
             system_prompt: str = "",
             response_format: str = "text",
-            preferred_provider: str = None
+            preferred_provider: str = None,
+            solution_ids: Optional[List[str]] = None,
+            task_type: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Выполнение запроса к LLM с fallback"""
-
-        if not self.session:
-            self.session = aiohttp.ClientSession()
+        """Выполнение запроса к LLM с fallback, хеджированием
+        и кешем ответов"""
 
-        if preferred_provider:
-            providers = sorted(
-                self.providers, key=lambda x: x.name == preferred_provider
+        cache_keys = [
+            self.response_cache.build_key(
+                provider, prompt, system_prompt, response_format
+            )
+            for provider in self.providers
+        ]
+        cached_response = await self.response_cache.get_first(cache_keys)
+        if cached_response is not None:
+            return cached_response
+
+        providers = self.router.order(
+            self.providers, task_type, preferred_provider
+        )
+        policy = get_hedging_policy(task_type)
+        # При потоковой передаче хеджирование отключено: фрагменты
+        # ответов двух провайдеров перемешались бы у клиента
+        streaming = llm_token_stream.get() is not None
+        if policy.enabled and len(providers) > 1 and not streaming:
+            provider, response, latency_ms = await self._make_hedged_request(
+                providers, prompt, system_prompt, response_format, policy,
+                task_type
             )
         else:
-            providers = list(self.providers)
+            provider, response, latency_ms = (
+                await self._make_sequential_request(
+                    providers, prompt, system_prompt, response_format,
+                    task_type
+                )
+            )
+
+        await self.response_cache.set(
+            key=self.response_cache.build_key(
+                provider, prompt, system_prompt, response_format
+            ),
+            provider=provider,
+            response=response,
+            latency_ms=latency_ms,
+            solution_ids=solution_ids or [],
+        )
+        return response
+
+    async def _make_sequential_request(
+            self,
+            providers: List[LLMProvider],
+            prompt: str,
+            system_prompt: str,
+            response_format: str,
+            task_type: Optional[str] = None
+    ) -> Tuple[LLMProvider, Dict[str, Any], float]:
+        """Провайдеры опрашиваются по очереди до первого ответа"""
 
         last_error = None
 
         for provider in providers:
             try:
-                response = await self._call_provider(
-                    provider, prompt, system_prompt, response_format
+                response, latency_ms = await self._call_provider_timed(
+                    provider, prompt, system_prompt, response_format,
+                    task_type
                 )
                 if response:
-                    return response
+                    return provider, response, latency_ms
             except Exception as e:
                 last_error = e
                 print(f"Provider {provider.name} model {provider.model} failed: {e}")
+                self._emit_stream_event("reset", {"provider": provider.name})
                 continue
 
         raise Exception(f"All LLM providers failed. Last error: {last_error}")
 
+    async def _make_hedged_request(
+            self,
+            providers: List[LLMProvider],
+            prompt: str,
+            system_prompt: str,
+            response_format: str,
+            policy: HedgingPolicy,
+            task_type: Optional[str] = None
+    ) -> Tuple[LLMProvider, Dict[str, Any], float]:
+        """
+        Запрос с хеджированием
+
+        Если провайдер не ответил за бюджет задержки (перцентиль его
+        наблюдаемых задержек) или ответил ошибкой, тот же запрос
+        отправляется следующему провайдеру. Берётся первый корректно
+        разобранный ответ, остальные запросы отменяются.
+        """
+
+        remaining = list(providers)
+        tasks: Dict[asyncio.Task, LLMProvider] = {}
+        fallback = None
+        last_error = None
+
+        def launch() -> LLMProvider:
+            next_provider = remaining.pop(0)
+            if tasks:
+                metrics.increment('llm_hedge.fired')
+            task = asyncio.create_task(self._call_provider_timed(
+                next_provider, prompt, system_prompt, response_format,
+                task_type
+            ))
+            tasks[task] = next_provider
+            return next_provider
+
+        current = launch()
+        try:
+            while tasks:
+                timeout = None
+                if remaining:
+                    timeout = policy.hedge_delay(
+                        self.latency_tracker.percentile(
+                            current, policy.percentile, task_type
+                        )
+                    )
+                done, _ = await asyncio.wait(
+                    tasks, timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    provider = tasks.pop(task)
+                    try:
+                        response, latency_ms = task.result()
+                    except Exception as e:
+                        last_error = e
+                        print(f"Provider {provider.name} model {provider.model} failed: {e}")
+                        continue
+                    if response and "error" not in response:
+                        if provider is not providers[0]:
+                            metrics.increment('llm_hedge.won')
+                        return provider, response, latency_ms
+                    if response and fallback is None:
+                        fallback = (provider, response, latency_ms)
+
+                if remaining and (not done or not tasks):
+                    current = launch()
+        finally:
+            # Время ожидания отменённого запроса - не задержка ответа
+            # провайдера, в перцентили оно не попадает
+            for task in tasks:
+                task.cancel()
+                metrics.increment('llm_hedge.cancelled')
+            # Задача, отменённая до первого шага, не доходит до
+            # обработчика отмены в _call_provider_timed: пробный запрос
+            # освобождается здесь, после завершения всех задач
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for provider in tasks.values():
+                self.router.release(provider)
+
+        if fallback:
+            return fallback
+
+        raise Exception(f"All LLM providers failed. Last error: {last_error}")
+
+    async def _call_provider_timed(
+            self,
+            provider: LLMProvider,
+            prompt: str,
+            system_prompt: str,
+            response_format: str,
+            task_type: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], float]:
+        """Вызов провайдера с учётом задержки ответа, мс, и исхода
+        запроса для маршрутизации"""
+
+        start_time = time.perf_counter()
+        try:
+            response = await self._call_provider(
+                provider, prompt, system_prompt, response_format
+            )
+        except asyncio.CancelledError:
+            self.router.release(provider)
+            raise
+        except Exception as e:
+            self.router.record_failure(
+                provider, rate_limited=getattr(e, "status", None) == 429
+            )
+            raise
+        latency = time.perf_counter() - start_time
+        self.latency_tracker.record(provider, latency, task_type)
+        self.router.record_success(provider)
+        return response, latency * 1000
+
     async def _call_provider(
             self,
             provider: LLMProvider,
@@ -393,6 +793,9 @@ class LLMService:
         }
         if response_format == "json":
             payload["response_format"] = {"type": "json_object"}
+        streaming = llm_token_stream.get() is not None
+        if streaming:
+            payload["stream"] = True
 
         headers = {
             "Authorization": f"Bearer {provider.api_key}",
@@ -403,16 +806,20 @@ class LLMService:
                 provider.api_url,
                 json=payload,
                 headers=headers,
-                timeout=provider.timeout
+                timeout=llm_http_client.request_timeout(provider.timeout)
         ) as response:
             if response.status == 200:
-                data = await response.json()
-                content = self._extract_text(data, provider.name)
+                if streaming:
+                    content = await self._read_stream(response, provider)
+                else:
+                    data = await response.json()
+                    content = self._extract_text(data, provider.name)
                 return self._parse_response(content, response_format)
             else:
                 error_text = await response.text()
-                raise Exception(
-                    f"{provider.name} API error {response.status}: {error_text}"
+                raise ProviderHTTPError(
+                    f"{provider.name} API error {response.status}: {error_text}",
+                    response.status
                 )
 
     async def _call_huggingface(
@@ -444,7 +851,7 @@ class LLMService:
                 provider.api_url,
                 json=payload,
                 headers=headers,
-                timeout=provider.timeout
+                timeout=llm_http_client.request_timeout(provider.timeout)
         ) as response:
             if response.status == 200:
                 data = await response.json()
@@ -457,9 +864,62 @@ class LLMService:
                 return self._parse_response(content, response_format)
             else:
                 error_text = await response.text()
-                raise Exception(
-                    f"Hugging Face API error {response.status}: {error_text}"
+                raise ProviderHTTPError(
+                    f"Hugging Face API error {response.status}: {error_text}",
+                    response.status
+                )
+
+    async def _read_stream(
+            self,
+            response: aiohttp.ClientResponse,
+            provider: LLMProvider
+    ) -> str:
+        """
+        Чтение ответа в режиме stream (server-sent events)
+
+        Фрагменты текста передаются клиенту по мере поступления,
+        полный текст собирается для разбора и сохранения. Строки,
+        которые не разбираются как JSON, пропускаются; ошибка,
+        пришедшая посреди потока, поднимается как ошибка провайдера.
+        """
+        parts = []
+        async for line in response.content:
+            line = line.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            try:
+                chunk = json.loads(data)
+            except json.JSONDecodeError:
+                metrics.increment('llm_stream.bad_chunks')
+                continue
+            if not isinstance(chunk, dict):
+                continue
+            if chunk.get("error"):
+                error = chunk["error"]
+                if not isinstance(error, dict):
+                    error = {"message": str(error)}
+                status = error.get("code")
+                raise ProviderHTTPError(
+                    f"{provider.name} stream error: "
+                    f"{error.get('message') or error}",
+                    status if isinstance(status, int) else 502
                 )
+            choices = chunk.get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                parts.append(delta)
+                self._emit_stream_event("token", {"text": delta})
+        return "".join(parts)
+
+    @staticmethod
+    def _emit_stream_event(event: str, data: Dict[str, Any]) -> None:
+        """Отправка события клиенту, если ответ передаётся потоком"""
+        queue = llm_token_stream.get()
+        if queue is not None:
+            queue.put_nowait((event, data))
 
     @staticmethod
     def _parse_response(content: str, response_format: str) -> Dict[str, Any]:
@@ -478,6 +938,23 @@ class LLMService:
         else:
             return {"text": content}
 
+    @staticmethod
+    def _get_solution_ids(
+            target_solution: Solution,
+            other_solutions: List[Solution]
+    ) -> List[str]:
+        """Решения, тексты которых входят в промпт"""
+        return [target_solution.id] + [
+            solution.id for solution in other_solutions
+        ]
+
+    @staticmethod
+    def _summary_mark(solution) -> str:
+        """Пометка решения, вместо полного текста которого даны тезисы"""
+        if getattr(solution, "is_summary", False):
+            return " [ключевые тезисы]"
+        return ""
+
     def _format_solutions_for_analysis(self, solutions: List[Solution]) -> str:
         """Форматирование решений для анализа с оптимизацией."""
         if not solutions:
@@ -485,10 +962,12 @@ class LLMService:
 
         formatted = []
         for i, solution in enumerate(solutions, 1):
-            content = self._text_optimizer.clean_and_optimize(solution.current_content)
+            content = self.text_cache.clean_text(solution.current_content)
+
+            summary = self._summary_mark(solution)
 
             formatted.append(f"""
-                РЕШЕНИЕ #{i} (Автор: {solution.user_id[:8]}):
+                РЕШЕНИЕ #{i} (Автор: {solution.user_id[:8]}){summary}:
                 {content}
                 ---""")
 
@@ -501,10 +980,12 @@ class LLMService:
 
         formatted = []
         for i, solution in enumerate(solutions, 1):
-            content = self._text_optimizer.clean_and_optimize(solution.current_content)
+            content = self.text_cache.clean_text(solution.current_content)
+
+            summary = self._summary_mark(solution)
 
             formatted.append(f"""
-                РЕШЕНИЕ #{i} (solution_id: {solution.id}):
+                РЕШЕНИЕ #{i} (solution_id: {solution.id}){summary}:
                 {content}
                 ===================""")
 
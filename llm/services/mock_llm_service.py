@@ -14,14 +14,14 @@ class MockLLMService(LLMService):
     """Mock версия LLM сервиса для отладки"""
 
     def __init__(self, providers: List[LLMProvider] = None):
-        self.providers = providers or []
-        self.session = None
+        super().__init__(providers or [])
 
     async def generate_thinking_directions(
             self,
             challenge: Challenge,
             existing_solutions: List[Solution],
-            max_directions: int = 5
+            max_directions: int = 5,
+            preferred_provider: str = None,
     ) -> List[ThinkingDirection]:
         """Mock направления мысли"""
         await asyncio.sleep(1.0)
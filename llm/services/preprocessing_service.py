@@ -1,9 +1,16 @@
+import asyncio
+import hashlib
 import json
+import multiprocessing
 import re
-from typing import Dict, Any, List, Tuple
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
 from collections import Counter
 import numpy as np
 
+from core.config import PREPROCESSING_WORKERS
 from datastorage.crud.datastorage import CRUDDataStorage
 from datastorage.crud.interfaces.list import Filter, Operation
 from datastorage.database.models import Solution, Challenge, SolutionPreprocessing
@@ -139,6 +146,107 @@ class PreprocessingService:
             "embedding_type": "transformer" if self.use_transformer_embeddings else "lightweight"
         }
 
+    async def preprocess_batch(
+            self,
+            challenge_id: Optional[str] = None,
+            community_id: Optional[str] = None,
+            force: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Предобработка всех новых и устаревших решений задачи или сообщества
+
+        Тезисы, категории и метрики считаются в пуле процессов.
+        Transformer embeddings - пакетом в основном процессе параллельно
+        с пулом, легковесные - в том же пуле. Результат записывается
+        одним INSERT ... ON CONFLICT.
+        force - обработать заново все решения.
+        """
+        if not challenge_id and not community_id:
+            raise ValueError("Нужно указать задачу или сообщество")
+
+        started = time.perf_counter()
+        processed_at = datetime.now()
+        solutions = await self.data_adapter.get_solutions_to_preprocess(
+            challenge_id=challenge_id,
+            community_id=community_id,
+            force=force
+        )
+        # На время вычислений соединение с БД не нужно
+        await self.data_adapter.release_connection()
+
+        texts = [solution['current_content'] for solution in solutions]
+        use_transformer = (
+            self.use_transformer_embeddings and self.embedding_service
+        )
+        compute_started = time.perf_counter()
+        if use_transformer:
+            # Модель в основном процессе, анализ текстов - в пуле процессов
+            analysis, embeddings = await asyncio.gather(
+                self._analyze_texts(texts),
+                asyncio.to_thread(
+                    self.embedding_service.generate_embeddings_batch, texts
+                ),
+            )
+        else:
+            analysis = await self._analyze_texts(texts, with_embeddings=True)
+            embeddings = [item[3] for item in analysis]
+        compute_seconds = time.perf_counter() - compute_started
+
+        rows = [
+            {
+                "solution_id": solution['id'],
+                "embedding": json.dumps(embedding),
+                "key_points": item[0],
+                "category": item[1],
+                "metrics": json.dumps(item[2]),
+            }
+            for solution, embedding, item in zip(solutions, embeddings, analysis)
+        ]
+        await self.data_adapter.upsert_preprocessings(rows, processed_at)
+
+        total_seconds = time.perf_counter() - started
+        return {
+            "processed": len(rows),
+            "embedding_type": "transformer" if use_transformer else "lightweight",
+            "compute_seconds": round(compute_seconds, 3),
+            "total_seconds": round(total_seconds, 3),
+            "solutions_per_second": (
+                round(len(rows) / total_seconds, 1) if total_seconds else 0.0
+            ),
+        }
+
+    async def _analyze_texts(
+            self,
+            texts: List[str],
+            with_embeddings: bool = False,
+            chunk_size: int = 64
+    ) -> List[Tuple]:
+        """Тезисы, категории, метрики (и легковесные embeddings):
+        частями в пуле процессов"""
+        chunks = [
+            texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)
+        ]
+        if PREPROCESSING_WORKERS <= 1 or len(chunks) <= 1:
+            return await asyncio.to_thread(
+                analyze_texts, texts, with_embeddings
+            )
+
+        # forkserver, а не fork: форк процесса веб-сервера копирует его
+        # потоки, блокировки и сокеты. Векторы от способа запуска не
+        # зависят - хеширование в embeddings детерминировано
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(
+                max_workers=min(PREPROCESSING_WORKERS, len(chunks)),
+                mp_context=multiprocessing.get_context("forkserver")
+        ) as pool:
+            results = await asyncio.gather(*(
+                loop.run_in_executor(
+                    pool, analyze_texts, chunk, with_embeddings
+                )
+                for chunk in chunks
+            ))
+        return [item for result in results for item in result]
+
     def _generate_improved_embedding(self, text: str, dim: int = 384) -> List[float]:
         """
         Легковесная генерация embedding (fallback)
@@ -167,7 +275,7 @@ class PreprocessingService:
             weight = tf * idf
 
             for i in range(3):
-                hash_val = (hash(word) + i * 12345) % dim
+                hash_val = (_stable_hash(word) + i * 12345) % dim
                 embedding[hash_val] += weight * 0.6
 
         # 2. Character n-grams компонента (25% весов)
@@ -181,13 +289,13 @@ class PreprocessingService:
         ngram_counts = Counter(ngrams)
         for ngram, count in ngram_counts.items():
             weight = count / len(ngrams) if ngrams else 0
-            hash_val = hash(ngram) % dim
+            hash_val = _stable_hash(ngram) % dim
             embedding[hash_val] += weight * 0.25
 
         # 3. Позиционный компонент (10% весов)
         for idx, word in enumerate(words[:50]):
             position_weight = 1.0 / (1 + idx * 0.02)
-            hash_val = hash(f"pos_{word}") % dim
+            hash_val = _stable_hash(f"pos_{word}") % dim
             embedding[hash_val] += position_weight * 0.1
 
         # 4. Семантические кластеры (5% весов)
@@ -196,7 +304,7 @@ class PreprocessingService:
             cluster_matches = sum(1 for w in words if w in cluster_words)
             if cluster_matches > 0:
                 cluster_weight = cluster_matches / len(words)
-                hash_val = hash(f"cluster_{cluster_name}") % dim
+                hash_val = _stable_hash(f"cluster_{cluster_name}") % dim
                 embedding[hash_val] += cluster_weight * 0.05
 
         # Нормализация
@@ -470,6 +578,30 @@ class PreprocessingService:
 
         return [sol for sol in all_solutions if sol.id in selected]
 
+    async def rank_by_diversity(
+            self,
+            solution_ids: List[str],
+            preprocessings: Dict[str, SolutionPreprocessing]
+    ) -> List[str]:
+        """
+        Порядок решений по убыванию разнообразия (MMR по всем решениям)
+
+        Решения без предобработки идут в конце в исходном порядке
+        """
+        embeddings_map = {
+            sid: np.array(json.loads(preprocessings[sid].embedding))
+            for sid in solution_ids if sid in preprocessings
+        }
+        ranked = []
+        if embeddings_map:
+            ranked = await self._maximal_marginal_relevance(
+                embeddings_map,
+                len(embeddings_map),
+                lambda_param=0.7
+            )
+        ranked_set = set(ranked)
+        return ranked + [sid for sid in solution_ids if sid not in ranked_set]
+
     async def _maximal_marginal_relevance(
             self,
             embeddings_map: Dict[str, np.ndarray],
@@ -490,45 +622,44 @@ class PreprocessingService:
         solution_ids = list(embeddings_map.keys())
         embeddings = np.array([embeddings_map[sid] for sid in solution_ids])
 
+        # Нормированные векторы: косинусная схожесть - скалярное произведение
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        normalized = np.divide(
+            embeddings, norms, out=np.zeros_like(embeddings, dtype=float),
+            where=norms != 0
+        )
+
         # Начинаем с самого "среднего" решения (центроид)
         centroid = np.mean(embeddings, axis=0)
-        similarities_to_centroid = [
-            self._cosine_similarity(emb, centroid)
-            for emb in embeddings
-        ]
-
-        selected_indices = [np.argmax(similarities_to_centroid)]
-        selected_ids = [solution_ids[selected_indices[0]]]
-        remaining_indices = set(range(len(solution_ids))) - set(selected_indices)
+        centroid_norm = np.linalg.norm(centroid)
+        if centroid_norm == 0:
+            similarities_to_centroid = np.zeros(len(solution_ids))
+        else:
+            similarities_to_centroid = normalized @ (centroid / centroid_norm)
 
-        # Итеративно добавляем наиболее различающиеся решения
-        while len(selected_indices) < target_count and remaining_indices:
-            mmr_scores = []
-
-            for idx in remaining_indices:
-                # Relevance: схожесть с центроидом
-                relevance = similarities_to_centroid[idx]
-
-                # Diversity: максимальная схожесть с уже выбранными
-                max_similarity = max(
-                    self._cosine_similarity(
-                        embeddings[idx],
-                        embeddings[selected_idx]
-                    )
-                    for selected_idx in selected_indices
-                )
+        best_idx = int(np.argmax(similarities_to_centroid))
+        selected_ids = [solution_ids[best_idx]]
+        remaining = np.ones(len(solution_ids), dtype=bool)
+        remaining[best_idx] = False
 
-                # MMR score: баланс между relevance и diversity
-                mmr_score = lambda_param * relevance - (
-                            1 - lambda_param
-                ) * max_similarity
-                mmr_scores.append((idx, mmr_score))
+        # Максимальная схожесть каждого решения с уже выбранными
+        # обновляется инкрементально - O(n) на шаг вместо O(n * k)
+        max_similarity = normalized @ normalized[best_idx]
 
-            # Выбираем решение с максимальным MMR score
-            best_idx, _ = max(mmr_scores, key=lambda x: x[1])
-            selected_indices.append(best_idx)
+        # Итеративно добавляем наиболее различающиеся решения
+        while len(selected_ids) < target_count and remaining.any():
+            # MMR score: баланс между relevance и diversity
+            mmr_scores = lambda_param * similarities_to_centroid - (
+                    1 - lambda_param
+            ) * max_similarity
+            mmr_scores[~remaining] = -np.inf
+
+            best_idx = int(np.argmax(mmr_scores))
             selected_ids.append(solution_ids[best_idx])
-            remaining_indices.remove(best_idx)
+            remaining[best_idx] = False
+            max_similarity = np.maximum(
+                max_similarity, normalized @ normalized[best_idx]
+            )
 
         return selected_ids
 
@@ -542,3 +673,38 @@ class PreprocessingService:
             return 0.0
 
         return float(np.dot(a, b) / (norm_a * norm_b))
+
+
+def _stable_hash(token: str) -> int:
+    """
+    Хеш токена, одинаковый во всех процессах и между перезапусками
+
+    Встроенный hash() для строк солится при старте интерпретатора, и
+    легковесные embeddings из разных процессов были бы несравнимы
+    """
+    digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def analyze_texts(
+        texts: List[str],
+        with_embeddings: bool = False
+) -> List[Tuple]:
+    """
+    Ключевые тезисы, категория, метрики и, если нужно, легковесный
+    embedding текстов решений
+
+    Функция модуля - чтобы её можно было выполнить в пуле процессов
+    """
+    service = PreprocessingService(data_adapter=None)
+    results = []
+    for text in texts:
+        item = (
+            service._extract_key_points(text),
+            service._classify_approach(text, None),
+            service._calculate_metrics(text),
+        )
+        if with_embeddings:
+            item += (service._generate_improved_embedding(text),)
+        results.append(item)
+    return results
@@ -0,0 +1,262 @@
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from core.config import (
+    LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_ERROR_RATE,
+    LLM_CIRCUIT_COOLDOWN_SECONDS, LLM_CIRCUIT_RATE_LIMIT_COOLDOWN_SECONDS
+)
+from core.metrics import metrics
+from llm.models.lab import LLMProvider
+from .latency_tracker import LatencyTracker, get_latency_tracker
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+@dataclass(kw_only=True)
+class ProviderHealth:
+    """Состояние провайдера (модели) для маршрутизации"""
+    # Последние исходы запросов: True - успех
+    outcomes: Deque[bool] = field(default_factory=lambda: deque(maxlen=20))
+    rate_limited: int = 0
+    consecutive_failures: int = 0
+    state: str = CIRCUIT_CLOSED
+    opened_at: float = 0.0
+    cooldown_seconds: float = 0.0
+    probe_in_flight: bool = False
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+
+class ProviderRouter:
+    """
+    Адаптивный выбор провайдера LLM с circuit breaker
+
+    По каждой паре (провайдер, модель) учитываются задержки
+    (общий LatencyTracker), доля ошибок и ответы 429.
+    После failure_threshold ошибок подряд или при доле ошибок выше
+    error_rate_threshold цепь размыкается: провайдер не получает
+    запросов cooldown_seconds, затем пропускается один пробный
+    запрос (half-open). Успешная проба замыкает цепь, ошибка снова
+    размыкает её.
+
+    Доступные провайдеры упорядочиваются по ожидаемой задержке для
+    типа задачи: медиана задержки плюс доля ошибок, умноженная
+    на таймаут провайдера - столько стоит неудачная попытка.
+    """
+
+    min_outcomes_for_error_rate = 10
+
+    def __init__(
+            self,
+            latency_tracker: LatencyTracker,
+            failure_threshold: int = 3,
+            error_rate_threshold: float = 0.5,
+            cooldown_seconds: float = 60,
+            rate_limit_cooldown_seconds: float = 120
+    ):
+        self.latency_tracker = latency_tracker
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.rate_limit_cooldown_seconds = rate_limit_cooldown_seconds
+        self._health: Dict[Tuple[str, str], ProviderHealth] = {}
+        self._lock = Lock()
+
+    def order(
+            self,
+            providers: List[LLMProvider],
+            task_type: Optional[str] = None,
+            preferred_provider: Optional[str] = None
+    ) -> List[LLMProvider]:
+        """
+        Провайдеры в порядке опроса
+
+        Провайдеры с разомкнутой цепью не возвращаются. Провайдер,
+        у которого истекла пауза, идёт первым как пробный запрос -
+        не больше одного на вызов, чтобы проба точно была выполнена.
+        Если разомкнуты все, возвращаются все - по времени до окончания
+        паузы, чтобы запрос не падал без единой попытки.
+        """
+        now = time.monotonic()
+        probe = None
+        available = []
+        with self._lock:
+            for provider in providers:
+                health = self._get_health(provider)
+                if health.state == CIRCUIT_CLOSED:
+                    available.append(provider)
+                elif probe is None and self._claim_probe(health, now):
+                    probe = provider
+
+            if probe is None and not available:
+                metrics.increment('llm_router.all_open')
+                return sorted(
+                    providers,
+                    key=lambda x: self._get_health(x).opened_at
+                    + self._get_health(x).cooldown_seconds
+                )
+
+        ordered = sorted(
+            available,
+            key=lambda x: (
+                x.name != preferred_provider if preferred_provider else False,
+                self.expected_latency(x, task_type),
+                x.priority,
+            )
+        )
+        if probe is not None:
+            metrics.increment('llm_router.probes')
+            ordered.insert(0, probe)
+        return ordered
+
+    def expected_latency(
+            self,
+            provider: LLMProvider,
+            task_type: Optional[str] = None
+    ) -> float:
+        """Ожидаемое время получения ответа, с; 0 - нет наблюдений"""
+        median = self.latency_tracker.percentile(provider, 0.5, task_type)
+        error_rate = self._get_health(provider).error_rate
+        return (median or 0.0) + error_rate * provider.timeout
+
+    def record_success(self, provider: LLMProvider) -> None:
+        """Учёт успешного ответа"""
+        with self._lock:
+            health = self._get_health(provider)
+            health.consecutive_failures = 0
+            health.probe_in_flight = False
+            if health.state != CIRCUIT_CLOSED:
+                # Ошибки до размыкания больше не показательны
+                health.outcomes.clear()
+                health.state = CIRCUIT_CLOSED
+                metrics.increment('llm_router.circuit_closed')
+                logger.info(
+                    f"Circuit closed for {provider.name} model {provider.model}"
+                )
+            health.outcomes.append(True)
+
+    def record_failure(
+            self,
+            provider: LLMProvider,
+            rate_limited: bool = False
+    ) -> None:
+        """Учёт ошибки; 429 размыкает цепь сразу и на большую паузу"""
+        with self._lock:
+            health = self._get_health(provider)
+            health.outcomes.append(False)
+            health.consecutive_failures += 1
+            health.probe_in_flight = False
+            if rate_limited:
+                health.rate_limited += 1
+                metrics.increment('llm_router.rate_limited')
+
+            if (
+                    rate_limited
+                    or health.state == CIRCUIT_HALF_OPEN
+                    or health.consecutive_failures >= self.failure_threshold
+                    or (
+                        len(health.outcomes) >= self.min_outcomes_for_error_rate
+                        and health.error_rate >= self.error_rate_threshold
+                    )
+            ):
+                self._open(provider, health, rate_limited)
+
+    def release(self, provider: LLMProvider) -> None:
+        """Запрос отменён без результата: проба снова доступна"""
+        with self._lock:
+            self._get_health(provider).probe_in_flight = False
+
+    def get_state(self) -> List[Dict[str, Any]]:
+        """Состояние провайдеров для /llm/health"""
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._health.items())
+        state = []
+        for (name, model), health in items:
+            provider = LLMProvider(name=name, api_url="", model=model)
+            median = self.latency_tracker.percentile(provider, 0.5)
+            p90 = self.latency_tracker.percentile(provider, 0.9)
+            retry_in = 0.0
+            if health.state == CIRCUIT_OPEN:
+                retry_in = max(
+                    0.0, health.opened_at + health.cooldown_seconds - now
+                )
+            state.append({
+                "name": name,
+                "model": model,
+                "circuit": health.state,
+                "retry_in_seconds": round(retry_in, 1),
+                "error_rate": round(health.error_rate, 3),
+                "consecutive_failures": health.consecutive_failures,
+                "rate_limited": health.rate_limited,
+                "latency_p50": round(median, 2) if median else None,
+                "latency_p90": round(p90, 2) if p90 else None,
+            })
+        return state
+
+    def _get_health(self, provider: LLMProvider) -> ProviderHealth:
+        key = (provider.name, provider.model)
+        if key not in self._health:
+            self._health[key] = ProviderHealth()
+        return self._health[key]
+
+    @staticmethod
+    def _claim_probe(health: ProviderHealth, now: float) -> bool:
+        if health.state == CIRCUIT_OPEN:
+            if now < health.opened_at + health.cooldown_seconds:
+                return False
+            health.state = CIRCUIT_HALF_OPEN
+        # Полуоткрытая цепь пропускает один пробный запрос
+        if health.probe_in_flight:
+            return False
+        health.probe_in_flight = True
+        return True
+
+    def _open(
+            self,
+            provider: LLMProvider,
+            health: ProviderHealth,
+            rate_limited: bool
+    ) -> None:
+        health.state = CIRCUIT_OPEN
+        health.opened_at = time.monotonic()
+        health.cooldown_seconds = (
+            self.rate_limit_cooldown_seconds if rate_limited
+            else self.cooldown_seconds
+        )
+        metrics.increment('llm_router.circuit_opened')
+        logger.warning(
+            f"Circuit opened for {provider.name} model {provider.model} "
+            f"for {health.cooldown_seconds:.0f}s"
+        )
+
+
+_provider_router_instance: Optional[ProviderRouter] = None
+
+
+def get_provider_router() -> ProviderRouter:
+    """Получение singleton instance маршрутизатора провайдеров"""
+    global _provider_router_instance
+    if _provider_router_instance is None:
+        _provider_router_instance = ProviderRouter(
+            latency_tracker=get_latency_tracker(),
+            failure_threshold=LLM_CIRCUIT_FAILURE_THRESHOLD,
+            error_rate_threshold=LLM_CIRCUIT_ERROR_RATE,
+            cooldown_seconds=LLM_CIRCUIT_COOLDOWN_SECONDS,
+            rate_limit_cooldown_seconds=(
+                LLM_CIRCUIT_RATE_LIMIT_COOLDOWN_SECONDS
+            ),
+        )
+    return _provider_router_instance
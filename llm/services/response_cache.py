@@ -0,0 +1,253 @@
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from core.cache import TTLCache
+from core.config import (
+    LLM_RESPONSE_CACHE_TTL_SECONDS, LLM_RESPONSE_CACHE_SIZE,
+    LLM_RESPONSE_CACHE_PERSISTENT
+)
+from core.metrics import metrics
+from datastorage.database.base import async_session_maker
+from datastorage.database.models import LLMResponseCache
+from llm.models.lab import LLMProvider
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(kw_only=True)
+class CachedResponse:
+    """Сохранённый ответ LLM"""
+    response: Dict[str, Any]
+    latency_ms: float
+    solution_ids: FrozenSet[str]
+
+
+class LLMResponseCacheService:
+    """
+    Кеш ответов LLM по содержимому запроса
+
+    Ключ - хеш модели, температуры, формата ответа и текстов промптов,
+    поэтому новая версия любого решения в промпте даёт новый ключ.
+    Ответы хранятся в памяти (TTL + LRU) и, если включено,
+    в таблице llm_response_cache, общей для всех процессов.
+
+    Метрики: llm_response_cache.hits / misses - по одной на запрос,
+    saved_ms - суммарное время ответов LLM, которое не пришлось ждать.
+    Просроченные строки таблицы удаляет purge_expired.
+    """
+
+    def __init__(
+            self,
+            ttl_seconds: float,
+            max_size: int,
+            persistent: bool = False
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self._memory: TTLCache[CachedResponse] = TTLCache(
+            name='llm_response_cache.memory',
+            ttl_seconds=ttl_seconds,
+            max_size=max_size,
+        )
+
+    @staticmethod
+    def build_key(
+            provider: LLMProvider,
+            prompt: str,
+            system_prompt: str,
+            response_format: str
+    ) -> str:
+        """Ключ запроса к конкретной модели"""
+        data = json.dumps(
+            [
+                provider.model, provider.temperature, response_format,
+                system_prompt, prompt
+            ],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Ответ по ключу, если он есть в кеше"""
+        return await self.get_first([key])
+
+    async def get_first(self, keys: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Ответ по первому из ключей, который есть в кеше
+
+        Ключи одного запроса к разным провайдерам проверяются разом:
+        в метриках одно попадание или промах на запрос, таблица
+        читается одним запросом
+        """
+        cached = None
+        for key in keys:
+            cached = self._memory.get(key)
+            if cached is not None:
+                break
+
+        if cached is None and self.persistent and keys:
+            loaded = await self._load(keys)
+            for key in keys:
+                if key in loaded:
+                    cached = loaded[key]
+                    self._memory.set(key, cached)
+                    break
+
+        if cached is None:
+            metrics.increment('llm_response_cache.misses')
+            return None
+
+        metrics.increment('llm_response_cache.hits')
+        metrics.increment('llm_response_cache.saved_ms', int(cached.latency_ms))
+        return cached.response
+
+    async def set(
+            self,
+            key: str,
+            provider: LLMProvider,
+            response: Dict[str, Any],
+            latency_ms: float,
+            solution_ids: Iterable[str] = ()
+    ) -> None:
+        """Сохранение ответа. Ответы с ошибкой разбора не кешируются"""
+        if not response or "error" in response:
+            return
+
+        cached = CachedResponse(
+            response=response,
+            latency_ms=latency_ms,
+            solution_ids=frozenset(solution_ids),
+        )
+        self._memory.set(key, cached)
+        if self.persistent:
+            await self._save(key, provider, cached)
+
+    async def invalidate_solution(self, solution_id: str) -> None:
+        """Удаление ответов, в промпт которых входило решение"""
+        removed = self._memory.invalidate_where(
+            lambda cached: solution_id in cached.solution_ids
+        )
+        if self.persistent:
+            try:
+                async with async_session_maker() as session:
+                    result = await session.execute(
+                        delete(LLMResponseCache).where(
+                            LLMResponseCache.solution_ids.any(solution_id)
+                        )
+                    )
+                    await session.commit()
+                    removed += result.rowcount
+            except Exception as e:
+                logger.warning(
+                    f"Не удалось очистить кеш ответов LLM "
+                    f"для решения {solution_id}: {e}"
+                )
+        if removed:
+            metrics.increment('llm_response_cache.invalidated', removed)
+
+    async def purge_expired(self) -> int:
+        """Удаление просроченных ответов из таблицы кеша"""
+        if not self.persistent:
+            return 0
+        async with async_session_maker() as session:
+            result = await session.execute(
+                delete(LLMResponseCache).where(
+                    LLMResponseCache.expires_at <= datetime.now()
+                )
+            )
+            await session.commit()
+        if result.rowcount:
+            metrics.increment('llm_response_cache.purged', result.rowcount)
+        return result.rowcount
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика использования кеша"""
+        hits = metrics.get('llm_response_cache.hits')
+        misses = metrics.get('llm_response_cache.misses')
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+            "saved_seconds": round(
+                metrics.get('llm_response_cache.saved_ms') / 1000, 1
+            ),
+            "invalidated": metrics.get('llm_response_cache.invalidated'),
+            "persistent": self.persistent,
+        }
+
+    async def _load(self, keys: List[str]) -> Dict[str, CachedResponse]:
+        try:
+            async with async_session_maker() as session:
+                rows = (await session.scalars(
+                    select(LLMResponseCache).where(
+                        LLMResponseCache.key.in_(keys),
+                        LLMResponseCache.expires_at > datetime.now(),
+                    )
+                )).all()
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать кеш ответов LLM: {e}")
+            return {}
+
+        return {
+            row.key: CachedResponse(
+                response=row.response,
+                latency_ms=row.latency_ms,
+                solution_ids=frozenset(row.solution_ids),
+            )
+            for row in rows
+        }
+
+    async def _save(
+            self,
+            key: str,
+            provider: LLMProvider,
+            cached: CachedResponse
+    ) -> None:
+        now = datetime.now()
+        values = dict(
+            key=key,
+            model=provider.model,
+            response=cached.response,
+            latency_ms=cached.latency_ms,
+            solution_ids=sorted(cached.solution_ids),
+            created_at=now,
+            expires_at=now + timedelta(seconds=self.ttl_seconds),
+        )
+        try:
+            async with async_session_maker() as session:
+                stmt = insert(LLMResponseCache).values(**values)
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[LLMResponseCache.key],
+                        set_={
+                            column: stmt.excluded[column]
+                            for column in values if column != 'key'
+                        },
+                    )
+                )
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить ответ LLM в кеш: {e}")
+
+
+_response_cache_instance: Optional[LLMResponseCacheService] = None
+
+
+def get_llm_response_cache() -> LLMResponseCacheService:
+    """Получение singleton instance кеша ответов LLM"""
+    global _response_cache_instance
+    if _response_cache_instance is None:
+        _response_cache_instance = LLMResponseCacheService(
+            ttl_seconds=LLM_RESPONSE_CACHE_TTL_SECONDS,
+            max_size=LLM_RESPONSE_CACHE_SIZE,
+            persistent=LLM_RESPONSE_CACHE_PERSISTENT,
+        )
+    return _response_cache_instance
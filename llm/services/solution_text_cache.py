@@ -0,0 +1,75 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+from core.cache import TTLCache
+from core.config import (
+    SOLUTION_TEXT_CACHE_SIZE, SOLUTION_TEXT_CACHE_TTL_SECONDS
+)
+from .text_optimizer import TextOptimizer
+from .token_calculator_service import get_token_calculator
+
+
+@dataclass(kw_only=True)
+class PreparedSolutionText:
+    """Очищенный текст решения и его размер в токенах"""
+    text: str
+    tokens: Optional[int] = None
+
+
+class SolutionTextCache:
+    """
+    Кеш очищенных текстов решений и их размера в токенах
+
+    Ключ - хеш содержимого решения, поэтому новая версия решения
+    получает новую запись, а старая вытесняется по LRU. Один и тот же
+    очищенный текст используется и при отборе решений под контекст,
+    и при сборке промпта: очистка и токенизация выполняются один раз
+    на версию решения, а не на каждый запрос.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self._optimizer = TextOptimizer()
+        self._cache: TTLCache[PreparedSolutionText] = TTLCache(
+            name='solution_text_cache',
+            ttl_seconds=ttl_seconds,
+            max_size=max_size,
+        )
+
+    def clean_text(self, content: str) -> str:
+        """Текст решения, очищенный для промпта"""
+        return self._prepare(content).text
+
+    def count_tokens(self, content: str) -> int:
+        """Размер очищенного текста решения в токенах"""
+        prepared = self._prepare(content)
+        if prepared.tokens is None:
+            prepared.tokens = get_token_calculator().count_tokens(
+                prepared.text
+            )
+        return prepared.tokens
+
+    def _prepare(self, content: str) -> PreparedSolutionText:
+        content = content or ""
+        key = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        prepared = self._cache.get(key)
+        if prepared is None:
+            prepared = PreparedSolutionText(
+                text=self._optimizer.clean_and_optimize(content)
+            )
+            self._cache.set(key, prepared)
+        return prepared
+
+
+_solution_text_cache_instance: Optional[SolutionTextCache] = None
+
+
+def get_solution_text_cache() -> SolutionTextCache:
+    """Получение singleton instance кеша текстов решений"""
+    global _solution_text_cache_instance
+    if _solution_text_cache_instance is None:
+        _solution_text_cache_instance = SolutionTextCache(
+            ttl_seconds=SOLUTION_TEXT_CACHE_TTL_SECONDS,
+            max_size=SOLUTION_TEXT_CACHE_SIZE,
+        )
+    return _solution_text_cache_instance
@@ -1,6 +1,7 @@
 from typing import List, Dict, Any, Optional
 import tiktoken
 from llm.models.lab import LLMProvider
+from llm.services.context_packer import solution_cost
 
 
 class TokenCalculatorService:
@@ -100,7 +101,8 @@ class TokenCalculatorService:
             base_prompt: str,
             solution_texts: List[str],
             safety_margin: float = 0.15,
-            min_response_tokens: int = 2000
+            min_response_tokens: int = 2000,
+            solution_tokens: Optional[List[int]] = None
     ) -> Dict[str, Any]:
         """
         Рассчитывает сколько решений влезет в контекст
@@ -112,6 +114,8 @@ class TokenCalculatorService:
             solution_texts: Список текстов решений
             safety_margin: Запас на вариативность
             min_response_tokens: Минимум токенов для ответа
+            solution_tokens: Готовые размеры решений в токенах (из кеша),
+                тогда тексты решений повторно не токенизируются
 
         Returns:
             Dict с информацией:
@@ -143,11 +147,12 @@ class TokenCalculatorService:
         solutions_fit = []
         accumulated_tokens = 0
 
-        for idx, solution_text in enumerate(solution_texts):
-            solution_tokens = self.count_tokens(solution_text)
+        if solution_tokens is None:
+            solution_tokens = [self.count_tokens(text) for text in solution_texts]
 
+        for idx, tokens in enumerate(solution_tokens):
             # Добавляем запас на форматирование (заголовки, разделители)
-            solution_tokens_with_overhead = int(solution_tokens * 1.05) + 50
+            solution_tokens_with_overhead = solution_cost(tokens)
 
             if accumulated_tokens + solution_tokens_with_overhead <= available_for_solutions:
                 solutions_fit.append(idx)
@@ -0,0 +1,51 @@
+from llm.services.context_packer import (
+    PackingCandidate, chunk_solutions, pack_solutions, solution_cost
+)
+
+
+def make_candidate(sid: str, tokens: int, summary_tokens: int = 0):
+    return PackingCandidate(
+        id=sid,
+        user_id='user',
+        content=f'{sid} full',
+        tokens=tokens,
+        summary=f'{sid} summary' if summary_tokens else None,
+        summary_tokens=summary_tokens,
+    )
+
+
+def test_large_solution_does_not_stop_packing():
+    candidates = [
+        make_candidate('big', 5000, summary_tokens=100),
+        make_candidate('a', 500, summary_tokens=50),
+        make_candidate('b', 500),
+        make_candidate('c', 500, summary_tokens=50),
+    ]
+    budget = solution_cost(500) * 2 + solution_cost(100) + solution_cost(50)
+
+    result = pack_solutions(
+        candidates, budget, priority=['c', 'b', 'a'], max_share=0.5
+    )
+
+    # Порядок промпта - исходный, не порядок приоритета
+    assert [sol.id for sol in result.solutions] == ['big', 'a', 'b', 'c']
+    assert {sol.id for sol in result.solutions if sol.is_summary} == {
+        'big', 'a'
+    }
+    assert result.solutions[0].current_content == 'big summary'
+    assert result.used_tokens == budget
+    assert result.utilization == 1.0
+
+
+def test_chunks_fit_budget_and_are_balanced():
+    candidates = [make_candidate(f's{i}', 100) for i in range(7)]
+    candidates.append(make_candidate('huge', 10_000, summary_tokens=100))
+    candidates.append(make_candidate('lost', 10_000))
+    budget = solution_cost(100) * 3
+
+    chunks = chunk_solutions(candidates, budget)
+
+    # 8 решений по 3 в части - три части, последняя не из одного решения
+    assert [len(chunk) for chunk in chunks] == [3, 3, 2]
+    assert chunks[-1][-1].id == 'huge' and chunks[-1][-1].is_summary
+    assert 'lost' not in {sol.id for chunk in chunks for sol in chunk}
@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from llm.services import llm_service
+from llm.services.laboratory_service import LaboratoryService
+from llm.services.mock_llm_service import MockLLMService
+
+
+def make_service(tokens_by_content: dict, available_for_solutions: int):
+    text_cache = MagicMock()
+    text_cache.clean_text.side_effect = lambda content: content
+    text_cache.count_tokens.side_effect = (
+        lambda content: tokens_by_content.get(content, 10)
+    )
+    token_calc = MagicMock()
+    # Ответ first-fit расчёта: крупное первое решение обрывает подбор
+    token_calc.calculate_max_solutions_fit.return_value = {
+        "max_solutions_count": 0,
+        "solutions_fit": [],
+        "available_for_solutions": available_for_solutions,
+    }
+    data_adapter = MagicMock()
+    data_adapter.get_preprocessings = AsyncMock(return_value={})
+    preprocessing = MagicMock()
+    preprocessing.rank_by_diversity = AsyncMock(
+        side_effect=lambda ids, _: ids
+    )
+
+    service = LaboratoryService(
+        data_adapter=data_adapter,
+        llm_service=MagicMock(providers=[MagicMock()]),
+        preprocessing_service=preprocessing,
+        rate_limiting_service=MagicMock(),
+        token_calculator=token_calc,
+    )
+    service.text_cache = text_cache
+    return service
+
+
+def make_solutions(tokens: list):
+    return [
+        SimpleNamespace(
+            id=f's{idx}', user_id='user', current_content=f'text {idx}'
+        )
+        for idx in range(len(tokens))
+    ]
+
+
+@pytest.mark.asyncio
+async def test_large_first_solution_does_not_fail_selection():
+    tokens = [6000] + [100] * 40
+    solutions = make_solutions(tokens)
+    service = make_service(
+        {sol.current_content: t for sol, t in zip(solutions, tokens)},
+        available_for_solutions=6184,
+    )
+
+    selected = await service._select_solutions_for_analysis(
+        solutions[0], solutions, 'ideas'
+    )
+
+    # 6184 // solution_cost(100) = 39 небольших решений
+    assert len(selected) == 39
+    assert 's0' not in {sol.id for sol in selected}
+
+
+@pytest.mark.asyncio
+async def test_large_first_solution_does_not_fail_directions_chunking():
+    tokens = [6000] + [100] * 40
+    solutions = make_solutions(tokens)
+    service = make_service(
+        {sol.current_content: t for sol, t in zip(solutions, tokens)},
+        available_for_solutions=6184,
+    )
+    service.llm_service.get_directions_prompts.return_value = ('', '')
+
+    chunks = await service._chunk_solutions_for_directions(
+        SimpleNamespace(title='', description=''), solutions
+    )
+
+    # Крупное решение без тезисов пропускается, остальные делятся на части
+    assert [len(chunk) for chunk in chunks] == [20, 20]
+    assert [sol.id for chunk in chunks for sol in chunk] == [
+        sol.id for sol in solutions[1:]
+    ]
+
+
+@pytest.mark.asyncio
+async def test_directions_work_with_mock_llm(monkeypatch):
+    monkeypatch.setattr(llm_service, 'get_token_calculator', MagicMock)
+    solutions = make_solutions([100] * 3)
+    service = make_service({}, available_for_solutions=0)
+    service.llm_service = MockLLMService()
+    data_adapter = service.data_adapter
+    data_adapter.get_user_solution_for_challenge = AsyncMock(return_value=None)
+    data_adapter.get_challenge = AsyncMock(
+        return_value=SimpleNamespace(title='', description='')
+    )
+    data_adapter.get_challenge_solutions = AsyncMock(return_value=solutions)
+    data_adapter.release_connection = AsyncMock()
+    monkeypatch.setattr('asyncio.sleep', AsyncMock())
+
+    directions = await service.generate_thinking_directions('challenge', 'user')
+
+    assert directions
+    service.token_calc.calculate_max_solutions_fit.assert_not_called()
@@ -0,0 +1,26 @@
+import pytest
+
+from llm.models.lab import HedgingPolicy, LLMProvider
+from llm.services.latency_tracker import LatencyTracker
+
+PROVIDER = LLMProvider(name='together', api_url='http://llm', model='model')
+
+
+def test_hedge_delay_follows_observed_percentile():
+    tracker = LatencyTracker(window=10, min_samples=3)
+    policy = HedgingPolicy(
+        enabled=True, percentile=0.9,
+        min_delay_seconds=2, default_delay_seconds=30,
+    )
+
+    tracker.record(PROVIDER, 10)
+    assert tracker.percentile(PROVIDER, policy.percentile) is None
+    assert policy.hedge_delay(None) == 30
+
+    for latency in (4, 6, 8, 10, 12, 14, 16, 18, 20, 22, 24):
+        tracker.record(PROVIDER, latency)
+    # В окне остаются последние 10 задержек: 6..24
+    observed = tracker.percentile(PROVIDER, policy.percentile)
+    assert observed == pytest.approx(22.2)
+    assert policy.hedge_delay(observed) == observed
+    assert policy.hedge_delay(0.5) == 2
@@ -0,0 +1,126 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from llm.models.lab import HedgingPolicy, LLMProvider, ThinkingDirection
+from llm.services import llm_service
+from llm.services.llm_service import LLMService, ProviderHTTPError
+from llm.services.token_calculator_service import TokenCalculatorService
+
+PROVIDER = LLMProvider(
+    name='together', api_url='http://llm', model='fast',
+    max_context_tokens=6000
+)
+SLOW = LLMProvider(name='together', api_url='http://llm', model='slow')
+
+
+class WordCalculator(TokenCalculatorService):
+    def __init__(self):
+        pass
+
+    def count_tokens(self, text: str) -> int:
+        return len(text.split())
+
+
+def make_direction(number: int) -> ThinkingDirection:
+    return ThinkingDirection(
+        title=f'подход {number}',
+        description='описание подхода',
+        key_approaches=['метод'],
+        participants_count=2,
+        initial_solution_text=' '.join(['раздел'] * 400),
+        example_excerpts=[' '.join(['цитата'] * 50)] * 3,
+    )
+
+
+@pytest.mark.asyncio
+async def test_merge_directions_reduces_by_levels_within_budget(monkeypatch):
+    calculator = WordCalculator()
+    monkeypatch.setattr(
+        llm_service, 'get_token_calculator', lambda: calculator
+    )
+    service = LLMService([PROVIDER])
+    prompts = []
+
+    async def make_llm_request(prompt, system_prompt, *args, **kwargs):
+        prompts.append(
+            calculator.count_tokens(system_prompt)
+            + calculator.count_tokens(prompt)
+        )
+        return {'directions': [make_direction(0).model_dump()]}
+
+    service._make_llm_request = AsyncMock(side_effect=make_llm_request)
+    # 16 частей по 5 направлений с полными шаблонами
+    partial = [[make_direction(i) for i in range(5)] for _ in range(16)]
+
+    directions = await service.merge_thinking_directions(
+        SimpleNamespace(title='задача', description='описание'),
+        partial, solution_ids=['s1'],
+    )
+
+    assert [d.title for d in directions] == ['подход 0']
+    assert len(prompts) > 1
+    assert max(prompts) <= PROVIDER.max_context_tokens - 2000
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_releases_loser_without_latency(monkeypatch):
+    monkeypatch.setattr(
+        llm_service, 'get_token_calculator', lambda: WordCalculator()
+    )
+    service = LLMService([SLOW, PROVIDER])
+    service.router = MagicMock()
+    service.latency_tracker = MagicMock()
+    service.latency_tracker.percentile.return_value = None
+
+    async def call_provider_timed(provider, *args):
+        # Без обработчика отмены - как задача, отменённая до старта
+        if provider is SLOW:
+            await asyncio.Event().wait()
+        return {'content': 'ok'}, 1.0
+
+    service._call_provider_timed = call_provider_timed
+    provider, response, _ = await service._make_hedged_request(
+        [SLOW, PROVIDER], 'prompt', 'system', 'text',
+        HedgingPolicy(enabled=True, default_delay_seconds=0.01),
+    )
+
+    assert provider is PROVIDER and response == {'content': 'ok'}
+    service.router.release.assert_called_once_with(SLOW)
+    service.latency_tracker.record.assert_not_called()
+
+
+class StreamResponse:
+    def __init__(self, *lines: str):
+        self.content = self._lines(lines)
+
+    @staticmethod
+    async def _lines(lines):
+        for line in lines:
+            yield line.encode('utf-8')
+
+
+@pytest.mark.asyncio
+async def test_stream_skips_bad_lines_and_raises_provider_errors(monkeypatch):
+    monkeypatch.setattr(
+        llm_service, 'get_token_calculator', lambda: WordCalculator()
+    )
+    service = LLMService([PROVIDER])
+    delta = '{"choices": [{"delta": {"content": "%s"}}]}'
+
+    text = await service._read_stream(StreamResponse(
+        'data: ' + delta % 'при',
+        'data: {"choices": [',
+        'data: ' + delta % 'вет',
+        'data: [DONE]',
+    ), PROVIDER)
+    assert text == 'привет'
+
+    with pytest.raises(ProviderHTTPError, match='overloaded') as error:
+        await service._read_stream(StreamResponse(
+            'data: ' + delta % 'при',
+            'data: {"error": {"message": "overloaded", "code": 429}}',
+        ), PROVIDER)
+    assert error.value.status == 429
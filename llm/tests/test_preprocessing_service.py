@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from llm.services import preprocessing_service
+from llm.services.preprocessing_service import (
+    PreprocessingService, analyze_texts
+)
+
+TEXTS = [
+    'Автоматизация сервиса через платформу и данные сообщества',
+    'Команда участников организует взаимодействие и коммуникацию',
+    'Разработка алгоритма интеграции с базой данных',
+]
+
+
+@pytest.mark.asyncio
+async def test_pool_embeddings_match_in_process(monkeypatch):
+    monkeypatch.setattr(preprocessing_service, 'PREPROCESSING_WORKERS', 2)
+    service = PreprocessingService(data_adapter=None)
+
+    pooled = await service._analyze_texts(
+        TEXTS, with_embeddings=True, chunk_size=1
+    )
+
+    assert pooled == analyze_texts(TEXTS, with_embeddings=True)
+
+
+def test_embedding_does_not_depend_on_hash_seed():
+    code = (
+        'import json, sys\n'
+        'from llm.services.preprocessing_service import PreprocessingService\n'
+        'service = PreprocessingService(data_adapter=None)\n'
+        'print(json.dumps(service._generate_improved_embedding(sys.argv[1])))'
+    )
+    env = {**os.environ, 'PYTHONHASHSEED': '12345'}
+
+    output = subprocess.run(
+        [sys.executable, '-c', code, TEXTS[0]],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    embedding = PreprocessingService(
+        data_adapter=None
+    )._generate_improved_embedding(TEXTS[0])
+
+    assert [round(x, 12) for x in json.loads(output)] == [
+        round(x, 12) for x in embedding
+    ]
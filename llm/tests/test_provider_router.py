@@ -0,0 +1,32 @@
+from llm.models.lab import LLMProvider
+from llm.services.latency_tracker import LatencyTracker
+from llm.services.provider_router import ProviderRouter
+
+FAST = LLMProvider(name='together', api_url='http://llm', model='fast', priority=2)
+SLOW = LLMProvider(name='together', api_url='http://llm', model='slow', priority=1)
+
+
+def test_router_opens_circuit_and_probes_after_cooldown():
+    router = ProviderRouter(
+        latency_tracker=LatencyTracker(min_samples=1),
+        failure_threshold=2,
+        cooldown_seconds=0,
+    )
+    router.latency_tracker.record(FAST, 1.0)
+    router.latency_tracker.record(SLOW, 5.0)
+    assert router.order([SLOW, FAST]) == [FAST, SLOW]
+
+    router.record_failure(FAST)
+    router.record_failure(FAST)
+    router._health[('together', 'fast')].cooldown_seconds = 60
+    assert router.order([SLOW, FAST]) == [SLOW]
+
+    # После паузы один пробный запрос идёт первым
+    router._health[('together', 'fast')].cooldown_seconds = 0
+    assert router.order([SLOW, FAST]) == [FAST, SLOW]
+    assert router.order([SLOW, FAST]) == [SLOW]
+
+    router.record_success(FAST)
+    state = {row['model']: row for row in router.get_state()}
+    assert state['fast']['circuit'] == 'closed'
+    assert router.order([SLOW, FAST]) == [FAST, SLOW]
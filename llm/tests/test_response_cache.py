@@ -0,0 +1,67 @@
+import pytest
+
+from core.metrics import metrics
+from llm.models.lab import LLMProvider
+from llm.services.response_cache import LLMResponseCacheService
+
+PROVIDER = LLMProvider(name='together', api_url='http://llm', model='model')
+
+
+@pytest.mark.asyncio
+async def test_response_cache_invalidates_by_solution():
+    cache = LLMResponseCacheService(ttl_seconds=60, max_size=8)
+    key = cache.build_key(PROVIDER, 'prompt', 'system', 'json')
+    other_key = cache.build_key(PROVIDER, 'other prompt', 'system', 'json')
+    await cache.set(
+        key=key, provider=PROVIDER, response={'ideas': []},
+        latency_ms=1500, solution_ids=['s1', 's2'],
+    )
+    await cache.set(
+        key=other_key, provider=PROVIDER, response={'ideas': []},
+        latency_ms=1500, solution_ids=['s3'],
+    )
+
+    assert await cache.get(key) == {'ideas': []}
+    assert key != cache.build_key(PROVIDER, 'prompt', 'system', 'text')
+
+    await cache.invalidate_solution('s2')
+
+    assert await cache.get(key) is None
+    assert await cache.get(other_key) == {'ideas': []}
+
+
+@pytest.mark.asyncio
+async def test_response_cache_skips_unparsed_response():
+    cache = LLMResponseCacheService(ttl_seconds=60, max_size=8)
+    key = cache.build_key(PROVIDER, 'prompt', 'system', 'json')
+    await cache.set(
+        key=key, provider=PROVIDER,
+        response={'text': '...', 'error': 'Failed to parse as JSON'},
+        latency_ms=1500,
+    )
+
+    assert await cache.get(key) is None
+
+
+@pytest.mark.asyncio
+async def test_response_cache_counts_one_lookup_per_request():
+    cache = LLMResponseCacheService(ttl_seconds=60, max_size=8)
+    fallback = LLMProvider(
+        name='together', api_url='http://llm', model='fallback'
+    )
+    keys = [
+        cache.build_key(provider, 'prompt', 'system', 'json')
+        for provider in (PROVIDER, fallback)
+    ]
+    hits = metrics.get('llm_response_cache.hits')
+    misses = metrics.get('llm_response_cache.misses')
+
+    assert await cache.get_first(keys) is None
+    await cache.set(
+        key=keys[1], provider=fallback, response={'ideas': []},
+        latency_ms=1500,
+    )
+    assert await cache.get_first(keys) == {'ideas': []}
+
+    assert metrics.get('llm_response_cache.misses') == misses + 1
+    assert metrics.get('llm_response_cache.hits') == hits + 1
@@ -0,0 +1,30 @@
+from llm.services import solution_text_cache
+from llm.services.solution_text_cache import SolutionTextCache
+
+
+class CountingCalculator:
+    def __init__(self):
+        self.calls = 0
+
+    def count_tokens(self, text: str) -> int:
+        self.calls += 1
+        return len(text.split())
+
+
+def test_solution_text_is_cleaned_and_counted_once(monkeypatch):
+    calculator = CountingCalculator()
+    monkeypatch.setattr(
+        solution_text_cache, 'get_token_calculator', lambda: calculator
+    )
+    cache = SolutionTextCache(ttl_seconds=60, max_size=8)
+    content = '## Заголовок\n\n**Первый** пункт решения'
+
+    assert cache.clean_text(content) == cache.clean_text(content)
+    assert '**' not in cache.clean_text(content)
+    assert cache.count_tokens(content) == 4
+    assert cache.count_tokens(content) == 4
+    assert calculator.calls == 1
+
+    # Новая версия решения считается заново
+    assert cache.count_tokens(content + ' ещё') == 5
+    assert calculator.calls == 2
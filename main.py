@@ -8,6 +8,7 @@ from auth.router import auth_router
 from core import config
 from core.config import HOST, PORT, FRONT_HOST, FRONT_PORT
 from core.lifespan import lifespan
+from core.router import router as metrics_router
 from datastorage.utils import get_entities_routers
 from filestorage.router import file_router
 from scheduler.router import router as scheduler_router
@@ -69,6 +70,8 @@ for router_param in get_entities_routers():
 app.include_router(scheduler_router, prefix='/scheduler', tags=['scheduler'])
 #LLM
 app.include_router(llm_router, prefix='/llm', tags=['LLM', 'lab'])
+# Metrics
+app.include_router(metrics_router, prefix='/metrics', tags=['metrics'])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,171 @@
+"""add community member counters
+
+Revision ID: 4022855fd3bf
+Revises: 5660c8eb72b3
+Create Date: 2026-10-19 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4022855fd3bf'
+down_revision: Union[str, None] = '5660c8eb72b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTERS = (
+    'members_count',
+    'workgroup_count',
+    'secret_ballot_count',
+    'can_offer_count',
+    'minority_not_participate_count',
+)
+
+
+def upgrade() -> None:
+    for counter in COUNTERS:
+        op.add_column('community', sa.Column(
+            counter, sa.Integer(), server_default='0', nullable=False
+        ))
+
+    # Изменение счётчиков сообщества на вклад строки настроек участника:
+    # sign = 1 при добавлении, -1 при удалении
+    op.execute("""
+        CREATE FUNCTION community_counters_apply(
+            ucs public.user_community_settings, sign integer
+        ) RETURNS void AS $$
+        BEGIN
+            IF ucs.is_blocked IS TRUE THEN
+                RETURN;
+            END IF;
+            UPDATE public.community
+            SET
+                members_count = members_count + sign,
+                workgroup_count = workgroup_count
+                    + sign * (ucs.is_workgroup IS TRUE)::int,
+                secret_ballot_count = secret_ballot_count
+                    + sign * (ucs.is_secret_ballot IS TRUE)::int,
+                can_offer_count = can_offer_count
+                    + sign * (ucs.is_can_offer IS TRUE)::int,
+                minority_not_participate_count =
+                    minority_not_participate_count
+                    + sign * (ucs.is_minority_not_participate IS TRUE)::int
+            WHERE id = ucs.community_id;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE FUNCTION community_counters_ucs_trigger() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM community_counters_apply(OLD, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM community_counters_apply(NEW, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER community_counters_ucs_insert_delete
+        AFTER INSERT OR DELETE ON public.user_community_settings
+        FOR EACH ROW EXECUTE FUNCTION community_counters_ucs_trigger();
+    """)
+    op.execute("""
+        CREATE TRIGGER community_counters_ucs_update
+        AFTER UPDATE ON public.user_community_settings
+        FOR EACH ROW
+        WHEN (
+            (OLD.community_id, OLD.is_blocked, OLD.is_workgroup,
+             OLD.is_secret_ballot, OLD.is_can_offer,
+             OLD.is_minority_not_participate)
+            IS DISTINCT FROM
+            (NEW.community_id, NEW.is_blocked, NEW.is_workgroup,
+             NEW.is_secret_ballot, NEW.is_can_offer,
+             NEW.is_minority_not_participate)
+        )
+        EXECUTE FUNCTION community_counters_ucs_trigger();
+    """)
+    # Настройки участников внутреннего сообщества создаются раньше
+    # самого сообщества, поэтому при создании счётчики заполняются
+    # по уже существующим настройкам
+    op.execute("""
+        CREATE FUNCTION community_counters_init_trigger() RETURNS trigger AS $$
+        BEGIN
+            SELECT
+                COUNT(*),
+                COUNT(*) FILTER (WHERE is_workgroup IS TRUE),
+                COUNT(*) FILTER (WHERE is_secret_ballot IS TRUE),
+                COUNT(*) FILTER (WHERE is_can_offer IS TRUE),
+                COUNT(*) FILTER (WHERE is_minority_not_participate IS TRUE)
+            INTO
+                NEW.members_count,
+                NEW.workgroup_count,
+                NEW.secret_ballot_count,
+                NEW.can_offer_count,
+                NEW.minority_not_participate_count
+            FROM public.user_community_settings
+            WHERE community_id = NEW.id
+              AND is_blocked IS NOT TRUE;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER community_counters_init
+        BEFORE INSERT ON public.community
+        FOR EACH ROW EXECUTE FUNCTION community_counters_init_trigger();
+    """)
+    op.execute("""
+        UPDATE public.community c
+        SET
+            members_count = s.members_count,
+            workgroup_count = s.workgroup_count,
+            secret_ballot_count = s.secret_ballot_count,
+            can_offer_count = s.can_offer_count,
+            minority_not_participate_count = s.minority_not_participate_count
+        FROM (
+            SELECT
+                community_id,
+                COUNT(*) AS members_count,
+                COUNT(*) FILTER (WHERE is_workgroup IS TRUE)
+                    AS workgroup_count,
+                COUNT(*) FILTER (WHERE is_secret_ballot IS TRUE)
+                    AS secret_ballot_count,
+                COUNT(*) FILTER (WHERE is_can_offer IS TRUE)
+                    AS can_offer_count,
+                COUNT(*) FILTER (WHERE is_minority_not_participate IS TRUE)
+                    AS minority_not_participate_count
+            FROM public.user_community_settings
+            WHERE is_blocked IS NOT TRUE
+            GROUP BY community_id
+        ) s
+        WHERE s.community_id = c.id;
+    """)
+
+
+def downgrade() -> None:
+    op.execute(
+        'DROP TRIGGER community_counters_init ON public.community'
+    )
+    op.execute(
+        'DROP TRIGGER community_counters_ucs_update '
+        'ON public.user_community_settings'
+    )
+    op.execute(
+        'DROP TRIGGER community_counters_ucs_insert_delete '
+        'ON public.user_community_settings'
+    )
+    op.execute('DROP FUNCTION community_counters_init_trigger()')
+    op.execute('DROP FUNCTION community_counters_ucs_trigger()')
+    op.execute(
+        'DROP FUNCTION community_counters_apply('
+        'public.user_community_settings, integer)'
+    )
+    for counter in COUNTERS:
+        op.drop_column('community', counter)
@@ -0,0 +1,37 @@
+"""add lab job heartbeat
+
+Revision ID: b7c41e2f9a05
+Revises: e19e9a1eddab
+Create Date: 2026-10-19 14:02:17.451806
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c41e2f9a05'
+down_revision: Union[str, None] = 'e19e9a1eddab'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('lab_job', sa.Column(
+        'heartbeat_at', sa.DateTime(), nullable=True
+    ))
+    op.add_column('lab_job', sa.Column(
+        'attempts', sa.Integer(), server_default='0', nullable=False
+    ))
+    op.execute("""
+        UPDATE public.lab_job
+        SET heartbeat_at = started_at, attempts = 1
+        WHERE started_at IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('lab_job', 'attempts')
+    op.drop_column('lab_job', 'heartbeat_at')
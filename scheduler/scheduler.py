@@ -5,6 +5,10 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
 
+from commands.purge_llm_response_cache import purge_llm_response_cache
+from commands.reconcile_community_counters import (
+    reconcile_community_counters
+)
 from commands.update_expired_events import update_expired_events
 
 logger = logging.getLogger(__name__)
@@ -75,6 +79,22 @@ class SchedulerService:
             minute=1
         )
 
+        # Сверка счётчиков участников сообществ каждый день в 03:00
+        self.add_job(
+            func=reconcile_community_counters,
+            job_id="reconcile_community_counters",
+            hour=3,
+            minute=0
+        )
+
+        # Удаление просроченных ответов LLM из кеша каждый день в 04:00
+        self.add_job(
+            func=purge_llm_response_cache,
+            job_id="purge_llm_response_cache",
+            hour=4,
+            minute=0
+        )
+
         # Пример добавления других задач:
 
         # # Ежечасная задача